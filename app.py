@@ -1,4 +1,3 @@
-
 import os
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file, send_from_directory
 from flask_migrate import Migrate
@@ -9,15 +8,6 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.security import check_password_hash
 from dotenv import load_dotenv
-import cv2
-import numpy as np
-import base64
-from PIL import Image
-import io
-import json
-import uuid
-from datetime import datetime
-import threading
 
 # Load environment variables
 load_dotenv()
@@ -55,6 +45,15 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.environ.get('EMAIL_APP_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('EMAIL_FROM', f'Election Commission <{app.config["MAIL_USERNAME"]}>')
     
+    # Email outbox - notifications are queued in email_outbox and sent by a small pool of
+    # workers, each holding one SMTP session open until it has been idle MAIL_SMTP_IDLE_TIMEOUT seconds
+    app.config['MAIL_OUTBOX_WORKERS'] = int(os.environ.get('MAIL_OUTBOX_WORKERS', '2'))
+    app.config['MAIL_OUTBOX_BATCH'] = int(os.environ.get('MAIL_OUTBOX_BATCH', '20'))
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+    app.config['MAIL_OUTBOX_RETRY_BASE'] = float(os.environ.get('MAIL_OUTBOX_RETRY_BASE', '10'))
+    app.config['MAIL_OUTBOX_POLL_INTERVAL'] = float(os.environ.get('MAIL_OUTBOX_POLL_INTERVAL', '5'))
+    app.config['MAIL_SMTP_IDLE_TIMEOUT'] = float(os.environ.get('MAIL_SMTP_IDLE_TIMEOUT', '30'))
+    
     # Validate required email configuration
     if not app.config['MAIL_USERNAME'] or not app.config['MAIL_PASSWORD']:
         print("WARNING: Email credentials not configured. Email notifications will be disabled.")
@@ -69,10 +68,111 @@ def create_app():
     app.config['ADMIN_USERNAME'] = os.environ.get('ADMIN_DEFAULT_USER', 'admin')
     app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_DEFAULT_PASSWORD', 'admin123')
     
+    # Split deployment: web workers with FACE_INFERENCE_URL set (unix:///path.sock or
+    # http://127.0.0.1:8100) never load OpenCV/DeepFace and forward encoding to a separate
+    # inference service, run from this same app with APP_ROLE=inference under its own
+    # gunicorn, e.g. APP_ROLE=inference gunicorn -w 2 -b unix:/run/smart-voting/inference.sock 'app:create_app()'
+    app.config['APP_ROLE'] = os.environ.get('APP_ROLE', 'web')
+    app.config['FACE_INFERENCE_URL'] = os.environ.get('FACE_INFERENCE_URL')
+    app.config['FACE_INFERENCE_TIMEOUT'] = float(os.environ.get('FACE_INFERENCE_TIMEOUT', '25'))
+    
+    # Face model configuration - load cascades and the embedding model once per process
+    app.config['FACE_MODEL_NAME'] = os.environ.get('FACE_MODEL_NAME', 'VGG-Face')
+    # auto: preload in server processes but not for flask CLI commands
+    face_model_preload = os.environ.get('FACE_MODEL_PRELOAD', 'auto').lower()
+    app.config['FACE_MODEL_PRELOAD'] = face_model_preload if face_model_preload == 'auto' else face_model_preload == 'true'
+    app.config['FACE_MODEL_WARMUP'] = os.environ.get('FACE_MODEL_WARMUP', 'True').lower() == 'true'
+    # Detect once and skip DeepFace's detector - re-enroll voters before enabling on an existing roll
+    app.config['FACE_SINGLE_PASS'] = os.environ.get('FACE_SINGLE_PASS', 'False').lower() == 'true'
+    
+    # Face detection - 0 detects at full resolution as before; set e.g. 640 to opt in to detecting
+    # wide frames on a downscaled copy (faster, but small faces near min size can be missed)
+    app.config['FACE_DETECT_MAX_WIDTH'] = int(os.environ.get('FACE_DETECT_MAX_WIDTH', '0'))
+    app.config['FACE_DETECT_SCALE_FACTOR'] = float(os.environ.get('FACE_DETECT_SCALE_FACTOR', '1.1'))
+    app.config['FACE_DETECT_MIN_NEIGHBORS'] = int(os.environ.get('FACE_DETECT_MIN_NEIGHBORS', '5'))
+    app.config['FACE_DETECT_MIN_SIZE'] = int(os.environ.get('FACE_DETECT_MIN_SIZE', '30'))
+    # Search margin around the previous frame's face box, as a fraction of its size
+    app.config['FACE_DETECT_ROI_EXPAND'] = float(os.environ.get('FACE_DETECT_ROI_EXPAND', '0.5'))
+    
+    # Face preprocessing: the default nlm is the original CLAHE + NLM denoising pipeline, unchanged.
+    # none, clahe, bilateral or auto (chosen per frame from brightness/sharpness) are opt-in; stored
+    # templates were enrolled through nlm, so re-enroll voters under the new profile before opting in
+    app.config['FACE_PREPROCESS_PROFILE'] = os.environ.get('FACE_PREPROCESS_PROFILE', 'nlm')
+    
+    # Pre-filter: reuse the CNN embedding when the exact same upload (by SHA-256) is submitted again
+    app.config['FACE_PREFILTER_ENABLED'] = os.environ.get('FACE_PREFILTER_ENABLED', 'False').lower() == 'true'
+    app.config['FACE_PREFILTER_TTL'] = float(os.environ.get('FACE_PREFILTER_TTL', '60'))
+    
+    # Micro-batching of concurrent embedding requests into one forward pass
+    app.config['FACE_BATCH_ENABLED'] = os.environ.get('FACE_BATCH_ENABLED', 'False').lower() == 'true'
+    app.config['FACE_BATCH_MAX_SIZE'] = int(os.environ.get('FACE_BATCH_MAX_SIZE', '8'))
+    app.config['FACE_BATCH_WAIT_MS'] = float(os.environ.get('FACE_BATCH_WAIT_MS', '10'))
+    app.config['FACE_BATCH_QUEUE_DEPTH'] = int(os.environ.get('FACE_BATCH_QUEUE_DEPTH', '64'))
+    
+    # Encoder process pool - 0 keeps encoding on the request thread
+    app.config['FACE_ENCODER_WORKERS'] = int(os.environ.get('FACE_ENCODER_WORKERS', '0'))
+    app.config['FACE_ENCODER_MAX_PENDING'] = int(os.environ.get('FACE_ENCODER_MAX_PENDING', '16'))
+    app.config['FACE_ENCODER_TIMEOUT'] = float(os.environ.get('FACE_ENCODER_TIMEOUT', '20'))
+    # Upper bound on loading the models in a new pool's processes; not counted against FACE_ENCODER_TIMEOUT
+    app.config['FACE_ENCODER_WARMUP_TIMEOUT'] = float(os.environ.get('FACE_ENCODER_WARMUP_TIMEOUT', '600'))
+    
+    # 1:N duplicate-enrollment index
+    app.config['FACE_INDEX_PATH'] = os.environ.get('FACE_INDEX_PATH', os.path.join('instance', 'face_index'))
+    app.config['FACE_INDEX_NLIST'] = int(os.environ.get('FACE_INDEX_NLIST', '256'))
+    app.config['FACE_INDEX_NPROBE'] = int(os.environ.get('FACE_INDEX_NPROBE', '8'))
+    # Journal size at which a worker folds it into a new snapshot generation (0 = only via flask compact-face-index)
+    app.config['FACE_INDEX_COMPACT_BYTES'] = int(os.environ.get('FACE_INDEX_COMPACT_BYTES', str(256 * 1024 * 1024)))
+    # 1:N search over the whole roll: much stricter than the 1:1 FACE_THRESHOLD, and a match
+    # only flags the enrollment for admin review at /admin/voters/duplicates
+    app.config['FACE_DUPLICATE_THRESHOLD'] = float(os.environ.get('FACE_DUPLICATE_THRESHOLD', '0.12'))
+    
+    # Per-voter face template cache for the verify hot path
+    app.config['VOTER_CACHE_SIZE'] = int(os.environ.get('VOTER_CACHE_SIZE', '10000'))
+    app.config['VOTER_CACHE_TTL'] = float(os.environ.get('VOTER_CACHE_TTL', '300'))
+    # Candidate/party names used by the vote path, reloaded after BALLOT_CACHE_TTL seconds
+    app.config['BALLOT_CACHE_TTL'] = float(os.environ.get('BALLOT_CACHE_TTL', '60'))
+    # Shard rows per tally counter - more shards, less lock contention between concurrent votes
+    app.config['TALLY_SHARDS'] = int(os.environ.get('TALLY_SHARDS', '16'))
+    # /results/stream: one tally read per interval per process, shared by every viewer
+    app.config['RESULTS_STREAM_INTERVAL'] = float(os.environ.get('RESULTS_STREAM_INTERVAL', '2'))
+    app.config['RESULTS_STREAM_KEEPALIVE'] = float(os.environ.get('RESULTS_STREAM_KEEPALIVE', '15'))
+    # Rendered result exports, one file per tally version and format
+    app.config['EXPORT_CACHE_PATH'] = os.environ.get('EXPORT_CACHE_PATH', os.path.join('instance', 'export_cache'))
+    
+    # Memory-mapped template store prewarmed before polls open
+    app.config['TEMPLATE_STORE_PATH'] = os.environ.get('TEMPLATE_STORE_PATH', os.path.join('instance', 'template_store'))
+    
+    # AI liveness detection - runs alongside encoding under a deadline and circuit breaker
+    # LIVENESS_PROVIDER: auto, openai, gemini, local (on-box detector) or http (LIVENESS_STUB_URL, e.g. a local stub server)
+    app.config['LIVENESS_PROVIDER'] = os.environ.get('LIVENESS_PROVIDER', 'auto')
+    app.config['LIVENESS_STUB_URL'] = os.environ.get('LIVENESS_STUB_URL')
+    app.config['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY')
+    app.config['OPENAI_BASE_URL'] = os.environ.get('OPENAI_BASE_URL')
+    app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY')
+    app.config['GEMINI_API_ENDPOINT'] = os.environ.get('GEMINI_API_ENDPOINT')
+    app.config['LIVENESS_DEADLINE'] = float(os.environ.get('LIVENESS_DEADLINE', '3'))
+    app.config['LIVENESS_WORKERS'] = int(os.environ.get('LIVENESS_WORKERS', '4'))
+    app.config['LIVENESS_CACHE_SIZE'] = int(os.environ.get('LIVENESS_CACHE_SIZE', '1024'))
+    app.config['LIVENESS_CACHE_TTL'] = float(os.environ.get('LIVENESS_CACHE_TTL', '300'))
+    app.config['LIVENESS_BREAKER_FAILURES'] = int(os.environ.get('LIVENESS_BREAKER_FAILURES', '5'))
+    app.config['LIVENESS_BREAKER_RESET'] = float(os.environ.get('LIVENESS_BREAKER_RESET', '30'))
+    app.config['LIVENESS_LOCAL_FALLBACK'] = os.environ.get('LIVENESS_LOCAL_FALLBACK', 'False').lower() == 'true'
+    app.config['LIVENESS_LOCAL_THRESHOLD'] = float(os.environ.get('LIVENESS_LOCAL_THRESHOLD', '0.5'))
+    
     # File upload configuration - store in static/uploads for easy access
     app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
     
+    # Background snapshot writer - content-addressed files, fsynced in batches
+    app.config['SNAPSHOT_FSYNC_BATCH'] = int(os.environ.get('SNAPSHOT_FSYNC_BATCH', '32'))
+    app.config['SNAPSHOT_FLUSH_MS'] = float(os.environ.get('SNAPSHOT_FLUSH_MS', '50'))
+    app.config['SNAPSHOT_QUEUE_DEPTH'] = int(os.environ.get('SNAPSHOT_QUEUE_DEPTH', '1024'))
+    # How long failure alerts wait for their snapshot attachment to be written
+    app.config['SNAPSHOT_ATTACH_TIMEOUT'] = float(os.environ.get('SNAPSHOT_ATTACH_TIMEOUT', '2'))
+    
+    if app.config['APP_ROLE'] == 'inference':
+        return _init_inference_service(app)
+    
     # Initialize extensions with app
     db.init_app(app)
     migrate.init_app(app, db)
@@ -80,6 +180,41 @@ def create_app():
     csrf.init_app(app)
     limiter.init_app(app)
     
+    # Shared face models (cascades + embedding model), or a client for the inference service
+    if app.config['FACE_INFERENCE_URL']:
+        from services.inference_client import init_inference_client
+        init_inference_client(app)
+    else:
+        from services.model_registry import init_face_models
+        init_face_models(app)
+    
+    from services.face_index import register_face_index
+    register_face_index(app)
+    
+    from services.template_store import init_template_store
+    init_template_store(app)
+    
+    from services.voter_cache import init_voter_cache
+    init_voter_cache(app)
+    
+    from services.snapshot_writer import init_snapshot_writer
+    init_snapshot_writer(app)
+    
+    from services.ballot_cache import init_ballot_cache
+    init_ballot_cache(app)
+    
+    from services.tally import register_tally
+    register_tally(app)
+    
+    from services.results_publisher import init_results_publisher
+    init_results_publisher(app)
+    
+    from services.export_cache import init_export_cache
+    init_export_cache(app)
+    
+    from services.mail_outbox import init_mail_outbox
+    init_mail_outbox(app)
+    
     # Create upload directories
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'faces'), exist_ok=True)
     os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'fraud_attempts'), exist_ok=True)
@@ -121,6 +256,15 @@ def create_app():
     
     return app
 
+def _init_inference_service(app):
+    """Face inference service of a split deployment: face models and the /inference API only"""
+    from services.model_registry import init_face_models
+    init_face_models(app)
+    
+    from blueprints.inference import inference_bp
+    app.register_blueprint(inference_bp, url_prefix='/inference')
+    return app
+
 if __name__ == '__main__':
     app = create_app()
     # Set debug based on environment
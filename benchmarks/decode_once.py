@@ -0,0 +1,78 @@
+"""
+Decode work per authentication: per-stage base64 decoding vs one FaceImage.
+
+Usage:
+    python -m benchmarks.decode_once frame.jpg [iterations]
+
+Replays the image handling of one verify_auth call without the models:
+before, each stage (liveness hash, encoding, snapshot) re-decoded the
+base64 string, and encoding went through PIL; now one FaceImage is
+decoded once and shared. Reports median time and the bytes allocated
+(tracemalloc peak) for both.
+"""
+import base64
+import hashlib
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from services.face_image import FaceImage
+
+
+def per_stage(base64_image):
+    """Image handling of verify_auth before FaceImage"""
+    # Liveness cache key
+    hashlib.sha256(base64_image.encode('ascii')).hexdigest()
+    # Encoding
+    image = Image.open(io.BytesIO(base64.b64decode(base64_image)))
+    cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    # Snapshot
+    base64.b64decode(base64_image)
+
+
+def decode_once(raw):
+    """Image handling of verify_auth with a shared FaceImage"""
+    face_image = FaceImage(raw)
+    face_image.sha256
+    face_image.bgr
+    face_image.raw
+
+
+def measure(fn, arg, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    with open(sys.argv[1], 'rb') as f:
+        raw = f.read()
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    base64_image = base64.b64encode(raw).decode('ascii')
+
+    before_ms, before_peak = measure(per_stage, base64_image, iterations)
+    after_ms, after_peak = measure(decode_once, raw, iterations)
+    print(f"per-stage decoding  median {before_ms:7.2f} ms   peak alloc {before_peak / 1024:9.1f} KiB")
+    print(f"decode once         median {after_ms:7.2f} ms   peak alloc {after_peak / 1024:9.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
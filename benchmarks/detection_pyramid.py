@@ -0,0 +1,87 @@
+"""
+Accuracy and latency of downscaled / ROI-hinted face detection against the
+original full-resolution detectMultiScale.
+
+Usage:
+    python -m benchmarks.detection_pyramid path/to/frames_dir_or_image [max_width ...]
+
+Full-resolution detection is the reference. For each mode the script reports
+median latency, the share of frames where a face was found when the
+reference found one, and the mean IoU of the largest face with the reference.
+"""
+import os
+import statistics
+import sys
+import time
+
+import cv2
+
+from services.face_service import DEFAULT_DETECTION, FaceService
+
+
+def load_frames(path):
+    paths = ([os.path.join(path, name) for name in sorted(os.listdir(path))]
+             if os.path.isdir(path) else [path])
+    frames = [cv2.imread(p) for p in paths]
+    return [f for f in frames if f is not None]
+
+
+def largest(faces):
+    return max(faces, key=lambda f: f[2] * f[3]) if faces else None
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def run(service, frames, use_hint=False):
+    timings, boxes, hint = [], [], None
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        start = time.perf_counter()
+        box = largest(service.detect_faces(frame, gray=gray, roi_hint=hint if use_hint else None))
+        timings.append((time.perf_counter() - start) * 1000.0)
+        boxes.append(box)
+        hint = box or hint
+    return timings, boxes
+
+
+def report(label, timings, boxes, reference):
+    pairs = [(b, r) for b, r in zip(boxes, reference) if r is not None]
+    found = sum(1 for b, _ in pairs if b is not None)
+    ious = [iou(b, r) for b, r in pairs if b is not None]
+    recall = found / len(pairs) * 100 if pairs else 0.0
+    mean_iou = statistics.mean(ious) if ious else 0.0
+    print(f"{label:<26} median {statistics.median(timings):7.2f} ms   recall {recall:5.1f}%   IoU {mean_iou:.3f}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    frames = load_frames(sys.argv[1])
+    if not frames:
+        print(f"No readable images at {sys.argv[1]}")
+        sys.exit(1)
+    widths = [int(w) for w in sys.argv[2:]] or [960, 640, 480]
+
+    service = FaceService()
+    service.detection = dict(DEFAULT_DETECTION)
+    ref_timings, reference = run(service, frames)
+    report("full resolution", ref_timings, reference, reference)
+
+    for width in widths:
+        service.detection = dict(DEFAULT_DETECTION, max_width=width)
+        report(f"downscaled to {width}px", *run(service, frames), reference)
+        report(f"downscaled {width}px + ROI", *run(service, frames, use_hint=True), reference)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Per-stage timing of the face encoding pipeline: legacy (detect in every stage)
+versus single-pass (one FaceAnalysis shared by all stages).
+
+Usage:
+    python -m benchmarks.face_pipeline_timing path/to/face.jpg [iterations]
+"""
+import statistics
+import sys
+import time
+
+import cv2
+
+from services.face_service import DEEPFACE_AVAILABLE, FaceAnalysis, FaceService
+from services.model_registry import FaceModelRegistry
+
+
+def legacy_front_end(face_service, image):
+    """Quality + preprocessing as separate calls, each running its own detection"""
+    timings = {}
+    start = time.perf_counter()
+    face_service.assess_face_quality(image)
+    timings['quality'] = (time.perf_counter() - start) * 1000.0
+    start = time.perf_counter()
+    face_service.preprocess_face(image)
+    timings['preprocess'] = (time.perf_counter() - start) * 1000.0
+    return timings
+
+
+def single_pass_front_end(face_service, image):
+    """Quality + preprocessing sharing one grayscale conversion and one detection"""
+    analysis = FaceAnalysis(image, face_service)
+    analysis.faces
+    with analysis.timed('quality'):
+        face_service.assess_face_quality(image, analysis)
+    with analysis.timed('preprocess'):
+        aligned = analysis.aligned_face()
+        if aligned is not None:
+            face_service.enhance_face(aligned)
+    return analysis.timings
+
+
+def summarize(label, runs):
+    stages = {}
+    for timings in runs:
+        for stage, ms in timings.items():
+            stages.setdefault(stage, []).append(ms)
+    total = statistics.median([sum(t.values()) for t in runs])
+    parts = ', '.join(f"{stage} {statistics.median(values):.1f}" for stage, values in stages.items())
+    print(f"{label:<22} total {total:8.1f} ms   ({parts})")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    image = cv2.imread(sys.argv[1])
+    if image is None:
+        print(f"Could not read image: {sys.argv[1]}")
+        sys.exit(1)
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    face_service = FaceService()
+    summarize("legacy front end", [legacy_front_end(face_service, image) for _ in range(iterations)])
+    summarize("single-pass front end", [single_pass_front_end(face_service, image) for _ in range(iterations)])
+
+    if not DEEPFACE_AVAILABLE:
+        print("full encode            skipped (DeepFace not installed)")
+        return
+
+    for single_pass in (False, True):
+        registry = FaceModelRegistry(single_pass=single_pass)
+        registry.load()
+        service = registry.face_service(0.30)
+        runs = []
+        for _ in range(max(1, iterations // 4)):
+            service.encode_face_deepface(image)
+            runs.append(dict(service.last_timings))
+        summarize(f"encode single_pass={single_pass}", runs)
+
+
+if __name__ == '__main__':
+    main()
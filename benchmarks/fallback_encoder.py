@@ -0,0 +1,110 @@
+"""
+Speed and output equality of the vectorized fallback face encoder.
+
+Usage:
+    python -m benchmarks.fallback_encoder image.jpg [iterations]
+
+Runs the original per-pixel loop implementation of the 128-D LBP/HOG
+encoder next to FaceService.extract_face_features on the largest face of
+the image, checks both give the same vector and prints the speedup.
+"""
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from services.face_service import FaceAnalysis, FaceService
+
+
+def loop_lbp(image):
+    """Per-pixel LBP as the encoder computed it before vectorization"""
+    h, w = image.shape
+    features = []
+    step = 8
+    for i in range(step, h - step, step):
+        for j in range(step, w - step, step):
+            center = int(image[i, j])
+            pattern = 0
+            for idx, (di, dj) in enumerate(FaceService.LBP_OFFSETS):
+                if int(image[i + di, j + dj]) >= center:
+                    pattern |= (1 << idx)
+            features.append(pattern / 255.0)
+            if len(features) >= 64:
+                return features
+    while len(features) < 64:
+        features.append(0.0)
+    return features[:64]
+
+
+def loop_features(image, face_box):
+    """Loop-based 128-D encoder as it was before vectorization"""
+    x, y, w, h = face_box
+    gray_face = cv2.cvtColor(image[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+    normalized_face = cv2.equalizeHist(cv2.resize(gray_face, (128, 128)))
+
+    all_features = []
+    for i in range(4):
+        for j in range(4):
+            region = normalized_face[i*32:(i+1)*32, j*32:(j+1)*32]
+            hist = cv2.calcHist([region], [0], None, [2], [0, 256])
+            all_features.extend(hist.flatten().tolist())
+
+    all_features.extend(loop_lbp(normalized_face))
+
+    sobelx = cv2.Sobel(normalized_face, cv2.CV_64F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(normalized_face, cv2.CV_64F, 0, 1, ksize=3)
+    magnitude = np.sqrt(sobelx**2 + sobely**2)
+    for i in range(4):
+        for j in range(4):
+            region = magnitude[i*32:(i+1)*32, j*32:(j+1)*32]
+            all_features.append(np.mean(region))
+            all_features.append(np.std(region))
+
+    feature_array = np.array(all_features[:128])
+    if len(feature_array) < 128:
+        feature_array = np.pad(feature_array, (0, 128 - len(feature_array)))
+    norm = np.linalg.norm(feature_array)
+    return feature_array / norm if norm > 0 else feature_array
+
+
+def time_ms(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(timings)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    image = cv2.imread(sys.argv[1])
+    if image is None:
+        print(f"Could not read {sys.argv[1]}")
+        sys.exit(1)
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    face_service = FaceService()
+    face_box = FaceAnalysis(image, face_service).largest_face
+    if face_box is None:
+        print("No face found in image")
+        sys.exit(1)
+
+    expected = loop_features(image, face_box)
+    actual = face_service.extract_face_features(image, face_box)
+    print(f"max abs difference {np.max(np.abs(expected - actual)):.2e} "
+          f"({'match' if np.allclose(expected, actual, atol=1e-9) else 'MISMATCH'})")
+
+    loop_ms = time_ms(lambda: loop_features(image, face_box), iterations)
+    vector_ms = time_ms(lambda: face_service.extract_face_features(image, face_box), iterations)
+    print(f"loop       median {loop_ms:8.3f} ms")
+    print(f"vectorized median {vector_ms:8.3f} ms   speedup {loop_ms / vector_ms:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Cold-start import time and memory of the web app.
+
+Usage:
+    python -m benchmarks.import_time [stages] [top N]
+
+    e.g. python -m benchmarks.import_time import,create,preload 15
+
+Each stage runs in a fresh interpreter under ``python -X importtime``:
+
+    import   - ``import app`` only
+    create   - create_app() with FACE_MODEL_PRELOAD=false (admin/results worker, CLI)
+    preload  - create_app() with FACE_MODEL_PRELOAD=true (voting worker)
+
+For every stage it prints the wall time, the peak RSS of the child and the
+top-level packages with the largest cumulative import time, which is where
+to look when a new module-level import slows worker start-up. No request
+is served, so the database does not need to be reachable.
+"""
+import os
+import subprocess
+import sys
+import time
+
+STAGES = {
+    'import': ('false', "import app"),
+    'create': ('false', "import app; app.create_app()"),
+    'preload': ('true', "import app; app.create_app()"),
+}
+
+REPORT_RSS = "import resource, sys; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)"
+
+
+def parse_importtime(stderr: str):
+    """{top-level package: cumulative microseconds} from -X importtime output"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        cumulative = cumulative.strip()
+        if not cumulative.isdigit():
+            continue
+        # Nested imports are indented further; only top-level entries add up to the total
+        if not name.startswith('  '):
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+    return packages
+
+
+def run_stage(name: str, top: int) -> None:
+    preload, code = STAGES[name]
+    env = dict(os.environ, FACE_MODEL_PRELOAD=preload)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"{code}; {REPORT_RSS}"],
+                          capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(f"{name}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''}")
+        return
+
+    lines = proc.stderr.strip().splitlines()
+    rss_kb = int(lines[-1]) if lines and lines[-1].isdigit() else 0
+    packages = parse_importtime(proc.stderr)
+    total_ms = sum(packages.values()) / 1000.0
+
+    print(f"{name}: {elapsed * 1000:.0f} ms wall, {total_ms:.0f} ms in imports, peak RSS {rss_kb / 1024:.0f} MB")
+    for package, micros in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"    {package:<28} {micros / 1000:8.1f} ms")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+        print(__doc__)
+        sys.exit(0)
+
+    stages = (sys.argv[1] if len(sys.argv) > 1 else 'import,create,preload').split(',')
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    for name in stages:
+        run_stage(name, top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Round-trip latency to the face inference service of a split deployment.
+
+Usage:
+    python -m benchmarks.inference_roundtrip <inference URL> <image path> [requests] [threads]
+
+    e.g. python -m benchmarks.inference_roundtrip unix:///run/smart-voting/inference.sock face.jpg 200 8
+
+Sends the same JPEG to ``/inference/encode`` from a pool of threads, each
+with its own keep-alive connection, and compares the client-side latency
+with the pipeline time the service reports. The difference is what the
+split costs per frame (socket transfer and JSON), which should stay small
+next to the encode itself.
+"""
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    url, image_path = sys.argv[1], sys.argv[2]
+    requests_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    threads = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+
+    from services.face_image import FaceImage
+    from services.inference_client import InferenceClient
+
+    with open(image_path, 'rb') as f:
+        face_image = FaceImage(f.read())
+    client = InferenceClient(url)
+
+    def one(_):
+        start = time.perf_counter()
+        response = client.encode(face_image)
+        total_ms = (time.perf_counter() - start) * 1000.0
+        return total_ms, sum((response.get('timings') or {}).values()), response.get('encoding') is not None
+
+    # First call builds the connection and may load the model
+    client.encode(face_image)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - start
+
+    totals = sorted(r[0] for r in results)
+    overheads = [r[0] - r[1] for r in results]
+    encoded = sum(1 for r in results if r[2])
+    print(f"{requests_count} requests on {threads} threads in {elapsed:.2f}s ({requests_count / elapsed:.1f} frames/s), "
+          f"{encoded} with a face")
+    print(f"round trip: median {statistics.median(totals):.1f} ms, p95 {totals[int(len(totals) * 0.95) - 1]:.1f} ms")
+    print(f"overhead beyond reported pipeline time: median {statistics.median(overheads):.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
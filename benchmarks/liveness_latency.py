@@ -0,0 +1,75 @@
+"""
+Latency of the on-box liveness detector compared with the remote AI path.
+
+Usage:
+    python -m benchmarks.liveness_latency path/to/face.jpg [iterations]
+
+The remote path is only timed when OPENAI_API_KEY, GEMINI_API_KEY or
+LIVENESS_STUB_URL is set.
+"""
+import base64
+import statistics
+import sys
+import time
+
+import cv2
+
+from services.face_service import FaceService
+from services.liveness import build_liveness_provider
+
+
+def time_calls(fn, iterations):
+    timings = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return timings, result
+
+
+def report(label, timings, result):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<28} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms   -> {result.get('reason')}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    image_path = sys.argv[1]
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    image = cv2.imread(image_path)
+    if image is None:
+        print(f"Could not read image: {image_path}")
+        sys.exit(1)
+
+    face_service = FaceService()
+    x, y, w, h = max(face_service.detect_faces(image) or [(0, 0, image.shape[1], image.shape[0])],
+                     key=lambda f: f[2] * f[3])
+    face_roi = image[y:y+h, x:x+w]
+
+    # Warm up once so one-off allocations are not counted
+    face_service.local_liveness_detection(image)
+
+    from services.local_liveness import LocalLivenessDetector
+    detector = LocalLivenessDetector()
+    report("local (ROI features only)", *time_calls(lambda: detector.analyze(face_roi), iterations))
+    report("local (detect + features)", *time_calls(lambda: face_service.local_liveness_detection(image), iterations))
+
+    provider = build_liveness_provider({})
+    if provider is None:
+        print("remote                       skipped (no OPENAI_API_KEY, GEMINI_API_KEY or LIVENESS_STUB_URL)")
+        return
+
+    ok, encoded = cv2.imencode('.jpg', image)
+    base64_image = base64.b64encode(encoded.tobytes()).decode('ascii')
+    remote_iterations = min(iterations, 5)
+    report(f"remote ({provider.name})", *time_calls(lambda: provider.check(base64_image), remote_iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Latency and match-distance impact of each face preprocessing profile.
+
+Usage:
+    python -m benchmarks.preprocess_profiles enrolled.jpg probe.jpg [iterations]
+
+For every profile the script times preprocessing of the probe crop and, when
+DeepFace is installed, reports the cosine distance between the enrolled and
+probe embeddings produced with that profile (lower is a better match).
+"""
+import statistics
+import sys
+import time
+
+import cv2
+
+from services.face_service import DEEPFACE_AVAILABLE, PREPROCESS_PROFILES, FaceAnalysis, FaceService
+from services.model_registry import FaceModelRegistry
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    enrolled, probe = cv2.imread(sys.argv[1]), cv2.imread(sys.argv[2])
+    if enrolled is None or probe is None:
+        print("Could not read both images")
+        sys.exit(1)
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    face_service = FaceService()
+    analysis = FaceAnalysis(probe, face_service)
+    face_service.assess_face_quality(probe, analysis)
+    auto_profile = FaceService.select_preprocess_profile(analysis.brightness, analysis.sharpness)
+    print(f"probe brightness {analysis.brightness:.1f}, sharpness {analysis.sharpness:.1f} -> auto picks '{auto_profile}'")
+
+    crop = analysis.aligned_face()
+    if crop is None:
+        print("No face found in probe image")
+        sys.exit(1)
+
+    for profile in PREPROCESS_PROFILES:
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            face_service.enhance_face(crop, profile)
+            timings.append((time.perf_counter() - start) * 1000.0)
+
+        distance_text = "distance n/a (DeepFace not installed)"
+        if DEEPFACE_AVAILABLE:
+            registry = FaceModelRegistry(warmup=False, preprocess_profile=profile)
+            registry.load()
+            service = registry.face_service(0.30)
+            a, b = service.encode_face_deepface(enrolled), service.encode_face_deepface(probe)
+            distance_text = (f"distance {service.compare_encodings(a, b):.4f}"
+                             if a is not None and b is not None else "distance n/a (encoding failed)")
+
+        print(f"{profile:<10} preprocess median {statistics.median(timings):8.2f} ms   {distance_text}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Database load of the live results stream as the number of viewers grows.
+
+Usage:
+    python -m benchmarks.results_stream <scratch database URL> [viewer counts] [seconds per round] [interval]
+
+    e.g. python -m benchmarks.results_stream postgresql://localhost/scratch 10,100,1000 10 1
+
+Points the app at the given database (never use the live election
+database). For each viewer count it attaches that many in-process
+subscribers to a fresh results publisher while a background thread bumps
+a throwaway tally counter ten times a second, then reports the SQL
+statements the publisher issued, its polls and the events delivered per
+viewer. The statement count should stay flat as the viewer count grows. The
+throwaway counter is deleted at the end.
+"""
+import os
+import sys
+import threading
+import time
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    os.environ['DATABASE_URL'] = sys.argv[1]
+    viewer_counts = [int(n) for n in (sys.argv[2] if len(sys.argv) > 2 else '10,100,1000').split(',')]
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    interval = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+    os.environ.setdefault('FACE_MODEL_PRELOAD', 'False')
+    threading.stack_size(256 * 1024)
+
+    from sqlalchemy import event
+    from app import create_app
+    from models import db
+    from services.results_publisher import ResultsPublisher
+    from services.tally import increment, vote_tally
+
+    app = create_app()
+    counter = 'bench:stream'
+    current = {'publisher': None, 'statements': 0}
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_statement(*args):
+            publisher = current['publisher']
+            if publisher is not None and threading.current_thread() is publisher._thread:
+                current['statements'] += 1
+
+    def bump(stop):
+        with app.app_context():
+            while not stop.is_set():
+                increment({counter: 1})
+                db.session.commit()
+                time.sleep(0.1)
+            db.session.remove()
+
+    for viewers in viewer_counts:
+        publisher = ResultsPublisher(app, interval=interval, keepalive=seconds)
+        current.update(publisher=publisher, statements=0)
+        received = [0] * viewers
+        stop = threading.Event()
+
+        def watch(slot):
+            for frame in publisher.events():
+                if stop.is_set():
+                    return
+                if frame.startswith('id:'):
+                    received[slot] += 1
+
+        writer = threading.Thread(target=bump, args=(stop,), daemon=True)
+        writer.start()
+        for slot in range(viewers):
+            threading.Thread(target=watch, args=(slot,), daemon=True).start()
+        time.sleep(seconds)
+        reads = current['statements']
+        stop.set()
+        writer.join()
+
+        print(f"{viewers:>6} viewers: {reads} statements, "
+              f"{publisher.polls} polls, {publisher.published} snapshots published, "
+              f"{sum(received) / max(1, viewers):.1f} events per viewer")
+
+    with app.app_context():
+        db.session.execute(vote_tally.delete().where(vote_tally.c.counter == counter))
+        db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
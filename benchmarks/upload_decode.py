@@ -0,0 +1,85 @@
+"""
+Upload payload size and server decode time: base64 JSON frames vs JPEG crops.
+
+Usage:
+    python -m benchmarks.upload_decode frame.jpg [iterations]
+
+Compares the legacy upload (full frame, quality 92, base64 in a JSON body,
+decoded with base64 + PIL + cvtColor) with the capture script's upload
+(face crop with 60% margin, longest side <= 480, quality 85, sent as a
+binary multipart part and decoded with cv2.imdecode).
+"""
+import base64
+import io
+import json
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from services.face_service import FaceAnalysis, FaceService
+
+
+def legacy_decode(base64_image):
+    """Decode path used before uploads switched to binary JPEG"""
+    image = Image.open(io.BytesIO(base64.b64decode(base64_image)))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def face_crop(frame, face_box, margin=0.6, max_side=480):
+    """Same crop and downscale as captureFaceJpeg in static/js/app.js"""
+    x, y, w, h = face_box
+    x0, y0 = max(0, int(x - w * margin)), max(0, int(y - h * margin))
+    x1 = min(frame.shape[1], int(x + w * (1 + margin)))
+    y1 = min(frame.shape[0], int(y + h * (1 + margin)))
+    crop = frame[y0:y1, x0:x1]
+    scale = min(1.0, max_side / max(crop.shape[:2]))
+    if scale < 1.0:
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return crop
+
+
+def time_ms(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(timings)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    frame = cv2.imread(sys.argv[1])
+    if frame is None:
+        print(f"Could not read {sys.argv[1]}")
+        sys.exit(1)
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    full_jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 92])[1].tobytes()
+    legacy_b64 = base64.b64encode(full_jpeg).decode('ascii')
+    legacy_body = json.dumps({'voter_id': 'V0000001', 'image_data': legacy_b64})
+
+    face_box = FaceAnalysis(frame, FaceService()).largest_face
+    crop = face_crop(frame, face_box) if face_box is not None else frame
+    crop_jpeg = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+    legacy_ms = time_ms(lambda: legacy_decode(legacy_b64), iterations)
+    crop_ms = time_ms(lambda: FaceService.decode_image_bytes(crop_jpeg), iterations)
+    full_ms = time_ms(lambda: FaceService.decode_image_bytes(full_jpeg), iterations)
+
+    print(f"face {'found' if face_box is not None else 'not found, using full frame'}; crop {crop.shape[1]}x{crop.shape[0]}")
+    print(f"legacy JSON body      {len(legacy_body):9d} bytes   decode (b64+PIL) median {legacy_ms:7.2f} ms")
+    print(f"full frame JPEG part  {len(full_jpeg):9d} bytes   decode (imdecode) median {full_ms:7.2f} ms")
+    print(f"face crop JPEG part   {len(crop_jpeg):9d} bytes   decode (imdecode) median {crop_ms:7.2f} ms")
+    print(f"payload reduction {100.0 * (1 - len(crop_jpeg) / len(legacy_body)):.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Concurrent double-submit test for cast_vote.
+
+Usage:
+    python -m benchmarks.vote_concurrency <scratch database URL> [voters] [submits per voter] [threads]
+
+Points the app at the given database (never use the live election
+database), creates throwaway voters, then fires every voter's vote
+``submits per voter`` times at once from a thread pool through the Flask
+test client. Afterwards it checks that each voter has exactly one Vote
+row and reports throughput. The benchmark voters and their votes are
+removed at the end.
+"""
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    os.environ['DATABASE_URL'] = sys.argv[1]
+    voters_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    submits = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    threads = int(sys.argv[4]) if len(sys.argv) > 4 else 32
+    os.environ.setdefault('FACE_MODEL_PRELOAD', 'False')
+
+    from app import create_app, limiter
+    from models import db, Voter, Vote
+    from services.tally import VOTERS, delete_voter_counters, increment
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['MAIL_SUPPRESS_SEND'] = True
+    limiter.enabled = False
+
+    run_id = uuid.uuid4().hex[:6].upper()
+    with app.app_context():
+        voters = [
+            Voter(voter_id=f"BENCH{run_id}{i:05d}", name=f"Bench Voter {i}", age=30,
+                  dob=date(1995, 1, 1), gender='Other', email=f"bench{run_id}{i}@example.invalid")
+            for i in range(voters_count)
+        ]
+        db.session.add_all(voters)
+        increment({VOTERS: voters_count})
+        db.session.commit()
+        voter_pks = [voter.id for voter in voters]
+
+    local = threading.local()
+    latencies = []
+
+    def submit(voter_pk):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['authenticated_voter_id'] = voter_pk
+        start = time.perf_counter()
+        response = client.post('/poll/vote', json={'nota': True})
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        return response.get_json().get('success', False)
+
+    jobs = [pk for pk in voter_pks for _ in range(submits)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        accepted = sum(pool.map(submit, jobs))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        counts = dict(
+            db.session.query(Vote.voter_id, db.func.count(Vote.id))
+            .filter(Vote.voter_id.in_(voter_pks)).group_by(Vote.voter_id).all()
+        )
+        double_votes = sum(1 for count in counts.values() if count > 1)
+        missing = voters_count - len(counts)
+
+        # Take the bench voters and their votes back out of the tally in the same transaction
+        votes = {pk: [] for pk in voter_pks}
+        for voter_pk, candidate_id, nota in db.session.query(Vote.voter_id, Vote.candidate_id, Vote.nota).filter(
+                Vote.voter_id.in_(voter_pks)):
+            votes[voter_pk].append((candidate_id, nota))
+        for voter_votes in votes.values():
+            delete_voter_counters(voter_votes)
+        Vote.query.filter(Vote.voter_id.in_(voter_pks)).delete(synchronize_session=False)
+        Voter.query.filter(Voter.id.in_(voter_pks)).delete(synchronize_session=False)
+        db.session.commit()
+
+    print(f"{len(jobs)} submits for {voters_count} voters on {threads} threads in {elapsed:.2f}s "
+          f"({len(jobs) / elapsed:.0f} req/s, median {statistics.median(latencies):.1f} ms)")
+    print(f"accepted {accepted}, voters with more than one vote: {double_votes}, voters without a vote: {missing}")
+    sys.exit(1 if double_votes or accepted != voters_count else 0)
+
+
+if __name__ == '__main__':
+    main()
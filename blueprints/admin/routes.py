@@ -1,4 +1,4 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, current_app
 from werkzeug.utils import secure_filename
 import os
 import uuid
@@ -6,17 +6,32 @@ from datetime import datetime, date
 from . import admin_bp
 from blueprints.auth.routes import admin_required
 from models import db, Voter, VoterFace, Party, Candidate, Vote, AuthEvent
-from services.face_service import FaceService
+from services.face_image import FaceImage
+from services.encoding_codec import pack_encoding
+from services.inference_client import get_face_service
+from services.face_index import flag_enrollment, get_face_index, read_duplicate_report, read_enrollment_flags
+from services.voter_cache import get_voter_cache
+from services.template_store import get_template_store
+from services.snapshot_writer import get_snapshot_writer
+from services.ballot_cache import get_ballot_cache
+from services.results_publisher import get_results_publisher
+from services.export_stream import export_response, stream_rows
+from services.export_cache import get_export_cache
+from services.mail_outbox import get_mail_outbox
+from services.tally import TOTAL, VOTERS, delete_voter_counters, increment, read_counters, reset_vote_counters
 import json
+import threading
+from sqlalchemy import select
 
 @admin_bp.route('/dashboard')
 @admin_required
 def dashboard():
     """Admin dashboard with statistics"""
-    total_voters = Voter.query.count()
+    counters = read_counters()
+    total_voters = counters.get(VOTERS, 0)
     total_parties = Party.query.count()
     total_candidates = Candidate.query.count()
-    total_votes = Vote.query.count()
+    total_votes = counters.get(TOTAL, 0)
     
     stats = {
         'total_voters': total_voters,
@@ -74,6 +89,7 @@ def add_voter():
             )
             
             db.session.add(voter)
+            increment({VOTERS: 1})
             db.session.commit()
             
             flash('Voter added successfully', 'success')
@@ -101,6 +117,7 @@ def edit_voter(voter_id):
             voter.updated_at = datetime.utcnow()
             
             db.session.commit()
+            get_voter_cache().invalidate(voter.voter_id)
             flash('Voter updated successfully', 'success')
             return redirect(url_for('admin.voters'))
             
@@ -115,9 +132,18 @@ def edit_voter(voter_id):
 def delete_voter(voter_id):
     """Delete voter"""
     try:
-        voter = Voter.query.get_or_404(voter_id)
+        # Row lock: a concurrent vote either commits first and is counted below, or finds no voter
+        voter = Voter.query.filter_by(id=voter_id).with_for_update().first_or_404()
+        public_voter_id = voter.voter_id
+        votes = db.session.query(Vote.candidate_id, Vote.nota).filter(Vote.voter_id == voter_id).all()
+        # Remove the votes explicitly rather than relying on a cascade the schema may not have
+        Vote.query.filter_by(voter_id=voter_id).delete(synchronize_session=False)
         db.session.delete(voter)
+        # Same transaction as the delete, so the tally never counts votes that are gone
+        delete_voter_counters(votes)
         db.session.commit()
+        get_face_index().remove_voter(voter_id)
+        get_voter_cache().invalidate(public_voter_id)
         flash('Voter deleted successfully', 'success')
     except Exception as e:
         db.session.rollback()
@@ -138,34 +164,61 @@ def process_face_enrollment(voter_id):
     """Process face enrollment"""
     try:
         voter = Voter.query.get_or_404(voter_id)
-        face_service = FaceService(threshold=current_app.config['FACE_THRESHOLD'])
+        face_service = get_face_service(current_app.config['FACE_THRESHOLD'])
         
-        # Get image data from request
-        image_data = request.json.get('image_data')
+        # Get image data from request: multipart JPEG crop, or legacy base64 JSON
+        upload = request.files.get('image')
+        if upload is not None:
+            face_image = FaceImage(upload.read())
+        else:
+            image_data = (request.get_json(silent=True) or {}).get('image_data')
+            face_image = FaceImage.from_base64(image_data) if image_data else None
         
-        if not image_data:
+        if not face_image:
             return jsonify({'success': False, 'message': 'No image data provided'})
         
-        # Extract face encoding
-        encoding = face_service.encode_face_from_base64(image_data)
+        # Extract face encoding, searching near the previous capture's face box first
+        roi_hint = session.get('enroll_face_roi')
+        encoding = face_service.encode_face_image(face_image, roi_hint=tuple(roi_hint) if roi_hint else None)
+        if face_service.last_face_box is not None:
+            session['enroll_face_roi'] = [int(v) for v in face_service.last_face_box]
         
         if encoding is None:
             return jsonify({'success': False, 'message': 'No face detected in image'})
         
+        # Faces close to another voter's are enrolled but flagged for admin review
+        face_index = get_face_index()
+        duplicates = face_index.find_duplicates(
+            encoding,
+            current_app.config['FACE_DUPLICATE_THRESHOLD'],
+            exclude_voter_id=voter.id
+        )
+        
         # Save face encoding
         face_record = VoterFace(voter_id=voter.id)
-        face_record.set_encoding(encoding)
+        face_record.encoding = pack_encoding(encoding)
         
-        # Optionally save snapshot
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"voter_{voter.voter_id}_{timestamp}.jpg"
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], 'faces', filename)
-        
-        if face_service.save_image_from_base64(image_data, filepath):
-            face_record.image_snapshot_path = filepath
+        # Save snapshot in the background under its content hash
+        snapshot = get_snapshot_writer().submit(face_image.raw, 'faces', sha256=face_image.sha256)
+        face_record.image_snapshot_path = snapshot.path
         
         db.session.add(face_record)
         db.session.commit()
+        face_index.add(face_record.id, voter.id, encoding)
+        get_voter_cache().invalidate(voter.voter_id)
+        store = get_template_store()
+        if store is not None:
+            store.invalidate(voter.id)
+        
+        if duplicates:
+            flag_enrollment(current_app.config['FACE_INDEX_PATH'], voter.id, face_record.id, duplicates)
+            current_app.logger.warning(f"Enrollment for voter {voter.voter_id} flagged for review: matches voter pk {duplicates[0][0]} (distance {duplicates[0][2]:.4f})")
+            return jsonify({
+                'success': True,
+                'message': 'Face enrolled, but it resembles another voter and has been flagged for admin review',
+                'duplicate': True,
+                'distance': duplicates[0][2]
+            })
         
         return jsonify({'success': True, 'message': 'Face enrolled successfully'})
         
@@ -173,6 +226,134 @@ def process_face_enrollment(voter_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Error enrolling face: {str(e)}'})
 
+@admin_bp.route('/voters/duplicates')
+@admin_required
+def duplicate_voters():
+    """Report of voters whose enrolled faces look like the same person
+
+    The search over every enrolled face is too slow for a request, so this
+    shows the last report written by ``flask report-duplicate-faces``, along
+    with enrollments flagged as they happened.
+    """
+    limit = request.args.get('limit', 200, type=int)
+    report = read_duplicate_report(current_app.config['FACE_INDEX_PATH'])
+    pairs = [tuple(pair) for pair in report['pairs'][:limit]] if report else []
+    flags = read_enrollment_flags(current_app.config['FACE_INDEX_PATH'], limit=limit)
+    
+    voter_ids = {voter_id for pair in pairs for voter_id in pair[:2]}
+    voter_ids |= {flag['voter_id'] for flag in flags} | {flag['matches'][0][0] for flag in flags if flag['matches']}
+    voters_by_id = {v.id: v for v in Voter.query.filter(Voter.id.in_(voter_ids)).all()} if voter_ids else {}
+    
+    duplicates = [
+        {'voter': voters_by_id.get(a), 'other': voters_by_id.get(b), 'distance': distance}
+        for a, b, distance in pairs
+    ]
+    flagged = [
+        {'voter': voters_by_id.get(flag['voter_id']),
+         'other': voters_by_id.get(flag['matches'][0][0]) if flag['matches'] else None,
+         'distance': flag['matches'][0][2] if flag['matches'] else None,
+         'flagged_at': flag['flagged_at']}
+        for flag in flags
+    ]
+    return render_template('admin/duplicates.html', duplicates=duplicates, flagged=flagged, report=report,
+                           threshold=report['threshold'] if report else current_app.config['FACE_DUPLICATE_THRESHOLD'])
+
+@admin_bp.route('/stats/voter-cache')
+@admin_required
+def voter_cache_stats():
+    """Hit/miss/eviction counters of the voter template cache"""
+    return jsonify(get_voter_cache().stats())
+
+@admin_bp.route('/stats/snapshots')
+@admin_required
+def snapshot_writer_stats():
+    """Queue depth and write/dedup counters of the background snapshot writer"""
+    return jsonify(get_snapshot_writer().stats())
+
+@admin_bp.route('/stats/results-stream')
+@admin_required
+def results_stream_stats():
+    """Connected viewers and tally polls of the live results stream"""
+    return jsonify(get_results_publisher().stats())
+
+@admin_bp.route('/stats/exports')
+@admin_required
+def export_cache_stats():
+    """Hit/stale/render counters of the results export cache"""
+    return jsonify(get_export_cache().stats())
+
+@admin_bp.route('/stats/mail')
+@admin_required
+def mail_outbox_stats():
+    """Email outbox depth by status, delivery counters and enqueue-to-sent latency"""
+    return jsonify(get_mail_outbox().stats())
+
+@admin_bp.route('/stats/inference')
+@admin_required
+def inference_stats():
+    """Request/failure counters of the face inference service client (split deployments only)"""
+    client = current_app.extensions.get('inference_client')
+    return jsonify(client.stats() if client is not None else {})
+
+# AUDIT EXPORTS
+@admin_bp.route('/export/votes')
+@admin_required
+def export_votes():
+    """Per-vote audit rows (reference and choice, no voter identity) as CSV or XLSX"""
+    statement = (
+        select(Vote.id, Vote.audit_ref, Candidate.name, Party.name, Vote.nota)
+        .outerjoin(Candidate, Vote.candidate_id == Candidate.id)
+        .outerjoin(Party, Candidate.party_id == Party.id)
+        .order_by(Vote.id)
+    )
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return export_response(request.args.get('format', 'csv'), f'vote_audit_{timestamp}',
+                           ('Vote', 'Reference', 'Candidate', 'Party', 'NOTA'), stream_rows(statement),
+                           sheet_title='Votes')
+
+@admin_bp.route('/export/auth-events')
+@admin_required
+def export_auth_events():
+    """Face authentication log as CSV or XLSX"""
+    statement = select(
+        AuthEvent.id, AuthEvent.voter_id_input, AuthEvent.result, AuthEvent.distance,
+        AuthEvent.snapshot_path, AuthEvent.ip_address, AuthEvent.user_agent
+    ).order_by(AuthEvent.id)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return export_response(request.args.get('format', 'csv'), f'auth_events_{timestamp}',
+                           ('Event', 'Voter ID', 'Result', 'Distance', 'Snapshot', 'IP Address', 'User Agent'),
+                           stream_rows(statement), sheet_title='Auth Events')
+
+@admin_bp.route('/prewarm-templates', methods=['POST'])
+@admin_required
+def prewarm_templates():
+    """Preload enrolled face templates for an ID range before polls open"""
+    store = get_template_store()
+    if store is None:
+        flash('Template store is not configured', 'error')
+        return redirect(url_for('admin.dashboard'))
+    
+    start_id = request.form.get('start_id', type=int)
+    end_id = request.form.get('end_id', type=int)
+    constituency = request.form.get('constituency') or None
+    app = current_app._get_current_object()
+    
+    def build():
+        with app.app_context():
+            try:
+                rows = store.build(start_id=start_id, end_id=end_id, constituency=constituency)
+                get_voter_cache().clear()
+                app.logger.info(f"Prewarmed {rows} face template(s) for {len(store)} voter(s)")
+            except Exception as e:
+                app.logger.error(f"Error prewarming templates: {str(e)}")
+    
+    thread = threading.Thread(target=build)
+    thread.daemon = True
+    thread.start()
+    
+    flash('Template prewarm started. Booths will use it as soon as it completes.', 'success')
+    return redirect(url_for('admin.dashboard'))
+
 # PARTIES MANAGEMENT
 @admin_bp.route('/parties')
 @admin_required
@@ -209,6 +390,7 @@ def add_party():
             
             db.session.add(party)
             db.session.commit()
+            get_ballot_cache().invalidate()
             
             flash('Party added successfully', 'success')
             return redirect(url_for('admin.parties'))
@@ -245,6 +427,7 @@ def edit_party(party_id):
             
             party.updated_at = datetime.utcnow()
             db.session.commit()
+            get_ballot_cache().invalidate()
             
             flash('Party updated successfully', 'success')
             return redirect(url_for('admin.parties'))
@@ -268,6 +451,7 @@ def delete_party(party_id):
         
         db.session.delete(party)
         db.session.commit()
+        get_ballot_cache().invalidate()
         flash('Party deleted successfully', 'success')
         
     except Exception as e:
@@ -310,6 +494,7 @@ def add_candidate():
             
             db.session.add(candidate)
             db.session.commit()
+            get_ballot_cache().invalidate()
             
             flash('Candidate added successfully', 'success')
             return redirect(url_for('admin.candidates'))
@@ -348,6 +533,7 @@ def edit_candidate(candidate_id):
             
             candidate.updated_at = datetime.utcnow()
             db.session.commit()
+            get_ballot_cache().invalidate()
             
             flash('Candidate updated successfully', 'success')
             return redirect(url_for('admin.candidates'))
@@ -371,6 +557,7 @@ def delete_candidate(candidate_id):
         
         db.session.delete(candidate)
         db.session.commit()
+        get_ballot_cache().invalidate()
         flash('Candidate deleted successfully', 'success')
         
     except Exception as e:
@@ -396,7 +583,11 @@ def rollback_votes():
         for voter in voters:
             voter.has_voted = False
         
+        # Also bumps the tally version, so cached exports are rendered afresh
+        reset_vote_counters()
         db.session.commit()
+        get_voter_cache().clear()
+        get_export_cache().clear()
         
         flash('All voting history has been cleared successfully. Election can be restarted fresh.', 'success')
         
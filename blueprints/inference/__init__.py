@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+inference_bp = Blueprint('inference', __name__)
+
+from . import routes
@@ -0,0 +1,44 @@
+from flask import request, jsonify, current_app
+from . import inference_bp
+from services.face_image import FaceImage
+from services.face_service import ENCODER_BUSY_ERRORS
+from services.model_registry import get_face_service
+import base64
+import numpy as np
+
+@inference_bp.route('/encode', methods=['POST'])
+def encode():
+    """Encode one uploaded frame for a web worker, optionally checking liveness alongside"""
+    face_image = FaceImage(request.get_data())
+    if not len(face_image):
+        return jsonify({'error': 'No image data provided'}), 400
+    
+    roi = request.args.get('roi')
+    roi_hint = tuple(int(v) for v in roi.split(',')) if roi else None
+    
+    face_service = get_face_service()
+    liveness_task = (face_service.start_liveness_detection(face_image, roi_hint=roi_hint,
+                                                           session_key=request.args.get('liveness_key'))
+                     if request.args.get('liveness') == '1' else None)
+    try:
+        encoding = face_service.encode_face_image(face_image, roi_hint=roi_hint)
+    except ENCODER_BUSY_ERRORS as e:
+        # The web worker turns this into a "busy, retry" answer for the voter
+        return jsonify({'error': f'Encoder busy: {e}'}), 503
+    
+    response = {
+        'encoding': base64.b64encode(np.asarray(encoding, dtype='<f4').tobytes()).decode('ascii') if encoding is not None else None,
+        'face_box': [int(v) for v in face_service.last_face_box] if face_service.last_face_box is not None else None,
+        'timings': face_service.last_timings,
+        'preprocess_profile': face_service.last_preprocess_profile,
+        'queue_wait_ms': face_service.last_queue_wait_ms,
+    }
+    if liveness_task is not None:
+        response['liveness'] = liveness_task.result()
+    return jsonify(response)
+
+@inference_bp.route('/health')
+def health():
+    """Readiness probe for the process supervisor"""
+    registry = current_app.extensions['face_models']
+    return jsonify({'model': registry.model_name, 'loaded': registry.loaded})
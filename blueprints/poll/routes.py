@@ -1,12 +1,16 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify, session, current_app
 from flask_mail import Mail
 from . import poll_bp
-from models import db, Voter, VoterFace, Party, Candidate, Vote, AuthEvent
-from services.face_service import FaceService
+from models import db, Voter, Party, AuthEvent
+from services.face_image import FaceImage
+from services.face_service import ENCODER_BUSY_ERRORS
+from services.inference_client import InferenceBusy, get_face_service
 from services.email_service import EmailService
-import os
+from services.voter_cache import get_voter_cache
+from services.snapshot_writer import get_snapshot_writer
+from services.ballot_cache import get_ballot_cache
+from services.vote_service import record_vote
 import uuid
-from datetime import datetime
 
 @poll_bp.route('/auth/start')
 def auth_start():
@@ -17,15 +21,25 @@ def auth_start():
 def verify_auth():
     """Verify voter authentication via face recognition with AI liveness detection"""
     try:
-        data = request.json
-        voter_id_input = data.get('voter_id')
-        image_data = data.get('image_data')
+        # Compact JPEG crop posted as multipart by the capture script; base64 JSON is still accepted
+        upload = request.files.get('image')
+        if upload is not None:
+            voter_id_input = request.form.get('voter_id')
+            face_image = FaceImage(upload.read())
+        else:
+            data = request.get_json(silent=True) or {}
+            voter_id_input = data.get('voter_id')
+            face_image = FaceImage.from_base64(data['image_data']) if data.get('image_data') else None
 
-        if not voter_id_input or not image_data:
+        if not voter_id_input or not face_image:
             return jsonify({'success': False, 'message': 'Missing voter ID or image data'})
 
-        # Find voter
-        voter = Voter.query.filter_by(voter_id=voter_id_input).first()
+        # Find voter, served from the template cache on retries
+        voter_cache = get_voter_cache()
+        voter = voter_cache.get(voter_id_input)
+        if voter is None:
+            voter_record = Voter.query.filter_by(voter_id=voter_id_input).first()
+            voter = voter_cache.load(voter_record) if voter_record else None
 
         if not voter:
             # Log unknown voter attempt
@@ -43,32 +57,42 @@ def verify_auth():
         if voter.has_voted:
             return jsonify({'success': False, 'message': 'You have already voted'})
 
-        # Get stored face encodings
-        face_encodings = [face.get_encoding() for face in voter.faces]
+        # Stored face encodings as a pre-normalized template matrix
+        face_encodings = voter.templates
 
-        if not face_encodings:
+        if face_encodings.shape[0] == 0:
             return jsonify({'success': False, 'message': 'No face data enrolled for this voter'})
 
         # Initialize face service with configured threshold (0.30 for VGG-Face cosine distance)
         threshold = current_app.config.get('FACE_THRESHOLD', 0.30)
-        face_service = FaceService(threshold=threshold)
+        face_service = get_face_service(threshold)
         current_app.logger.info(f"Initialized FaceService with threshold: {threshold}")
 
-        # AI Liveness Detection (anti-spoofing)
-        liveness_result = face_service.ai_liveness_detection(image_data)
+        # Search near the face found in this booth's previous frame first
+        roi_hint = session.get('face_roi')
+        roi_hint = tuple(roi_hint) if roi_hint else None
+
+        # AI Liveness Detection (anti-spoofing) runs in the background while the face is encoded;
+        # a local provider shares the encoder's face detection and compares with the voter's last frame
+        liveness_task = face_service.start_liveness_detection(face_image, roi_hint=roi_hint,
+                                                              session_key=voter.voter_id)
+
+        # Encode captured face
+        test_encoding = face_service.encode_face_image(face_image, roi_hint=roi_hint)
+        if face_service.last_face_box is not None:
+            session['face_roi'] = [int(v) for v in face_service.last_face_box]
+
+        # Wait for the liveness verdict, bounded by LIVENESS_DEADLINE
+        liveness_result = liveness_task.result()
         current_app.logger.info(f"Liveness detection result for voter {voter_id_input}: {liveness_result}")
 
         # Only reject if AI explicitly detected a fake face (is_live = False)
         # If is_live = None (AI not available), skip liveness check and rely on face matching
         if liveness_result.get('is_live') == False:
             current_app.logger.warning(f"AI detected fake face for voter {voter_id_input}")
-            # Fake face detected by AI
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            snapshot_filename = f"fake_{voter.voter_id}_{timestamp}.jpg"
-            snapshot_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 
-                                        'fraud_attempts', 
-                                        snapshot_filename)
-            face_service.save_image_from_base64(image_data, snapshot_path)
+            # Fake face detected by AI - snapshot is written in the background under its content hash
+            snapshot = get_snapshot_writer().submit(face_image.raw, 'fraud_attempts', sha256=face_image.sha256)
+            snapshot_path = snapshot.path
 
             # Log fake face attempt
             auth_event = AuthEvent(
@@ -83,6 +107,9 @@ def verify_auth():
             db.session.add(auth_event)
             db.session.commit()
 
+            # The alert attaches the snapshot, so let it reach disk first
+            snapshot.result(timeout=current_app.config['SNAPSHOT_ATTACH_TIMEOUT'])
+
             # Send alert email
             email_service = EmailService(mail_instance=current_app.extensions.get('mail'))
             email_service.send_auth_failure_alert(
@@ -108,22 +135,22 @@ def verify_auth():
             current_app.logger.warning(f"AI liveness detection unavailable for voter {voter_id_input}: {ai_reason}")
             current_app.logger.warning(f"Relying on face matching only (threshold: {current_app.config['FACE_THRESHOLD']}) - Consider configuring OPENAI_API_KEY or GEMINI_API_KEY for enhanced security")
 
-        # Encode captured face
-        test_encoding = face_service.encode_face_from_base64(image_data)
-
         if test_encoding is None:
             return jsonify({'success': False, 'message': 'No face detected in image. Please try again'})
 
+        if face_service.registry is not None and face_service.registry.batcher is not None:
+            current_app.logger.info(f"Embedding queue wait for voter {voter_id_input}: {face_service.last_queue_wait_ms:.1f}ms")
+        if face_service.last_timings:
+            stages = ', '.join(f"{stage}={ms:.1f}ms" for stage, ms in face_service.last_timings.items())
+            current_app.logger.info(f"Face pipeline timings for voter {voter_id_input} ({len(face_image)} byte upload, preprocess profile {face_service.last_preprocess_profile}): {stages}")
+
         # Verify face against stored encodings
         is_match, distance = face_service.verify_face(face_encodings, test_encoding)
 
-        # Save snapshot
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        snapshot_filename = f"auth_{voter.voter_id}_{timestamp}.jpg"
-        snapshot_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 
-                                    'fraud_attempts' if not is_match else 'faces', 
-                                    snapshot_filename)
-        face_service.save_image_from_base64(image_data, snapshot_path)
+        # Save snapshot off the request thread; the content-addressed path is known up front
+        snapshot = get_snapshot_writer().submit(face_image.raw, 'fraud_attempts' if not is_match else 'faces',
+                                                sha256=face_image.sha256)
+        snapshot_path = snapshot.path
 
         # Log auth event
         auth_event = AuthEvent(
@@ -157,6 +184,7 @@ def verify_auth():
             })
         else:
             # Failure - send alert emails (this is a face mismatch, not necessarily fake)
+            snapshot.result(timeout=current_app.config['SNAPSHOT_ATTACH_TIMEOUT'])
             email_service = EmailService(mail_instance=current_app.extensions.get('mail'))
             email_service.send_auth_failure_alert(
                 voter_id_input=voter_id_input,
@@ -174,6 +202,13 @@ def verify_auth():
                 'distance': distance
             })
 
+    except ENCODER_BUSY_ERRORS + (InferenceBusy,) as e:
+        # Saturated encoders are transient: ask the booth to retry rather than report a failed match
+        current_app.logger.warning(f"Face encoders busy in verify_auth: {str(e)}")
+        response = jsonify({'success': False, 'busy': True,
+                            'message': 'Face verification is busy, please try again in a moment'})
+        response.headers['Retry-After'] = '2'
+        return response, 503
     except Exception as e:
         current_app.logger.error(f"Error in verify_auth: {str(e)}")
         import traceback
@@ -201,16 +236,9 @@ def cast_vote():
         if 'authenticated_voter_id' not in session:
             return jsonify({'success': False, 'message': 'Not authenticated'})
 
-        voter_id = session['authenticated_voter_id']
-        voter = Voter.query.get(voter_id)
-
-        if not voter:
-            return jsonify({'success': False, 'message': 'Voter not found'})
-
-        if voter.has_voted:
-            return jsonify({'success': False, 'message': 'Already voted'})
+        voter_pk = session['authenticated_voter_id']
 
-        data = request.json
+        data = request.get_json(silent=True) or {}
         candidate_id = data.get('candidate_id')
         nota = data.get('nota', False)
 
@@ -221,29 +249,25 @@ def cast_vote():
         if nota and candidate_id:
             return jsonify({'success': False, 'message': 'Cannot select both candidate and NOTA'})
 
+        candidate_id = int(candidate_id) if candidate_id and not nota else None
+        ballot = get_ballot_cache()
+        if candidate_id is not None and ballot.get(candidate_id) is None:
+            return jsonify({'success': False, 'message': 'Invalid candidate'})
+
         # Generate audit reference
         audit_ref = str(uuid.uuid4())[:8].upper()
 
-        # Create vote
-        vote = Vote(
-            voter_id=voter.id,
-            candidate_id=int(candidate_id) if candidate_id and not nota else None,
-            nota=nota,
-            audit_ref=audit_ref
-        )
+        # One conditional UPDATE ... RETURNING plus the insert, in a single transaction
+        voter = record_vote(voter_pk, candidate_id, nota, audit_ref)
+        if voter is None:
+            if db.session.query(Voter.id).filter_by(id=voter_pk).first() is None:
+                return jsonify({'success': False, 'message': 'Voter not found'})
+            return jsonify({'success': False, 'message': 'Already voted'})
 
-        # Mark voter as voted
-        voter.has_voted = True
-
-        db.session.add(vote)
-        db.session.commit()
+        get_voter_cache().invalidate(voter.voter_id)
 
         # Determine choice for email
-        if nota:
-            choice = "NOTA (None of the Above)"
-        else:
-            candidate = Candidate.query.get(int(candidate_id))
-            choice = f"{candidate.name} ({candidate.party.name})" if candidate else "Unknown"
+        choice = ballot.choice_label(candidate_id, nota)
 
         # Send confirmation email
         email_service = EmailService(mail_instance=current_app.extensions.get('mail'))
@@ -1,137 +1,66 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, make_response
+from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, Response
 from . import results_bp
-from models import Vote, Candidate, Party, Voter, db
-from sqlalchemy import func
-import pandas as pd
+from services.tally import read_tally
+from services.results_publisher import get_results_publisher
+from services.export_stream import XLSX_MIMETYPE, csv_chunks, xlsx_chunks
+from services.export_cache import get_export_cache
+import os
 from io import BytesIO
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
+RESULT_COLUMNS = ('Candidate', 'Party', 'Votes')
 
 @results_bp.route('/live')
 def live():
     """Live results page"""
-    results = db.session.query(
-        Candidate.name.label('candidate_name'),
-        Party.name.label('party_name'),
-        func.count(Vote.id).label('vote_count')
-    ).select_from(Vote).join(
-        Candidate, Vote.candidate_id == Candidate.id
-    ).join(
-        Party, Candidate.party_id == Party.id
-    ).group_by(
-        Candidate.id, Candidate.name, Party.name
-    ).order_by(
-        func.count(Vote.id).desc()
-    ).all()
-    
-    nota_votes = Vote.query.filter_by(candidate_id=None).count()
-    total_votes = Vote.query.count()
-    total_voters = Voter.query.count()
-    turnout_percentage = (total_votes / total_voters * 100) if total_voters > 0 else 0
+    # Counters maintained by cast_vote - no aggregate over the votes table
+    tally = read_tally()
     
     return render_template('results/live.html', 
-                         results=results,
-                         nota_votes=nota_votes,
-                         total_votes=total_votes,
-                         total_voters=total_voters,
-                         turnout_percentage=turnout_percentage,
+                         results=tally.results,
+                         nota_votes=tally.nota_votes,
+                         total_votes=tally.total_votes,
+                         total_voters=tally.total_voters,
+                         turnout_percentage=tally.turnout_percentage,
                          now=datetime.now().strftime('%B %d, %Y at %I:%M %p'))
 
-@results_bp.route('/export/csv')
-def export_csv():
-    """Export results as CSV"""
-    results = db.session.query(
-        Candidate.name.label('Candidate'),
-        Party.name.label('Party'),
-        func.count(Vote.id).label('Votes')
-    ).select_from(Vote).join(
-        Candidate, Vote.candidate_id == Candidate.id
-    ).join(
-        Party, Candidate.party_id == Party.id
-    ).group_by(
-        Candidate.id, Candidate.name, Party.name
-    ).order_by(
-        func.count(Vote.id).desc()
-    ).all()
-    
-    df = pd.DataFrame(results, columns=['Candidate', 'Party', 'Votes'])
-    
-    nota_votes = Vote.query.filter_by(candidate_id=None).count()
-    if nota_votes > 0:
-        df = pd.concat([df, pd.DataFrame([['NOTA', '-', nota_votes]], columns=['Candidate', 'Party', 'Votes'])], ignore_index=True)
-    
-    df.loc['Total'] = ['', 'Total Votes', df['Votes'].sum()]
-    
-    output = BytesIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return send_file(output, 
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name=f'election_results_{timestamp}.csv')
+@results_bp.route('/stream')
+def stream():
+    """Server-sent events feed of the live results"""
+    events = get_results_publisher().events(request.headers.get('Last-Event-ID'))
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop nginx from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
 
-@results_bp.route('/export/excel')
-def export_excel():
-    """Export results as Excel"""
-    results = db.session.query(
-        Candidate.name.label('Candidate'),
-        Party.name.label('Party'),
-        func.count(Vote.id).label('Votes')
-    ).select_from(Vote).join(
-        Candidate, Vote.candidate_id == Candidate.id
-    ).join(
-        Party, Candidate.party_id == Party.id
-    ).group_by(
-        Candidate.id, Candidate.name, Party.name
-    ).order_by(
-        func.count(Vote.id).desc()
-    ).all()
-    
-    df = pd.DataFrame(results, columns=['Candidate', 'Party', 'Votes'])
-    
-    nota_votes = Vote.query.filter_by(candidate_id=None).count()
-    if nota_votes > 0:
-        df = pd.concat([df, pd.DataFrame([['NOTA', '-', nota_votes]], columns=['Candidate', 'Party', 'Votes'])], ignore_index=True)
-    
-    df.loc['Total'] = ['', 'Total Votes', df['Votes'].sum()]
-    
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Election Results', index=False)
-    output.seek(0)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return send_file(output, 
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name=f'election_results_{timestamp}.xlsx')
+def _result_rows(tally):
+    """Candidate rows, then NOTA and the total, as exported"""
+    for row in tally.results:
+        yield (row.candidate_name, row.party_name, row.vote_count)
+    if tally.nota_votes > 0:
+        yield ('NOTA', '-', tally.nota_votes)
+    yield ('', 'Total Votes', tally.total_votes)
 
-@results_bp.route('/export/pdf')
-def export_pdf():
-    """Export results as PDF"""
-    results = db.session.query(
-        Candidate.name.label('candidate_name'),
-        Party.name.label('party_name'),
-        func.count(Vote.id).label('vote_count')
-    ).select_from(Vote).join(
-        Candidate, Vote.candidate_id == Candidate.id
-    ).join(
-        Party, Candidate.party_id == Party.id
-    ).group_by(
-        Candidate.id, Candidate.name, Party.name
-    ).order_by(
-        func.count(Vote.id).desc()
-    ).all()
-    
-    nota_votes = Vote.query.filter_by(candidate_id=None).count()
-    total_votes = Vote.query.count()
+def _render_csv(tally) -> bytes:
+    return b''.join(csv_chunks(RESULT_COLUMNS, _result_rows(tally)))
+
+def _render_xlsx(tally) -> bytes:
+    return b''.join(xlsx_chunks('Election Results', RESULT_COLUMNS, _result_rows(tally)))
+
+def _render_pdf(tally) -> bytes:
+    """Results report as PDF bytes"""
+    # ReportLab is only needed when a report is rendered, which the export cache makes rare
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.enums import TA_CENTER
+
+    results = tally.results
+    nota_votes = tally.nota_votes
+    total_votes = tally.total_votes
     
     output = BytesIO()
     doc = SimpleDocTemplate(output, pagesize=letter)
@@ -198,10 +127,31 @@ def export_pdf():
     elements.append(table)
     
     doc.build(elements)
-    output.seek(0)
-    
-    timestamp_file = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return send_file(output, 
-                    mimetype='application/pdf',
+    return output.getvalue()
+
+def _send_export(extension, mimetype, render):
+    """Serve a results export from the export cache, with its cache key as the ETag"""
+    key, path = get_export_cache().get('results', extension, read_tally(), render)
+    rendered_at = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d_%H%M%S')
+    # conditional=True answers If-None-Match with 304 Not Modified
+    return send_file(path,
+                    mimetype=mimetype,
                     as_attachment=True,
-                    download_name=f'election_results_{timestamp_file}.pdf')
\ No newline at end of file
+                    download_name=f'election_results_{rendered_at}.{extension}',
+                    etag=key,
+                    conditional=True)
+
+@results_bp.route('/export/csv')
+def export_csv():
+    """Export results as CSV"""
+    return _send_export('csv', 'text/csv', _render_csv)
+
+@results_bp.route('/export/excel')
+def export_excel():
+    """Export results as Excel"""
+    return _send_export('xlsx', XLSX_MIMETYPE, _render_xlsx)
+
+@results_bp.route('/export/pdf')
+def export_pdf():
+    """Export results as PDF"""
+    return _send_export('pdf', 'application/pdf', _render_pdf)
\ No newline at end of file
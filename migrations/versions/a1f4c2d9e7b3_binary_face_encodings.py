@@ -0,0 +1,93 @@
+"""store voter face encodings as binary float32
+
+The VoterFace model must declare the column as
+``encoding = db.Column(db.LargeBinary, nullable=False)`` once this runs.
+
+Revision ID: a1f4c2d9e7b3
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import json
+import struct
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a1f4c2d9e7b3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of format version 1 of services/encoding_codec.py, so this
+# revision keeps working whatever later happens to the application code:
+# magic b'FE', version, dtype code (0 = float32, 1 = float16), uint32 dimension
+MAGIC = b'FE'
+HEADER = struct.Struct('<2sBBI')
+ITEM_FORMATS = {0: 'f', 1: 'e'}
+
+
+def _is_packed(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == MAGIC
+
+
+def pack_encoding(values):
+    """List of floats as a version 1 float32 record"""
+    return HEADER.pack(MAGIC, 1, 0, len(values)) + struct.pack(f'<{len(values)}f', *values)
+
+
+def unpack_encoding(data):
+    """Stored value, binary or legacy JSON text, as a list of floats"""
+    if _is_packed(data):
+        data = bytes(data)
+        _, version, code, dim = HEADER.unpack_from(data, 0)
+        if version != 1:
+            raise ValueError(f"Unsupported encoding format version: {version}")
+        return list(struct.unpack_from(f'<{dim}{ITEM_FORMATS[code]}', data, HEADER.size))
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return [float(v) for v in json.loads(data)]
+
+
+def _convert(source, target, transform):
+    """Copy voter_face.<source> into <target> in id-ordered batches"""
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(f"SELECT id, {source} FROM voter_face "
+                    f"WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            sa.text(f"UPDATE voter_face SET {target} = :value WHERE id = :id"),
+            [{"id": row[0], "value": transform(row[1]) if row[1] is not None else None} for row in rows]
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    with op.batch_alter_table('voter_face', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('encoding_bin', sa.LargeBinary(), nullable=True))
+
+    _convert('encoding', 'encoding_bin', lambda text: pack_encoding(unpack_encoding(text)))
+
+    with op.batch_alter_table('voter_face', schema=None) as batch_op:
+        batch_op.drop_column('encoding')
+        batch_op.alter_column('encoding_bin', new_column_name='encoding')
+
+
+def downgrade():
+    with op.batch_alter_table('voter_face', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('encoding_text', sa.Text(), nullable=True))
+
+    _convert('encoding', 'encoding_text', lambda data: json.dumps(unpack_encoding(data)))
+
+    with op.batch_alter_table('voter_face', schema=None) as batch_op:
+        batch_op.drop_column('encoding')
+        batch_op.alter_column('encoding_text', new_column_name='encoding')
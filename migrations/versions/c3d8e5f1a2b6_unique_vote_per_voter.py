@@ -0,0 +1,25 @@
+"""one vote row per voter
+
+Revision ID: c3d8e5f1a2b6
+Revises: a1f4c2d9e7b3
+Create Date: 2026-10-18 12:00:00.000000
+
+Backstop for the conditional has_voted update in cast_vote. Upgrading
+fails if duplicate votes already exist; resolve those first with
+``SELECT voter_id FROM vote GROUP BY voter_id HAVING count(*) > 1``.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8e5f1a2b6'
+down_revision = 'a1f4c2d9e7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('uq_vote_voter_id', 'vote', ['voter_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_vote_voter_id', table_name='vote')
@@ -0,0 +1,39 @@
+"""sharded vote tally counters
+
+Revision ID: d4a9f6b2c7e1
+Revises: c3d8e5f1a2b6
+Create Date: 2026-10-18 13:00:00.000000
+
+Creates vote_tally and seeds it from the existing votes and voters, one
+row (shard 0) per counter. cast_vote keeps it current from then on;
+``flask reconcile-tally`` verifies it against the raw tables.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9f6b2c7e1'
+down_revision = 'c3d8e5f1a2b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'vote_tally',
+        sa.Column('counter', sa.String(length=32), nullable=False),
+        sa.Column('shard', sa.SmallInteger(), nullable=False),
+        sa.Column('count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('counter', 'shard')
+    )
+    op.execute(
+        "INSERT INTO vote_tally (counter, shard, count) "
+        "SELECT CASE WHEN candidate_id IS NULL THEN 'nota' ELSE 'c:' || candidate_id END, 0, count(*) "
+        "FROM vote GROUP BY candidate_id"
+    )
+    op.execute("INSERT INTO vote_tally (counter, shard, count) SELECT 'total', 0, count(*) FROM vote HAVING count(*) > 0")
+    op.execute("INSERT INTO vote_tally (counter, shard, count) SELECT 'voters', 0, count(*) FROM voter HAVING count(*) > 0")
+
+
+def downgrade():
+    op.drop_table('vote_tally')
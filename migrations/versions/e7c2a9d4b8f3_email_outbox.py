@@ -0,0 +1,43 @@
+"""email outbox
+
+Revision ID: e7c2a9d4b8f3
+Revises: d4a9f6b2c7e1
+Create Date: 2026-10-18 15:00:00.000000
+
+Durable queue for notification emails. EmailService inserts a row per
+message and the outbox workers deliver it, so mail queued before a crash
+or restart is still sent.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e7c2a9d4b8f3'
+down_revision = 'd4a9f6b2c7e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('subject', sa.Text(), nullable=False),
+        sa.Column('recipients', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('attachment_path', sa.String(length=512), nullable=True),
+        sa.Column('attachment_name', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=16), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_outbox_due', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_due', table_name='email_outbox')
+    op.drop_table('email_outbox')
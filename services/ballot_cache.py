@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from flask import current_app
+
+
+class BallotCache:
+    """In-process map of candidate id -> (candidate name, party name).
+
+    The ballot barely changes while polls are open, so the vote path reads
+    names from here instead of querying Candidate and Party for every vote.
+    Admin edits invalidate the local copy; other worker processes pick the
+    change up after ``ttl`` seconds. An id missing from the map is looked up
+    on its own by primary key, and ids that do not exist are remembered
+    until the next reload, so bogus ids never trigger full reloads.
+    """
+
+    MAX_MISSING = 1024
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._candidates: Dict[int, Tuple[str, str]] = {}
+        self._expires_at = 0.0
+        # Candidate ids known not to exist as of the last load
+        self._missing = set()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[int, Tuple[str, str]]:
+        from models import db, Candidate, Party
+
+        rows = db.session.query(Candidate.id, Candidate.name, Party.name).join(
+            Party, Candidate.party_id == Party.id).all()
+        return {candidate_id: (name, party_name) for candidate_id, name, party_name in rows}
+
+    def _load_one(self, candidate_id: int) -> Optional[Tuple[str, str]]:
+        from models import db, Candidate, Party
+
+        row = db.session.query(Candidate.name, Party.name).join(
+            Party, Candidate.party_id == Party.id).filter(Candidate.id == candidate_id).first()
+        return (row[0], row[1]) if row else None
+
+    def candidates(self) -> Dict[int, Tuple[str, str]]:
+        """Current candidate map, reloaded from the database when stale"""
+        with self._lock:
+            if time.monotonic() >= self._expires_at:
+                self._candidates = self._load()
+                self._missing = set()
+                self._expires_at = time.monotonic() + self.ttl
+            return self._candidates
+
+    def get(self, candidate_id: int) -> Optional[Tuple[str, str]]:
+        names = self.candidates().get(candidate_id)
+        if names is None and candidate_id not in self._missing:
+            # May have been added through another worker process since the last load
+            names = self._load_one(candidate_id)
+            with self._lock:
+                if names is not None:
+                    self._candidates = dict(self._candidates)
+                    self._candidates[candidate_id] = names
+                elif len(self._missing) < self.MAX_MISSING:
+                    self._missing.add(candidate_id)
+        return names
+
+    def choice_label(self, candidate_id: Optional[int], nota: bool) -> str:
+        """Human-readable ballot choice for confirmation emails"""
+        if nota:
+            return "NOTA (None of the Above)"
+        names = self.get(candidate_id)
+        return f"{names[0]} ({names[1]})" if names else "Unknown"
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires_at = 0.0
+
+
+def init_ballot_cache(app) -> BallotCache:
+    cache = BallotCache(ttl=app.config.get('BALLOT_CACHE_TTL', 60.0))
+    app.extensions['ballot_cache'] = cache
+    return cache
+
+
+def get_ballot_cache() -> BallotCache:
+    """Ballot cache for the current app"""
+    cache = current_app.extensions.get('ballot_cache')
+    if cache is None:
+        cache = init_ballot_cache(current_app._get_current_object())
+    return cache
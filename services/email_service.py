@@ -6,23 +6,15 @@ from email.mime.base import MIMEBase
 from email import encoders
 from typing import List, Optional
 from datetime import datetime
-import threading
 from flask import current_app
 from flask_mail import Mail, Message
 
+from services.mail_outbox import get_mail_outbox
+
 class EmailService:
     def __init__(self, mail_instance: Mail = None):
         self.mail = mail_instance
 
-    def _send_email_async(self, app, msg):
-        """Send email in a separate thread"""
-        try:
-            with app.app_context():
-                self.mail.send(msg)
-                app.logger.info(f"Email sent successfully to {msg.recipients}")
-        except Exception as e:
-            app.logger.error(f"Failed to send email: {str(e)}")
-
     def send_vote_confirmation(self, voter_email: str, voter_name: str, 
                              choice: str, audit_ref: str) -> bool:
         """Send vote confirmation email to voter"""
@@ -44,17 +36,8 @@ Thank you for participating in the democratic process.
 Best regards,
 Election Commission"""
 
-            msg = Message(
-                subject=subject,
-                recipients=[voter_email],
-                body=body
-            )
-
-            # Send asynchronously
-            app = current_app._get_current_object()
-            thread = threading.Thread(target=self._send_email_async, args=(app, msg))
-            thread.daemon = True
-            thread.start()
+            # Queued in the outbox and delivered by its SMTP workers
+            get_mail_outbox().enqueue(subject, [voter_email], body)
 
             return True
 
@@ -98,27 +81,15 @@ Smart Voting System Security"""
             if voter_email:
                 recipients.append(voter_email)
 
-            msg = Message(
-                subject=subject,
-                recipients=recipients,
-                body=body
+            # Queued in the outbox; the snapshot is attached when the message is sent
+            get_mail_outbox().enqueue(
+                subject,
+                recipients,
+                body,
+                attachment_path=snapshot_path,
+                attachment_name=f"auth_failure_{voter_id_input}_{timestamp_utc.replace(' ', '_').replace(':', '-')}.jpg"
             )
 
-            # Attach snapshot if available
-            if snapshot_path and os.path.exists(snapshot_path):
-                with current_app.open_resource(snapshot_path, 'rb') as fp:
-                    msg.attach(
-                        filename=f"auth_failure_{voter_id_input}_{timestamp_utc.replace(' ', '_').replace(':', '-')}.jpg",
-                        content_type="image/jpeg",
-                        data=fp.read()
-                    )
-
-            # Send asynchronously
-            app = current_app._get_current_object()
-            thread = threading.Thread(target=self._send_email_async, args=(app, msg))
-            thread.daemon = True
-            thread.start()
-
             return True
 
         except Exception as e:
@@ -144,17 +115,8 @@ You may now proceed to cast your vote.
 Best regards,
 Election Commission"""
 
-            msg = Message(
-                subject=subject,
-                recipients=[voter_email],
-                body=body
-            )
-
-            # Send asynchronously
-            app = current_app._get_current_object()
-            thread = threading.Thread(target=self._send_email_async, args=(app, msg))
-            thread.daemon = True
-            thread.start()
+            # Queued in the outbox and delivered by its SMTP workers
+            get_mail_outbox().enqueue(subject, [voter_email], body)
 
             return True
 
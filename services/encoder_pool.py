@@ -0,0 +1,212 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Per-process FaceService, built once by the pool initializer
+_worker_service = None
+
+
+def _init_worker(model_name: str, threshold: float, single_pass: bool = False,
+                 detection: Optional[dict] = None, preprocess_profile: str = 'nlm') -> None:
+    """Load the face models once inside each encoder process"""
+    global _worker_service
+    from services.model_registry import FaceModelRegistry
+
+    registry = FaceModelRegistry(model_name=model_name, warmup=True, single_pass=single_pass,
+                                 detection=detection, preprocess_profile=preprocess_profile)
+    registry.load()
+    _worker_service = registry.face_service(threshold)
+
+
+def _run_worker_encode(encode, payload, roi_hint) -> Tuple[Optional[np.ndarray], dict]:
+    """Run an encode on the worker's FaceService and collect what it recorded about the frame"""
+    _worker_service.last_face_box = None
+    _worker_service.last_preprocess_profile = None
+    _worker_service.last_queue_wait_ms = 0.0
+    _worker_service.last_timings = {}
+    encoding = encode(payload, roi_hint=roi_hint)
+    face_box = _worker_service.last_face_box
+    return encoding, {
+        'face_box': tuple(int(v) for v in face_box) if face_box is not None else None,
+        'timings': dict(_worker_service.last_timings),
+        'preprocess_profile': _worker_service.last_preprocess_profile,
+        'queue_wait_ms': _worker_service.last_queue_wait_ms,
+    }
+
+
+def _encode_job(base64_image: str, roi_hint=None) -> Tuple[Optional[np.ndarray], dict]:
+    """Decode, quality-check, preprocess and embed one image in a worker"""
+    return _run_worker_encode(_worker_service.encode_face_from_base64, base64_image, roi_hint)
+
+
+def _encode_bytes_job(image_bytes: bytes, roi_hint=None) -> Tuple[Optional[np.ndarray], dict]:
+    """Decode an uploaded JPEG/PNG buffer and embed it in a worker"""
+    return _run_worker_encode(_worker_service.encode_face_from_bytes, image_bytes, roi_hint)
+
+
+def _liveness_job(image_bytes: bytes, threshold: float, previous_eyes: Optional[int] = None):
+    """Local liveness verdict and eye count of an uploaded frame, computed in a worker"""
+    from services.face_image import FaceImage
+    from services.local_liveness import local_liveness_verdict
+
+    return local_liveness_verdict(_worker_service, FaceImage(image_bytes), threshold, previous_eyes)
+
+
+def _warm_job(hold: float) -> int:
+    """Runs once the initializer has loaded the models; held briefly so jobs spread over processes"""
+    time.sleep(hold)
+    return os.getpid()
+
+
+class EncoderPoolBusy(Exception):
+    """Raised when too many encode jobs are already pending"""
+
+
+class EncoderPool:
+    """Pool of encoder processes that runs face encoding off the request thread.
+
+    Image decoding, quality checks, preprocessing and DeepFace inference all
+    run in separate processes so they do not hold the GIL of the web worker.
+    The number of in-flight jobs is bounded and a crashed pool is rebuilt
+    transparently. A job that overruns its timeout cannot be cancelled once
+    a process has picked it up, so the whole pool is terminated and rebuilt
+    before the job's slot is given back; otherwise a few hung frames would
+    quietly tie up every process. Every process of a new pool loads its
+    models before the pool takes jobs, and that warm-up is waited for
+    without ``job_timeout``, so a model load is never mistaken for a hung job.
+
+    Jobs return ``(encoding, info)``, where ``info`` carries the face box,
+    stage timings and preprocessing profile recorded by the worker. Local
+    liveness checks run in the same processes.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, job_timeout: float = 20.0,
+                 model_name: str = "VGG-Face", threshold: float = 0.30, single_pass: bool = False,
+                 detection: Optional[dict] = None, preprocess_profile: str = 'nlm',
+                 warmup_timeout: float = 600.0):
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout
+        self.warmup_timeout = warmup_timeout
+        self.model_name = model_name
+        self.threshold = threshold
+        self.single_pass = single_pass
+        self.detection = detection
+        self.preprocess_profile = preprocess_profile
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        # Executor whose processes have all finished loading their models
+        self._warmed = None
+        self._warm_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Current pool, started and warmed first if needed"""
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps TensorFlow/OpenCV state from being forked into children
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.threshold, self.single_pass, self.detection,
+                              self.preprocess_profile)
+                )
+            executor = self._executor
+        if self._warmed is not executor:
+            self._warm_up(executor)
+        return executor
+
+    def _warm_up(self, executor: ProcessPoolExecutor) -> None:
+        """Start every process of ``executor`` and wait for its models to load
+
+        Processes are spawned on demand, so warm-up jobs are submitted until
+        each process has answered. Requests arriving meanwhile wait here too.
+        """
+        with self._warm_lock:
+            if self._warmed is executor:
+                return
+            started = time.monotonic()
+            pids = set()
+            try:
+                while len(pids) < self.workers:
+                    remaining = self.warmup_timeout - (time.monotonic() - started)
+                    futures = [executor.submit(_warm_job, 0.2) for _ in range(self.workers)]
+                    pids.update(future.result(timeout=max(0.0, remaining)) for future in futures)
+            except FutureTimeoutError:
+                print(f"Face encoder pool warmed {len(pids)} of {self.workers} workers "
+                      f"within {self.warmup_timeout}s; the rest load on their first job")
+            self._warmed = executor
+
+    def _reset(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _recycle(self, stuck: ProcessPoolExecutor) -> None:
+        """Kill the processes of a pool with a hung job; the next job starts a fresh pool"""
+        with self._lock:
+            if self._executor is stuck:
+                self._executor = None
+        # Jobs still running on other processes fail with BrokenProcessPool and are retried
+        for process in list((getattr(stuck, '_processes', None) or {}).values()):
+            if process.is_alive():
+                process.terminate()
+        stuck.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        """Spin up and warm the worker processes ahead of the first request"""
+        self._get_executor()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_job(self, job, *args, default=(None, {})):
+        """Run ``job(*args)`` on a warmed worker; ``default`` is returned on timeout or repeated crashes"""
+        if not self._slots.acquire(timeout=self.job_timeout):
+            raise EncoderPoolBusy("Face encoder pool is busy")
+
+        try:
+            # One retry covers a worker that died mid-job (e.g. OOM kill)
+            for attempt in range(2):
+                executor = None
+                try:
+                    executor = self._get_executor()
+                    future = executor.submit(job, *args)
+                    return future.result(timeout=self.job_timeout)
+                except BrokenProcessPool:
+                    print("Face encoder pool crashed, restarting workers")
+                    if executor is not None:
+                        self._reset(executor)
+                except FutureTimeoutError:
+                    if not future.cancel():
+                        self._recycle(executor)
+                    print(f"Face encoder job timed out after {self.job_timeout}s")
+                    return default
+            return default
+        finally:
+            self._slots.release()
+
+    def encode_base64(self, base64_image: str, roi_hint=None) -> Tuple[Optional[np.ndarray], dict]:
+        """Encode a base64 image in a worker process"""
+        return self._run_job(_encode_job, base64_image, roi_hint)
+
+    def encode_bytes(self, image_bytes: bytes, roi_hint=None) -> Tuple[Optional[np.ndarray], dict]:
+        """Encode an uploaded image buffer in a worker process"""
+        return self._run_job(_encode_bytes_job, image_bytes, roi_hint)
+
+    def check_liveness(self, image_bytes: bytes, threshold: float,
+                       previous_eyes: Optional[int] = None) -> Tuple[Dict[str, any], Optional[int]]:
+        """Local liveness verdict and eye count of an uploaded frame, computed in a worker process"""
+        timed_out = ({"is_live": None, "confidence": 0.0, "ai_available": False,
+                      "reason": "Local liveness check timed out in the encoder pool - skipping liveness check"}, None)
+        return self._run_job(_liveness_job, image_bytes, threshold, previous_eyes, default=timed_out)
@@ -0,0 +1,176 @@
+import os
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+from flask import current_app
+
+
+class ExportCache:
+    """Rendered result exports (PDF, CSV, XLSX) on disk, keyed by tally version.
+
+    The key combines the tally ``version`` counter, which every vote and
+    rollback bumps, with a digest of the ballot names, so a file is only
+    ever rendered once per election state and doubles as the ETag.
+
+    A request for the current key is a file read. When only an older
+    rendering exists it is served as-is and a refresh is queued on a
+    background thread; with no file at all the request renders it, and
+    concurrent requests for the same key wait on that one render.
+    """
+
+    def __init__(self, app, root: str, keep: int = 2):
+        self.app = app
+        self.root = root
+        self.keep = max(1, keep)
+        self._lock = threading.Lock()
+        self._rendering: Dict[str, Future] = {}
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-render')
+        self.hits = 0
+        self.stale = 0
+        self.renders = 0
+
+    def key_for(self, tally) -> str:
+        from services.ballot_cache import get_ballot_cache
+
+        ballot = zlib.crc32(repr(sorted(get_ballot_cache().candidates().items())).encode('utf-8'))
+        return f"v{tally.version}-{ballot:08x}"
+
+    def path_for(self, name: str, key: str, extension: str) -> str:
+        return os.path.join(self.root, f"{name}-{key}.{extension}")
+
+    def _renderings(self, name: str, extension: str):
+        """(mtime, key, path) of every finished rendering of an export, newest first"""
+        prefix, suffix = f"{name}-", f".{extension}"
+        found = []
+        try:
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix) and entry.name.endswith(suffix):
+                        found.append((entry.stat().st_mtime, entry.name[len(prefix):-len(suffix)], entry.path))
+        except FileNotFoundError:
+            pass
+        found.sort(reverse=True)
+        return found
+
+    def get(self, name: str, extension: str, tally, render: Callable[[object], bytes]) -> Tuple[str, str]:
+        """(key, path) of the export to serve for ``tally``
+
+        Args:
+            name: Export name, e.g. 'results'
+            extension: File extension, which also tells the formats apart
+            tally: Current Tally
+            render: Builds the file contents from a Tally
+        """
+        key = self.key_for(tally)
+        path = self.path_for(name, key, extension)
+        if os.path.exists(path):
+            self.hits += 1
+            return key, path
+
+        renderings = self._renderings(name, extension)
+        if renderings:
+            self.stale += 1
+            self._schedule_refresh(name, extension, render)
+            _, stale_key, stale_path = renderings[0]
+            return stale_key, stale_path
+
+        return key, self._render(name, extension, key, tally, render)
+
+    def _render(self, name: str, extension: str, key: str, tally, render) -> str:
+        path = self.path_for(name, key, extension)
+        with self._lock:
+            future = self._rendering.get(path)
+            owner = future is None
+            if owner:
+                future = self._rendering[path] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            data = render(tally)
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.renders += 1
+            self._prune(name, extension)
+            future.set_result(path)
+            return path
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._rendering.pop(path, None)
+
+    def _schedule_refresh(self, name: str, extension: str, render) -> None:
+        with self._lock:
+            if (name, extension) in self._refreshing:
+                return
+            self._refreshing.add((name, extension))
+        self._executor.submit(self._refresh, name, extension, render)
+
+    def _refresh(self, name: str, extension: str, render) -> None:
+        from models import db
+        from services.tally import read_tally
+
+        try:
+            with self.app.app_context():
+                try:
+                    # Render whatever is current by now, not the state that triggered the refresh
+                    tally = read_tally()
+                    key = self.key_for(tally)
+                    if not os.path.exists(self.path_for(name, key, extension)):
+                        self._render(name, extension, key, tally, render)
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            print(f"Error rendering {name}.{extension} export: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard((name, extension))
+
+    def _prune(self, name: str, extension: str) -> None:
+        # The previous rendering is kept for requests that may still be sending it
+        for _, _, path in self._renderings(name, extension)[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """Drop every rendering, e.g. after a rollback, so stale results are never served"""
+        try:
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'stale': self.stale,
+            'renders': self.renders,
+        }
+
+
+def init_export_cache(app) -> ExportCache:
+    cache = ExportCache(app, app.config['EXPORT_CACHE_PATH'])
+    app.extensions['export_cache'] = cache
+    return cache
+
+
+def get_export_cache() -> ExportCache:
+    """Export cache for the current app"""
+    cache = current_app.extensions.get('export_cache')
+    if cache is None:
+        cache = init_export_cache(current_app._get_current_object())
+    return cache
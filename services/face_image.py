@@ -0,0 +1,91 @@
+import base64
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class FaceImage:
+    """One uploaded frame, shared by every stage of a request.
+
+    Holds the raw JPEG/PNG bytes and lazily computes the decoded BGR array,
+    the content hash and the base64 form, each at most once. Liveness,
+    encoding and snapshot saving all take the same object instead of
+    re-decoding a base64 string.
+
+    OpenCV is imported on first decode, so the web tier of a split
+    deployment can pass frames around without loading it. The request
+    thread and its liveness thread may touch the same frame, so decoding and
+    the shared analysis are guarded by a per-image lock.
+    """
+
+    __slots__ = ('raw', 'decode_ms', '_bgr', '_decoded', '_sha256', '_base64', '_analysis', '_lock')
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.decode_ms = 0.0
+        self._bgr = None
+        self._decoded = False
+        self._sha256 = None
+        self._base64 = None
+        self._analysis = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_base64(cls, base64_image: str) -> 'FaceImage':
+        """Build from a base64 (optionally data URL) string"""
+        # Remove data URL prefix if present
+        if ',' in base64_image:
+            base64_image = base64_image.split(',')[1]
+        image = cls(base64.b64decode(base64_image))
+        image._base64 = base64_image
+        return image
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    @property
+    def bgr(self) -> Optional['np.ndarray']:
+        """Decoded BGR array, or None when the bytes are not an image"""
+        if not self._decoded:
+            with self._lock:
+                if not self._decoded:
+                    import cv2
+                    import numpy as np
+
+                    start = time.perf_counter()
+                    self._bgr = cv2.imdecode(np.frombuffer(self.raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    self.decode_ms = (time.perf_counter() - start) * 1000.0
+                    self._decoded = True
+        return self._bgr
+
+    def analysis(self, face_service, roi_hint: Optional[Tuple[int, int, int, int]] = None):
+        """FaceAnalysis of this frame shared by encoding and local liveness
+
+        Created by the first caller with its FaceService and ROI hint; later
+        callers get the same object. None when the bytes are not an image.
+        """
+        with self._lock:
+            if self._analysis is None:
+                image = self.bgr
+                if image is None:
+                    return None
+                self._analysis = face_service.analyze(image, roi_hint=roi_hint)
+            return self._analysis
+
+    @property
+    def sha256(self) -> str:
+        """Content hash, used as the liveness cache key"""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.raw).hexdigest()
+        return self._sha256
+
+    @property
+    def base64(self) -> str:
+        """Base64 payload for vendor APIs"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.raw).decode('ascii')
+        return self._base64
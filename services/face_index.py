@@ -0,0 +1,695 @@
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import click
+import numpy as np
+from flask import current_app, has_request_context
+
+from services.encoding_codec import unpack_encoding
+
+# Journal record header: op, face_id, voter_id, vector dims (0 when no vector follows)
+RECORD = struct.Struct('<cqqI')
+
+
+@contextmanager
+def _path_lock(path: str, name: str):
+    """Exclusive cross-process lock on its own file descriptor, for long-running index maintenance"""
+    os.makedirs(path, exist_ok=True)
+    fd = os.open(os.path.join(path, name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class FaceIndex:
+    """Approximate nearest-neighbour index over all enrolled face encodings.
+
+    An inverted-file (IVF) index built on NumPy: a spherical k-means coarse
+    quantizer splits the normalized encodings into ``nlist`` cells and a query
+    only scans the ``nprobe`` closest cells. Until enough faces exist to train
+    the quantizer, queries fall back to an exact scan.
+
+    On disk the index is a numbered generation: a snapshot of ids and cell
+    assignments, a vector matrix that every worker process memory-maps (so
+    the page cache is shared instead of each worker holding its own copy),
+    and an append-only journal of adds and removes since the snapshot.
+    Every worker appends its changes to the journal and replays the tail
+    written by the others before each search, so an enrollment handled by
+    one worker is visible to all of them. ``compact`` folds the journal into
+    a new generation; compactions and builds are serialized across processes.
+    """
+
+    GENERATION_FILE = 'generation'
+    LOCK_FILE = 'index.lock'
+    COMPACT_LOCK_FILE = 'compact.lock'
+    BUILD_LOCK_FILE = 'build.lock'
+    REPORT_FILE = 'duplicates.json'
+    FLAGS_FILE = 'enrollment_flags.jsonl'
+
+    def __init__(self, dims: Optional[int] = None, nlist: int = 256, nprobe: int = 8,
+                 path: Optional[str] = None, compact_bytes: int = 0):
+        self.dims = dims
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self.centroids = None
+        # Generation on disk this index was loaded from; None when built from the database
+        self.generation = None
+        self._journal_offset = 0
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._compacting = False
+        self._size = 0
+        # Rows [0, _base_size) live in the memory-mapped snapshot, the rest in _tail
+        self._base = None
+        self._base_size = 0
+        self._tail = np.empty((0, dims or 0), dtype=np.float32)
+        self._face_ids = np.empty(0, dtype=np.int64)
+        self._voter_ids = np.empty(0, dtype=np.int64)
+        self._cells = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._lists: List[List[int]] = []
+        self._row_of_face: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._row_of_face)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @staticmethod
+    def _normalize(encoding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(encoding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = self._face_ids.shape[0]
+        if needed > capacity:
+            new_capacity = max(needed, capacity * 2, 1024)
+            for name, dtype in (('_face_ids', np.int64), ('_voter_ids', np.int64), ('_cells', np.int32), ('_alive', bool)):
+                grown = np.zeros(new_capacity, dtype=dtype)
+                grown[:self._size] = getattr(self, name)[:self._size]
+                setattr(self, name, grown)
+
+        # Only faces added since the snapshot take memory of their own
+        tail_rows = self._size - self._base_size
+        if tail_rows + extra > self._tail.shape[0]:
+            tail = np.empty((max(tail_rows + extra, self._tail.shape[0] * 2, 1024), self.dims), dtype=np.float32)
+            tail[:tail_rows] = self._tail[:tail_rows]
+            self._tail = tail
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Normalized vectors of the given rows, from the snapshot and the in-memory tail"""
+        if self._base_size == 0:
+            return self._tail[rows]
+        in_base = rows < self._base_size
+        if in_base.all():
+            return self._base[rows]
+        if not in_base.any():
+            return self._tail[rows - self._base_size]
+        vectors = np.empty((rows.shape[0], self.dims), dtype=np.float32)
+        vectors[in_base] = self._base[rows[in_base]]
+        vectors[~in_base] = self._tail[rows[~in_base] - self._base_size]
+        return vectors
+
+    def _nearest_cells(self, vectors: np.ndarray, count: int = 1) -> np.ndarray:
+        sims = vectors @ self.centroids.T
+        if count == 1:
+            return np.argmax(sims, axis=1)[:, None]
+        count = min(count, self.centroids.shape[0])
+        return np.argpartition(-sims, count - 1, axis=1)[:, :count]
+
+    def _build_lists(self) -> None:
+        """Inverted lists of the live rows from their stored cell assignments"""
+        rows = np.flatnonzero(self._alive[:self._size])
+        cells = self._cells[rows]
+        order = np.argsort(cells, kind='stable')
+        bounds = np.searchsorted(cells[order], np.arange(self.centroids.shape[0] + 1))
+        self._lists = [rows[order[bounds[i]:bounds[i + 1]]].tolist() for i in range(self.centroids.shape[0])]
+
+    def train(self, iterations: int = 10, sample_size: int = 20000) -> None:
+        """Train the coarse quantizer on the current contents and rebuild the inverted lists"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            nlist = min(self.nlist, len(rows))
+            if nlist == 0:
+                return
+
+            rng = np.random.default_rng(0)
+            sample = self._vectors(np.sort(rng.choice(rows, size=min(sample_size, len(rows)), replace=False)))
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assign = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sample)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                # Empty cells keep their previous centroid
+                filled = norms[:, 0] > 0
+                centroids[filled] = sums[filled] / norms[filled]
+
+            self.centroids = centroids
+            for start in range(0, len(rows), 4096):
+                chunk = rows[start:start + 4096]
+                self._cells[chunk] = self._nearest_cells(self._vectors(chunk))[:, 0]
+            self._build_lists()
+
+    def add(self, face_id: int, voter_id: int, encoding: np.ndarray, journal: bool = True) -> None:
+        """Add or replace one enrolled face"""
+        vector = self._normalize(encoding)
+        with self._lock:
+            if self.dims is None:
+                self.dims = vector.shape[0]
+                self._tail = np.empty((0, self.dims), dtype=np.float32)
+            if vector.shape[0] != self.dims:
+                print(f"WARNING: Face index dimension mismatch! Index: {self.dims}, Face: {vector.shape[0]}")
+                return
+
+            if face_id in self._row_of_face:
+                self._remove_row(self._row_of_face.pop(face_id))
+
+            self._reserve(1)
+            row = self._size
+            self._tail[row - self._base_size] = vector
+            self._face_ids[row] = face_id
+            self._voter_ids[row] = voter_id
+            self._alive[row] = True
+            self._row_of_face[face_id] = row
+            self._size += 1
+
+            if self.trained:
+                cell = int(self._nearest_cells(vector[None, :])[0, 0])
+                self._cells[row] = cell
+                self._lists[cell].append(row)
+            elif len(self) >= self.nlist * 16:
+                self.train()
+
+            if journal:
+                self._journal(b'A', face_id, voter_id, vector)
+
+    def _remove_row(self, row: int) -> None:
+        # Rows are tombstoned and dropped from the inverted lists lazily on compaction
+        self._alive[row] = False
+
+    def remove_face(self, face_id: int, journal: bool = True) -> None:
+        with self._lock:
+            row = self._row_of_face.pop(face_id, None)
+            if row is None:
+                return
+            self._remove_row(row)
+            if journal:
+                self._journal(b'F', face_id, 0)
+
+    def remove_voter(self, voter_id: int, journal: bool = True) -> None:
+        """Remove every face enrolled for a voter"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size] & (self._voter_ids[:self._size] == voter_id))
+            for row in rows:
+                self._row_of_face.pop(int(self._face_ids[row]), None)
+                self._remove_row(int(row))
+            # Journaled even when nothing was removed here: another worker may hold faces this one has not seen
+            if journal:
+                self._journal(b'V', 0, voter_id)
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        if not self.trained:
+            return np.flatnonzero(self._alive[:self._size])
+        cells = self._nearest_cells(query[None, :], self.nprobe)[0]
+        rows = [row for cell in cells for row in self._lists[cell]]
+        rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        return rows[self._alive[rows]]
+
+    def search(self, encoding: np.ndarray, k: int = 5,
+               exclude_voter_id: Optional[int] = None) -> List[Tuple[int, int, float]]:
+        """Find the closest enrolled faces
+
+        Returns:
+            List of (voter_id, face_id, distance) sorted by distance, using the
+            same (1 - cosine) / 2 scale as FaceService.verify_face
+        """
+        query = self._normalize(encoding)
+        self.refresh()
+        with self._lock:
+            return self._search(query, k, exclude_voter_id)
+
+    def _search(self, query: np.ndarray, k: int, exclude_voter_id: Optional[int]) -> List[Tuple[int, int, float]]:
+        if len(self) == 0 or query.shape[0] != self.dims:
+            return []
+        rows = self._candidate_rows(query)
+        if exclude_voter_id is not None:
+            rows = rows[self._voter_ids[rows] != exclude_voter_id]
+        if rows.shape[0] == 0:
+            return []
+
+        distances = (1.0 - self._vectors(rows) @ query) / 2.0
+        k = min(k, rows.shape[0])
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(int(self._voter_ids[rows[i]]), int(self._face_ids[rows[i]]), float(distances[i]))
+                for i in top]
+
+    def find_duplicates(self, encoding: np.ndarray, threshold: float,
+                        exclude_voter_id: Optional[int] = None, k: int = 5) -> List[Tuple[int, int, float]]:
+        """Enrolled faces of other voters that are closer than the threshold"""
+        return [match for match in self.search(encoding, k=k, exclude_voter_id=exclude_voter_id)
+                if match[2] < threshold]
+
+    def duplicate_pairs(self, threshold: float, limit: int = 200, chunk_size: int = 256) -> List[Tuple[int, int, float]]:
+        """Likely duplicate registrations as (voter_id, other_voter_id, distance) pairs
+
+        Searches every enrolled face, so it is run offline by the
+        ``report-duplicate-faces`` command rather than in a request. The lock
+        is taken per chunk of faces so enrollment is never blocked for long.
+        """
+        self.refresh()
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+        best: Dict[Tuple[int, int], float] = {}
+        for start in range(0, len(rows), chunk_size):
+            with self._lock:
+                chunk = rows[start:start + chunk_size]
+                chunk = chunk[self._alive[chunk]]
+                if chunk.shape[0] == 0:
+                    continue
+                for row, vector in zip(chunk, self._vectors(chunk)):
+                    voter_id = int(self._voter_ids[row])
+                    for other_voter_id, _, distance in self._search(vector, 5, voter_id):
+                        if distance >= threshold:
+                            continue
+                        pair = (min(voter_id, other_voter_id), max(voter_id, other_voter_id))
+                        if distance < best.get(pair, float('inf')):
+                            best[pair] = distance
+        pairs = sorted(((a, b, d) for (a, b), d in best.items()), key=lambda p: p[2])
+        return pairs[:limit]
+
+    # Persistence
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _generation_files(generation: int) -> Tuple[str, str, str]:
+        return f'snapshot-{generation}.npz', f'vectors-{generation}.npy', f'journal-{generation}.bin'
+
+    @contextmanager
+    def _file_lock(self, mode: int):
+        """Cross-process lock on the index directory; callers hold self._lock, so threads never share it"""
+        if self._lock_fd is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._lock_fd = os.open(self._file(self.LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _disk_generation(self) -> int:
+        try:
+            with open(self._file(self.GENERATION_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _journal(self, op: bytes, face_id: int, voter_id: int, vector: Optional[np.ndarray] = None) -> None:
+        if not self.path:
+            return
+        record = RECORD.pack(op, face_id, voter_id, vector.shape[0] if vector is not None else 0)
+        if vector is not None:
+            record += vector.astype('<f4').tobytes()
+
+        with self._file_lock(fcntl.LOCK_EX):
+            # Always the current generation's journal: if another process compacted since
+            # this index was loaded, the next refresh reloads and picks the record up there
+            generation = self._disk_generation()
+            fd = os.open(self._file(self._generation_files(generation)[2]), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                start = os.fstat(fd).st_size
+                # One write per record, so records of concurrent writers never interleave
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+        # Already applied in memory; skip it on replay unless other records precede it
+        if generation == self.generation and start == self._journal_offset:
+            self._journal_offset = start + len(record)
+
+        if self.compact_bytes and start + len(record) > self.compact_bytes and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._compact_in_background, name='face-index-compact', daemon=True).start()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact(force=False)
+        except Exception as e:
+            print(f"Error compacting face index: {e}")
+        finally:
+            self._compacting = False
+
+    def _replay_tail(self) -> None:
+        """Apply journal records written since the last replay, by this or any other process"""
+        journal_path = self._file(self._generation_files(self.generation)[2])
+        try:
+            with open(journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        pos = 0
+        while pos + RECORD.size <= len(data):
+            op, face_id, voter_id, dims = RECORD.unpack_from(data, pos)
+            end = pos + RECORD.size + dims * 4
+            if end > len(data):
+                break
+            if op == b'A':
+                self.add(face_id, voter_id, np.frombuffer(data, dtype='<f4', count=dims, offset=pos + RECORD.size),
+                         journal=False)
+            elif op == b'F':
+                self.remove_face(face_id, journal=False)
+            elif op == b'V':
+                self.remove_voter(voter_id, journal=False)
+            pos = end
+        self._journal_offset += pos
+
+    def refresh(self) -> None:
+        """Catch up with changes made by other worker processes"""
+        if not self.path:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            generation = self._disk_generation()
+            if self.generation is not None and generation != self.generation:
+                self._load_generation(generation)
+            if self.generation is not None:
+                self._replay_tail()
+
+    def compact(self, force: bool = True) -> None:
+        """Fold the journal into a new generation and start an empty journal
+
+        The new snapshot is written without holding the index lock, so
+        enrollments and searches continue; records journaled meanwhile are
+        carried over into the new journal when the generation is switched.
+        The whole compaction holds the cross-process compaction lock, so two
+        compactions or builds never write the same generation's files.
+        Without ``force`` it is skipped when another process has already
+        compacted the journal below ``compact_bytes``.
+        """
+        if not self.path:
+            return
+        with _path_lock(self.path, self.COMPACT_LOCK_FILE):
+            self._compact(force)
+
+    def _compact(self, force: bool) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            disk_generation = self._disk_generation()
+            if self.generation is None:
+                # Built from the database: replay the current journal on top, which
+                # covers enrollments committed while the rows were being streamed
+                self.generation, self._journal_offset = disk_generation, 0
+            elif self.generation != disk_generation:
+                self._load_generation(disk_generation)
+            self._replay_tail()
+            generation, journal_offset = self.generation, self._journal_offset
+            if not force and self._journal_offset < self.compact_bytes:
+                return
+            rows = np.flatnonzero(self._alive[:self._size])
+            face_ids, voter_ids, cells = self._face_ids[rows], self._voter_ids[rows], self._cells[rows]
+            base, base_size, tail = self._base, self._base_size, self._tail
+            dims, centroids = self.dims or 0, self.centroids
+
+        # Row vectors never change once written, so the old arrays can be read without the lock
+        snapshot_name, vectors_name, journal_name = self._generation_files(generation + 1)
+        vectors_path = self._file(vectors_name)
+        if rows.shape[0]:
+            out = np.lib.format.open_memmap(f"{vectors_path}.tmp", mode='w+', dtype=np.float32,
+                                            shape=(rows.shape[0], dims))
+            for start in range(0, rows.shape[0], 4096):
+                chunk = rows[start:start + 4096]
+                block = np.empty((chunk.shape[0], dims), dtype=np.float32)
+                in_base = chunk < base_size
+                if in_base.any():
+                    block[in_base] = base[chunk[in_base]]
+                if not in_base.all():
+                    block[~in_base] = tail[chunk[~in_base] - base_size]
+                out[start:start + chunk.shape[0]] = block
+            out.flush()
+            del out
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+        with open(self._file(f"{snapshot_name}.tmp"), 'wb') as f:
+            np.savez(
+                f,
+                face_ids=face_ids,
+                voter_ids=voter_ids,
+                cells=cells,
+                centroids=centroids if centroids is not None else np.empty((0, dims), dtype=np.float32),
+                params=np.array([self.nlist, self.nprobe, dims], dtype=np.int64)
+            )
+        os.replace(self._file(f"{snapshot_name}.tmp"), self._file(snapshot_name))
+
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            # Only compactions advance the generation and they hold the compaction lock
+            if self._disk_generation() != generation:
+                raise RuntimeError(f"Face index generation changed during compaction of generation {generation}")
+            # Carry over what other processes journaled while the snapshot was written
+            try:
+                with open(self._file(self._generation_files(generation)[2]), 'rb') as old:
+                    old.seek(journal_offset)
+                    carried = old.read()
+            except FileNotFoundError:
+                carried = b''
+            with open(self._file(journal_name), 'wb') as new:
+                new.write(carried)
+                new.flush()
+                os.fsync(new.fileno())
+            tmp_path = self._file(f"{self.GENERATION_FILE}.tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(str(generation + 1))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._file(self.GENERATION_FILE))
+
+        # Mapped files stay readable after unlink, so workers still on the old generation are unaffected
+        for name in self._generation_files(generation):
+            try:
+                os.remove(self._file(name))
+            except OSError:
+                pass
+        print(f"Face index compacted into generation {generation + 1} ({rows.shape[0]} face(s))")
+        # Switch this process over to the memory-mapped generation too
+        self.refresh()
+
+    def _load_generation(self, generation: int) -> bool:
+        """Replace the in-memory state with a generation on disk; False if it does not exist"""
+        snapshot_name, vectors_name, _ = self._generation_files(generation)
+        snapshot_path = self._file(snapshot_name)
+        if not os.path.exists(snapshot_path):
+            return False
+
+        with np.load(snapshot_path) as data:
+            face_ids, voter_ids, cells = data['face_ids'], data['voter_ids'], data['cells']
+            centroids = data['centroids']
+            self.nlist, _, dims = (int(v) for v in data['params'])
+        count = face_ids.shape[0]
+
+        self.dims = dims or None
+        self._base = np.load(self._file(vectors_name), mmap_mode='r') if count else None
+        self._base_size = self._size = count
+        self._tail = np.empty((0, dims), dtype=np.float32)
+        self._face_ids, self._voter_ids, self._cells = face_ids, voter_ids, cells.astype(np.int32)
+        self._alive = np.ones(count, dtype=bool)
+        self._row_of_face = {int(face_id): row for row, face_id in enumerate(face_ids)}
+        self.centroids = centroids if centroids.size else None
+        if self.trained:
+            self._build_lists()
+        else:
+            self._lists = []
+        self.generation, self._journal_offset = generation, 0
+        return True
+
+    @classmethod
+    def load(cls, path: str, nprobe: Optional[int] = None, compact_bytes: int = 0) -> Optional['FaceIndex']:
+        """Open the current generation and replay its journal; returns None if none has been built"""
+        index = cls(path=path, compact_bytes=compact_bytes)
+        with index._lock, index._file_lock(fcntl.LOCK_SH):
+            if not index._load_generation(index._disk_generation()):
+                return None
+            if nprobe:
+                index.nprobe = nprobe
+            index._replay_tail()
+        return index
+
+    def write_duplicate_report(self, threshold: float, limit: int = 200) -> dict:
+        """Compute duplicate_pairs and store them for the admin report page"""
+        started = time.perf_counter()
+        pairs = self.duplicate_pairs(threshold, limit=limit)
+        report = {
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'threshold': threshold,
+            'faces': len(self),
+            'seconds': round(time.perf_counter() - started, 1),
+            'pairs': [[a, b, d] for a, b, d in pairs],
+        }
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._file(f"{self.REPORT_FILE}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(report, f)
+        os.replace(tmp_path, self._file(self.REPORT_FILE))
+        return report
+
+
+def flag_enrollment(path: str, voter_id: int, face_id: int, matches: List[Tuple[int, int, float]]) -> None:
+    """Record an enrollment that looks like another voter's face, for admin review"""
+    record = json.dumps({
+        'flagged_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'voter_id': voter_id,
+        'face_id': face_id,
+        'matches': [[other_voter_id, other_face_id, distance] for other_voter_id, other_face_id, distance in matches],
+    }) + '\n'
+    os.makedirs(path, exist_ok=True)
+    fd = os.open(os.path.join(path, FaceIndex.FLAGS_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # One write per line, so concurrent workers never interleave records
+        os.write(fd, record.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def read_enrollment_flags(path: str, limit: int = 200) -> List[dict]:
+    """Most recent enrollment flags first"""
+    try:
+        with open(os.path.join(path, FaceIndex.FLAGS_FILE)) as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    flags = []
+    for line in reversed(lines):
+        try:
+            flags.append(json.loads(line))
+        except ValueError:
+            continue
+        if len(flags) >= limit:
+            break
+    return flags
+
+
+def read_duplicate_report(path: str) -> Optional[dict]:
+    """Last report written by ``flask report-duplicate-faces``, or None"""
+    try:
+        with open(os.path.join(path, FaceIndex.REPORT_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_face_index_from_db(index: FaceIndex, chunk_size: int = 1000) -> FaceIndex:
+    """Stream every enrolled VoterFace into the index, train it and write a new generation"""
+    from models import VoterFace
+
+    for face in VoterFace.query.order_by(VoterFace.id).yield_per(chunk_size):
+        index.add(face.id, face.voter_id, unpack_encoding(face.encoding), journal=False)
+    if len(index) and not index.trained:
+        index.train()
+    index.compact()
+    return index
+
+
+_index_lock = threading.Lock()
+
+
+def _new_index(app) -> FaceIndex:
+    return FaceIndex(
+        nlist=app.config.get('FACE_INDEX_NLIST', 256),
+        nprobe=app.config.get('FACE_INDEX_NPROBE', 8),
+        path=app.config.get('FACE_INDEX_PATH'),
+        compact_bytes=app.config.get('FACE_INDEX_COMPACT_BYTES', 0)
+    )
+
+
+def load_or_build_face_index(app) -> FaceIndex:
+    """Open the index on disk, building it from the database if none exists yet
+
+    The build lock makes concurrently starting workers wait for one build
+    and then load its result.
+    """
+    path = app.config.get('FACE_INDEX_PATH')
+    if not path:
+        return build_face_index_from_db(_new_index(app))
+    with _path_lock(path, FaceIndex.BUILD_LOCK_FILE):
+        index = FaceIndex.load(path, nprobe=app.config.get('FACE_INDEX_NPROBE'),
+                               compact_bytes=app.config.get('FACE_INDEX_COMPACT_BYTES', 0))
+        if index is None:
+            index = build_face_index_from_db(_new_index(app))
+    return index
+
+
+def _build_in_background(app) -> None:
+    with app.app_context():
+        try:
+            app.extensions['face_index'] = load_or_build_face_index(app)
+        except Exception as e:
+            print(f"Error building face index: {e}")
+            app.extensions.pop('face_index_building', None)
+
+
+def get_face_index() -> FaceIndex:
+    """Shared duplicate-detection index for the current app
+
+    Server processes load it at startup. If that failed, a request never
+    builds it inline: the build starts in the background and an empty index
+    stands in until it is ready. Its changes go to the journal on disk, which
+    the finished build replays. CLI commands load or build it synchronously.
+    """
+    app = current_app._get_current_object()
+    index = app.extensions.get('face_index')
+    if index is not None:
+        return index
+
+    with _index_lock:
+        index = app.extensions.get('face_index')
+        if index is not None:
+            return index
+        if not has_request_context():
+            index = load_or_build_face_index(app)
+            app.extensions['face_index'] = index
+            return index
+        if not app.extensions.get('face_index_building'):
+            app.extensions['face_index_building'] = _new_index(app)
+            threading.Thread(target=_build_in_background, args=(app,), name='face-index-build', daemon=True).start()
+        return app.extensions['face_index_building']
+
+
+def register_face_index(app) -> None:
+    """Load the index in server processes and register the CLI commands that maintain it"""
+    if click.get_current_context(silent=True) is None:
+        try:
+            with app.app_context():
+                app.extensions['face_index'] = load_or_build_face_index(app)
+        except Exception as e:
+            print(f"Face index not loaded at startup; it is built in the background on first use: {e}")
+
+    @app.cli.command('rebuild-face-index')
+    def rebuild_face_index():
+        """Rebuild the duplicate-detection face index from VoterFace rows"""
+        index = build_face_index_from_db(_new_index(app))
+        app.extensions['face_index'] = index
+        print(f"Face index rebuilt with {len(index)} face(s)")
+
+    @app.cli.command('compact-face-index')
+    def compact_face_index():
+        """Fold the face index journal into a new snapshot generation"""
+        get_face_index().compact()
+
+    @app.cli.command('report-duplicate-faces')
+    def report_duplicate_faces():
+        """Search every enrolled face for likely duplicate registrations (shown at /admin/voters/duplicates)"""
+        report = get_face_index().write_duplicate_report(app.config['FACE_DUPLICATE_THRESHOLD'])
+        print(f"{len(report['pairs'])} likely duplicate pair(s) among {report['faces']} face(s) in {report['seconds']}s")
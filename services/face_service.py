@@ -1,33 +1,156 @@
-import cv2
 import numpy as np
-import os
 import base64
-from PIL import Image
-import io
+import importlib.util
+import threading
+import time
+from contextlib import contextmanager
 from typing import List, Tuple, Optional, Dict
-import json
 
-try:
-    from deepface import DeepFace
-    DEEPFACE_AVAILABLE = True
-except ImportError:
-    DEEPFACE_AVAILABLE = False
+# Only check that DeepFace is installed: importing it pulls in TensorFlow, which
+# is deferred until the model is first built or used
+DEEPFACE_AVAILABLE = importlib.util.find_spec('deepface') is not None
+if not DEEPFACE_AVAILABLE:
     print("WARNING: DeepFace not installed. Using fallback face encoding method.")
 
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+# OpenCV is likewise imported inside the methods that use it, so importing this
+# module (and the app) does not load it
+
+from services import template_matching
+from services.encoder_pool import EncoderPoolBusy
+from services.face_image import FaceImage
+from services.inference_batcher import BatcherBusy
+from services.liveness import LivenessTask, build_liveness_checker
+from services.local_liveness import LocalLivenessDetector
+
+# Liveness checker used by FaceService instances created without a registry
+_default_liveness = None
+
+# Raised by the encode paths when the shared batcher or encoder pool is saturated.
+# They mean "try again shortly", not "no face", so they are never swallowed here.
+ENCODER_BUSY_ERRORS = (BatcherBusy, EncoderPoolBusy, TimeoutError)
+
+
+class FaceAnalysis:
+    """Per-image analysis context shared by the quality, preprocessing and embedding stages
+
+    Grayscale conversion and Haar detection run once per image no matter how
+    many stages need them, and every stage records its wall time in
+    ``timings`` (milliseconds). The request's encoder and its liveness thread
+    share one analysis through ``FaceImage.analysis``, so the lazy stages are
+    computed under a lock.
+    """
+
+    def __init__(self, image: np.ndarray, face_service: 'FaceService',
+                 roi_hint: Optional[Tuple[int, int, int, int]] = None):
+        self.image = image
+        self.face_service = face_service
+        self.roi_hint = roi_hint
+        self.timings: Dict[str, float] = {}
+        # Filled in by assess_face_quality, used to pick a preprocessing profile
+        self.brightness = None
+        self.sharpness = None
+        self._gray = None
+        self._faces = None
+        self._eyes = None
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000.0
+
+    @property
+    def gray(self) -> np.ndarray:
+        import cv2
+
+        with self._lock:
+            if self._gray is None:
+                with self.timed('grayscale'):
+                    self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            return self._gray
+
+    @property
+    def faces(self) -> List[Tuple[int, int, int, int]]:
+        with self._lock:
+            if self._faces is None:
+                gray = self.gray
+                with self.timed('detect'):
+                    self._faces = self.face_service.detect_faces(self.image, gray=gray, roi_hint=self.roi_hint)
+            return self._faces
+
+    @property
+    def largest_face(self) -> Optional[Tuple[int, int, int, int]]:
+        faces = self.faces
+        return max(faces, key=lambda f: f[2] * f[3]) if faces else None
+
+    @property
+    def eyes(self) -> List[Tuple[int, int, int, int]]:
+        """Eye boxes in the upper half of the largest face, relative to the face box"""
+        with self._lock:
+            if self._eyes is None:
+                face = self.largest_face
+                eyes = ()
+                if face is not None:
+                    x, y, w, h = face
+                    with self.timed('eyes'), self.face_service.cascades() as (_, eye_cascade):
+                        eyes = eye_cascade.detectMultiScale(self.gray[y:y + h // 2, x:x + w])
+                self._eyes = [tuple(int(v) for v in eye) for eye in eyes]
+            return self._eyes
+
+    def margin_crop(self, margin_ratio: float = 0.2) -> Optional[np.ndarray]:
+        """Largest face plus a margin of ``margin_ratio`` of its shorter side"""
+        face = self.largest_face
+        if face is None:
+            return None
+
+        x, y, w, h = face
+        margin = int(margin_ratio * min(w, h))
+        x1, y1 = max(0, x - margin), max(0, y - margin)
+        x2, y2 = min(self.image.shape[1], x + w + margin), min(self.image.shape[0], y + h + margin)
+        return self.image[y1:y2, x1:x2]
+
+    def aligned_face(self, margin_ratio: float = 0.2) -> Optional[np.ndarray]:
+        """Crop the largest face with a margin and level the eyes when both are found"""
+        import cv2
+
+        crop = self.margin_crop(margin_ratio)
+        if crop is None:
+            return None
+
+        # Eyes are searched in the upper half of the detected face only
+        eyes = self.eyes
+        if len(eyes) >= 2:
+            eyes = sorted(sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2], key=lambda e: e[0])
+            (lx, ly, lw, lh), (rx, ry, rw, rh) = eyes
+            dx = (rx + rw / 2.0) - (lx + lw / 2.0)
+            dy = (ry + rh / 2.0) - (ly + lh / 2.0)
+            if dx > 0:
+                angle = np.degrees(np.arctan2(dy, dx))
+                center = (crop.shape[1] / 2.0, crop.shape[0] / 2.0)
+                rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+                crop = cv2.warpAffine(crop, rotation, (crop.shape[1], crop.shape[0]),
+                                      flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return crop
+
+
+# Haar detection parameters; max_width 0 keeps detection at full resolution
+DEFAULT_DETECTION = {
+    'max_width': 0,
+    'scale_factor': 1.1,
+    'min_neighbors': 5,
+    'min_size': 30,
+    'roi_expand': 0.5,
+}
+
+# Preprocessing profiles, cheapest first
+PREPROCESS_PROFILES = ('none', 'clahe', 'bilateral', 'nlm')
 
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
 
 class FaceService:
-    def __init__(self, threshold: float = 0.03):
+    def __init__(self, threshold: float = 0.03, registry=None):
         """
         Initialize Face Service with VGG-Face model
 
@@ -37,41 +160,120 @@ class FaceService:
                       - Same person typically: 0.10-0.30 (with lighting/angle variations)
                       - Different people typically: 0.40-0.70
                       - Lower threshold = stricter matching (fewer false positives)
+            registry: Optional shared FaceModelRegistry; when given, the cascades and
+                      embedding model preloaded at startup are reused instead of reloaded
         """
         self.threshold = threshold
-        # Initialize OpenCV face detector
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-
-        # Initialize AI models if API keys are available
-        self.openai_key = os.environ.get('OPENAI_API_KEY')
-        self.gemini_key = os.environ.get('GEMINI_API_KEY')
-
-        if self.openai_key and OPENAI_AVAILABLE:
-            openai.api_key = self.openai_key
-
-        if self.gemini_key and GENAI_AVAILABLE:
-            genai.configure(api_key=self.gemini_key)
-
-    def detect_faces(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
-        """Detect faces in an image using OpenCV"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
+        self.registry = registry
+        self.model_name = registry.model_name if registry is not None else "VGG-Face"
+        # Detection pyramid / ROI tracking parameters, configurable per deployment
+        self.detection = registry.detection if registry is not None else dict(DEFAULT_DETECTION)
+        # Largest face box found by the last encode, usable as the next frame's ROI hint
+        self.last_face_box = None
+        # 'auto' picks a profile per frame from brightness and sharpness; the default
+        # is the full NLM denoising that enrollment templates were built with
+        self.preprocess_profile = registry.preprocess_profile if registry is not None else 'nlm'
+        self.last_preprocess_profile = None
+        # Detect once and hand the aligned crop to the model with detection skipped
+        self.single_pass = registry.single_pass if registry is not None else False
+        # Time the last encode spent waiting in the shared batching queue (ms)
+        self.last_queue_wait_ms = 0.0
+        # Per-stage timings (ms) of the last encode
+        self.last_timings: Dict[str, float] = {}
+        # Initialize OpenCV face detector; with a registry, cascades are
+        # borrowed from its shared pool for each detection instead
+        self.face_cascade = None
+        self.eye_cascade = None
+        if registry is None:
+            import cv2
+
+            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+        # AI liveness clients are created once and shared through the registry
+        if registry is not None and registry.liveness is not None:
+            self.liveness = registry.liveness
+        else:
+            global _default_liveness
+            if _default_liveness is None:
+                _default_liveness = build_liveness_checker({})
+            self.liveness = _default_liveness
+
+    @contextmanager
+    def cascades(self):
+        """(face, eye) cascade pair for one detection, borrowed from the registry pool when shared"""
+        if self.registry is not None:
+            with self.registry.cascades() as pair:
+                yield pair
+        else:
+            yield self.face_cascade, self.eye_cascade
+
+    def detect_faces(self, image: np.ndarray, gray: Optional[np.ndarray] = None,
+                     roi_hint: Optional[Tuple[int, int, int, int]] = None) -> List[Tuple[int, int, int, int]]:
+        """Detect faces in an image using OpenCV
+
+        Args:
+            image: BGR frame
+            gray: Grayscale version of the frame, if already computed
+            roi_hint: Face box from the previous frame of the same session; the
+                      search is limited to an expanded region around it and
+                      falls back to the whole frame when nothing is found there
+        """
+        import cv2
+
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        if roi_hint is not None:
+            x, y, w, h = (int(v) for v in roi_hint)
+            pad_x, pad_y = int(w * self.detection['roi_expand']), int(h * self.detection['roi_expand'])
+            x1, y1 = max(0, x - pad_x), max(0, y - pad_y)
+            x2, y2 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+            if x2 > x1 and y2 > y1:
+                faces = self._detect_scaled(gray[y1:y2, x1:x2], offset=(x1, y1))
+                if faces:
+                    return faces
+
+        return self._detect_scaled(gray)
+
+    def _detect_scaled(self, gray: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> List[Tuple[int, int, int, int]]:
+        """Run the cascade on a copy downscaled to max_width and map boxes back to full resolution"""
+        import cv2
+
+        scale = 1.0
+        max_width = self.detection['max_width']
+        if max_width and gray.shape[1] > max_width:
+            scale = max_width / float(gray.shape[1])
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        min_size = max(1, int(round(self.detection['min_size'] * scale)))
+        with self.cascades() as (face_cascade, _):
+            faces = face_cascade.detectMultiScale(
+                gray,
+                scaleFactor=self.detection['scale_factor'],
+                minNeighbors=self.detection['min_neighbors'],
+                minSize=(min_size, min_size),
+                flags=cv2.CASCADE_SCALE_IMAGE
+            )
         if isinstance(faces, tuple):
             return []
-        return [tuple(face) for face in faces]
 
-    def assess_face_quality(self, image: np.ndarray) -> Tuple[bool, str, float]:
+        ox, oy = offset
+        if scale == 1.0:
+            return [(int(x) + ox, int(y) + oy, int(w), int(h)) for x, y, w, h in faces]
+        inv = 1.0 / scale
+        return [(int(round(x * inv)) + ox, int(round(y * inv)) + oy, int(round(w * inv)), int(round(h * inv)))
+                for x, y, w, h in faces]
+
+    def assess_face_quality(self, image: np.ndarray, analysis: Optional[FaceAnalysis] = None) -> Tuple[bool, str, float]:
         """Assess face image quality before encoding"""
+        import cv2
+
         try:
+            analysis = analysis or FaceAnalysis(image, self)
+
             # Check image brightness
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = analysis.gray
             brightness = np.mean(gray)
 
             if brightness < 40:
@@ -81,17 +283,17 @@ class FaceService:
 
             # Check image sharpness using Laplacian variance
             laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            analysis.brightness = float(brightness)
+            analysis.sharpness = float(laplacian_var)
 
             if laplacian_var < 15:
                 return False, "Image too blurry. Hold camera steady.", 0.0
 
             # Check if face is detected and properly sized
-            faces = self.detect_faces(image)
-            if not faces:
+            largest_face = analysis.largest_face
+            if largest_face is None:
                 return False, "No face detected. Position face in center.", 0.0
 
-            # Get largest face
-            largest_face = max(faces, key=lambda f: f[2] * f[3])
             x, y, w, h = largest_face
 
             # Face should be at least 120x120 pixels for good quality
@@ -114,81 +316,164 @@ class FaceService:
             print(f"Quality assessment error: {e}")
             return True, "Unable to assess quality", 0.5
 
-    def preprocess_face(self, image: np.ndarray) -> np.ndarray:
+    @staticmethod
+    def select_preprocess_profile(brightness: Optional[float], sharpness: Optional[float]) -> str:
+        """Pick the cheapest preprocessing profile that suits the frame
+
+        Low light brings sensor noise, so dark frames get full NLM denoising.
+        A very high Laplacian variance on a normally lit frame usually means
+        grain rather than detail, which the much cheaper bilateral filter
+        handles. Dim frames only need contrast normalization, and clean,
+        well-lit frames skip preprocessing entirely.
+        """
+        if brightness is None or sharpness is None:
+            return 'nlm'
+        if brightness < 70:
+            return 'nlm'
+        if sharpness > 1000:
+            return 'bilateral'
+        if brightness < 100 or brightness > 190:
+            return 'clahe'
+        return 'none'
+
+    def preprocess_face(self, image: np.ndarray, analysis: Optional[FaceAnalysis] = None,
+                        profile: str = 'nlm') -> np.ndarray:
         """Enhanced face preprocessing with alignment and normalization"""
         try:
-            # Detect face
-            faces = self.detect_faces(image)
-            if not faces:
+            # Detect face and extract it with the same margin as the aligned crop
+            analysis = analysis or FaceAnalysis(image, self)
+            face_img = analysis.margin_crop()
+            if face_img is None:
                 return image
 
-            # Get largest face
-            largest_face = max(faces, key=lambda f: f[2] * f[3])
-            x, y, w, h = largest_face
+            return self.enhance_face(face_img, profile)
 
-            # Extract face with margin
-            margin = int(0.2 * min(w, h))
-            x1 = max(0, x - margin)
-            y1 = max(0, y - margin)
-            x2 = min(image.shape[1], x + margin)
-            y2 = min(image.shape[0], y + margin)
-
-            face_img = image[y1:y2, x1:x2]
+        except Exception as e:
+            print(f"Preprocessing error: {e}")
+            return image
 
-            # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-            lab = cv2.cvtColor(face_img, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            l = clahe.apply(l)
-            enhanced = cv2.merge([l, a, b])
-            face_img = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+    def enhance_face(self, face_img: np.ndarray, profile: str = 'nlm') -> np.ndarray:
+        """Contrast normalization and denoising of a face crop
 
-            # Denoise
-            face_img = cv2.fastNlMeansDenoisingColored(face_img, None, 10, 10, 7, 21)
+        Args:
+            face_img: BGR face crop
+            profile: 'none', 'clahe' (contrast only), 'bilateral' (CLAHE + edge-preserving
+                     blur) or 'nlm' (CLAHE + fastNlMeansDenoisingColored, the slowest)
+        """
+        import cv2
 
+        if profile == 'none':
             return face_img
 
-        except Exception as e:
-            print(f"Preprocessing error: {e}")
-            return image
-
-    def encode_face_deepface(self, image: np.ndarray) -> Optional[np.ndarray]:
-        """Extract face encoding using DeepFace with VGG-Face (ResNet-34 based) model"""
+        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        lab = cv2.cvtColor(face_img, cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        l = clahe.apply(l)
+        enhanced = cv2.merge([l, a, b])
+        face_img = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+
+        if profile == 'bilateral':
+            return cv2.bilateralFilter(face_img, 5, 50, 50)
+        if profile == 'nlm':
+            # Denoise
+            return cv2.fastNlMeansDenoisingColored(face_img, None, 10, 10, 7, 21)
+        return face_img
+
+    def analyze(self, image: np.ndarray, roi_hint: Optional[Tuple[int, int, int, int]] = None) -> FaceAnalysis:
+        """New analysis context for a BGR frame"""
+        return FaceAnalysis(image, self, roi_hint=roi_hint)
+
+    def encode_face_deepface(self, image: np.ndarray,
+                             roi_hint: Optional[Tuple[int, int, int, int]] = None,
+                             image_hash: Optional[str] = None,
+                             analysis: Optional[FaceAnalysis] = None) -> Optional[np.ndarray]:
+        """Extract face encoding using DeepFace with VGG-Face (ResNet-34 based) model
+
+        With an ``image_hash`` and a registry prefilter, a resubmission of the
+        exact same upload reuses its embedding. An ``analysis`` already shared
+        with the liveness check is reused.
+        """
         if not DEEPFACE_AVAILABLE:
             print("ERROR: DeepFace not available. Cannot encode face without deep learning model.")
             return None
 
+        analysis = analysis or FaceAnalysis(image, self, roi_hint=roi_hint)
+        self.last_timings = analysis.timings
         try:
+            # Grayscale + detection once, shared by every stage below
+            analysis.faces
+            self.last_face_box = analysis.largest_face
+
             # Quality check before encoding
-            is_good_quality, message, quality_score = self.assess_face_quality(image)
+            with analysis.timed('quality'):
+                is_good_quality, message, quality_score = self.assess_face_quality(image, analysis)
             if not is_good_quality:
                 print(f"Quality check failed: {message}")
                 return None
 
-            # Preprocess face for better encoding
-            preprocessed_image = self.preprocess_face(image)
+            # Only a byte-identical resubmission may skip the CNN pass
+            prefilter = self.registry.prefilter if self.registry is not None and image_hash else None
+            if prefilter is not None:
+                embedding = prefilter.lookup(image_hash)
+                if embedding is not None:
+                    print(f"Reused VGG-Face embedding for a resubmitted frame. Quality: {quality_score:.2f}")
+                    return embedding
+
+            # Preprocess face for better encoding, skipping denoising on clean frames
+            profile = self.preprocess_profile
+            if profile == 'auto':
+                profile = self.select_preprocess_profile(analysis.brightness, analysis.sharpness)
+            self.last_preprocess_profile = profile
+            with analysis.timed('preprocess'):
+                if self.single_pass:
+                    aligned = analysis.aligned_face()
+                    preprocessed_image = self.enhance_face(aligned, profile) if aligned is not None else image
+                else:
+                    preprocessed_image = self.preprocess_face(image, analysis, profile)
+
+            # Share a batched forward pass with concurrent requests when enabled
+            batcher = self.registry.batcher if self.registry is not None else None
+            if batcher is not None:
+                with analysis.timed('embed'):
+                    embedding, self.last_queue_wait_ms = batcher.submit(preprocessed_image)
+                if embedding is None:
+                    print("No face embeddings generated by VGG-Face")
+                    return None
+                if prefilter is not None:
+                    prefilter.store(image_hash, embedding)
+                print(f"Successfully encoded face with VGG-Face (batched, queue wait {self.last_queue_wait_ms:.1f}ms). Quality: {quality_score:.2f}, Embedding dims: {embedding.shape}")
+                return embedding
 
             # DeepFace expects BGR image from OpenCV
             # Use VGG-Face model which is based on ResNet-34 architecture for accurate embeddings
             # VGG-Face produces 4096-D embeddings with superior accuracy
             # Use enforce_detection=False to handle varied lighting/angles, but we already did quality checks above
-            embedding_objs = DeepFace.represent(
-                img_path=preprocessed_image,
-                model_name="VGG-Face",
-                enforce_detection=False,
-                detector_backend="opencv",
-                align=True
-            )
+            # In single-pass mode the crop is already detected and aligned, so DeepFace skips detection
+            from deepface import DeepFace
+
+            with analysis.timed('embed'):
+                embedding_objs = DeepFace.represent(
+                    img_path=preprocessed_image,
+                    model_name=self.model_name,
+                    enforce_detection=False,
+                    detector_backend="skip" if self.single_pass else "opencv",
+                    align=not self.single_pass
+                )
 
             if embedding_objs and len(embedding_objs) > 0:
                 # Get the first face embedding
                 embedding = np.array(embedding_objs[0]["embedding"])
+                if prefilter is not None:
+                    prefilter.store(image_hash, embedding)
                 print(f"Successfully encoded face with VGG-Face (ResNet-34 based). Quality: {quality_score:.2f}, Embedding dims: {embedding.shape}")
                 return embedding
 
             print("No face embeddings generated by VGG-Face")
             return None
 
+        except ENCODER_BUSY_ERRORS:
+            raise
         except Exception as e:
             print(f"DeepFace encoding error: {e}")
             # Do NOT fall back to custom encoding - it's not accurate enough
@@ -198,19 +483,38 @@ class FaceService:
     def _extract_custom_encoding(self, image: np.ndarray) -> Optional[np.ndarray]:
         """Fallback custom face encoding method"""
         try:
-            faces = self.detect_faces(image)
-            if not faces:
-                return None
-
-            # Use the largest face
-            largest_face = max(faces, key=lambda f: f[2] * f[3])
-            return self.extract_face_features(image, largest_face)
+            return self.cheap_encoding(image)
         except Exception as e:
             print(f"Custom encoding error: {e}")
             return None
 
+    def cheap_encoding(self, image: np.ndarray, analysis: Optional[FaceAnalysis] = None) -> Optional[np.ndarray]:
+        """128-D fallback descriptor of the largest face, reusing the image's detection pass
+
+        Costs well under a millisecond once faces are detected, so it can run as a
+        pre-filter ahead of the CNN.
+        """
+        analysis = analysis or FaceAnalysis(image, self)
+        largest_face = analysis.largest_face
+        if largest_face is None:
+            return None
+        return self.extract_face_features(image, largest_face)
+
+    # Neighbour offsets of the LBP code, bit 0 first
+    LBP_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+    @staticmethod
+    def _block_view(image: np.ndarray, grid: int = 4) -> np.ndarray:
+        """(grid*grid, block_pixels) view of an image split into a grid of equal blocks, row-major"""
+        h, w = image.shape
+        bh, bw = h // grid, w // grid
+        blocks = image[:bh * grid, :bw * grid].reshape(grid, bh, grid, bw).swapaxes(1, 2)
+        return blocks.reshape(grid * grid, bh * bw)
+
     def extract_face_features(self, image: np.ndarray, face_box: Tuple[int, int, int, int]) -> np.ndarray:
         """Extract enhanced face features to create 128-D encoding"""
+        import cv2
+
         x, y, w, h = face_box
         face_roi = image[y:y+h, x:x+w]
 
@@ -223,33 +527,22 @@ class FaceService:
         # Normalize lighting
         normalized_face = cv2.equalizeHist(resized_face)
 
-        # Extract multiple features to create 128-D encoding
-        all_features = []
-
         # 1. Regional Histogram features (32 features: 4x4 grid, 2 bins each)
-        for i in range(4):
-            for j in range(4):
-                region = normalized_face[i*32:(i+1)*32, j*32:(j+1)*32]
-                hist = cv2.calcHist([region], [0], None, [2], [0, 256])
-                all_features.extend(hist.flatten().tolist())
+        blocks = self._block_view(normalized_face)
+        high = np.count_nonzero(blocks >= 128, axis=1)
+        histograms = np.column_stack((blocks.shape[1] - high, high)).ravel()
 
         # 2. Enhanced LBP features (64 features)
         lbp_features = self._compute_enhanced_lbp(normalized_face)
-        all_features.extend(lbp_features)
 
-        # 3. HOG-like gradient features (32 features: 4x4 grid, 2 bins each)
+        # 3. HOG-like gradient features (32 features: 4x4 grid, mean and std each)
         sobelx = cv2.Sobel(normalized_face, cv2.CV_64F, 1, 0, ksize=3)
         sobely = cv2.Sobel(normalized_face, cv2.CV_64F, 0, 1, ksize=3)
-        magnitude = np.sqrt(sobelx**2 + sobely**2)
-
-        for i in range(4):
-            for j in range(4):
-                region = magnitude[i*32:(i+1)*32, j*32:(j+1)*32]
-                all_features.append(np.mean(region))
-                all_features.append(np.std(region))
+        magnitude_blocks = self._block_view(np.sqrt(sobelx**2 + sobely**2))
+        gradients = np.column_stack((magnitude_blocks.mean(axis=1), magnitude_blocks.std(axis=1))).ravel()
 
-        # Convert to numpy array and ensure exactly 128 features
-        feature_array = np.array(all_features[:128])
+        # Concatenate and ensure exactly 128 features
+        feature_array = np.concatenate((histograms, lbp_features, gradients)).astype(np.float64)[:128]
         if len(feature_array) < 128:
             feature_array = np.pad(feature_array, (0, 128 - len(feature_array)))
 
@@ -260,214 +553,201 @@ class FaceService:
 
         return feature_array
 
-    def _compute_enhanced_lbp(self, image: np.ndarray) -> List[float]:
+    def _compute_enhanced_lbp(self, image: np.ndarray) -> np.ndarray:
         """Compute enhanced Local Binary Pattern features"""
         h, w = image.shape
-        features = []
 
-        # Sample 64 points for better discrimination
+        # Sample 64 points for better discrimination, row-major on an 8px grid
         step = 8
-        for i in range(step, h-step, step):
-            for j in range(step, w-step, step):
-                center = int(image[i, j])
-                # Check 8 neighbors
-                pattern = 0
-                for idx, (di, dj) in enumerate([(-1,-1), (-1,0), (-1,1), (0,1), (1,1), (1,0), (1,-1), (0,-1)]):
-                    if int(image[i+di, j+dj]) >= center:
-                        pattern |= (1 << idx)
-                features.append(pattern / 255.0)
-                if len(features) >= 64:
-                    return features
+        rows = np.arange(step, h - step, step)
+        cols = np.arange(step, w - step, step)
+        center = image[np.ix_(rows, cols)]
+
+        # Compare each shifted neighbour grid against the centers at once
+        pattern = np.zeros(center.shape, dtype=np.uint8)
+        for idx, (di, dj) in enumerate(self.LBP_OFFSETS):
+            pattern |= (image[np.ix_(rows + di, cols + dj)] >= center).astype(np.uint8) << idx
+
+        features = pattern.ravel()[:64] / 255.0
 
         # Pad if needed
-        while len(features) < 64:
-            features.append(0.0)
+        if features.shape[0] < 64:
+            features = np.pad(features, (0, 64 - features.shape[0]))
 
-        return features[:64]
+        return features
 
-    def encode_face_from_base64(self, base64_image: str) -> Optional[np.ndarray]:
-        """Convert base64 image to face encoding using DeepFace"""
-        try:
-            # Remove data URL prefix if present
-            if ',' in base64_image:
-                base64_image = base64_image.split(',')[1]
+    @staticmethod
+    def bytes_from_base64(base64_image: str) -> bytes:
+        """Raw image bytes of a base64 (optionally data URL) string"""
+        # Remove data URL prefix if present
+        if ',' in base64_image:
+            base64_image = base64_image.split(',')[1]
+        return base64.b64decode(base64_image)
 
-            # Decode base64 image
-            image_data = base64.b64decode(base64_image)
-            image = Image.open(io.BytesIO(image_data))
+    def decode_base64_image(self, base64_image: str) -> np.ndarray:
+        """Decode a base64 (optionally data URL) image into a BGR array"""
+        return self.decode_image_bytes(self.bytes_from_base64(base64_image))
 
-            # Convert to OpenCV format
-            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    @staticmethod
+    def decode_image_bytes(image_bytes: bytes) -> Optional[np.ndarray]:
+        """Decode an uploaded JPEG/PNG buffer straight into a BGR array, or None if it is not an image"""
+        import cv2
+
+        return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def encode_face_image(self, face_image: FaceImage,
+                          roi_hint: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+        """Face encoding of a request's FaceImage, reusing its decoded array"""
+        try:
+            pool = self.registry.encoder_pool if self.registry is not None else None
+            if pool is not None:
+                return self._apply_pool_result(*pool.encode_bytes(face_image.raw, roi_hint=roi_hint))
 
-            # Use DeepFace for encoding
-            encoding = self.encode_face_deepface(cv_image)
+            cv_image = face_image.bgr
+            if cv_image is None:
+                print("Could not decode uploaded image")
+                return None
 
+            prefilter = self.registry.prefilter if self.registry is not None else None
+            encoding = self.encode_face_deepface(cv_image, roi_hint=roi_hint,
+                                                 image_hash=face_image.sha256 if prefilter is not None else None,
+                                                 analysis=face_image.analysis(self, roi_hint))
+            self.last_timings = dict(decode=face_image.decode_ms, **self.last_timings)
             return encoding
 
+        except ENCODER_BUSY_ERRORS:
+            raise
         except Exception as e:
             print(f"Error encoding face: {e}")
             return None
 
-    def compare_encodings(self, encoding1: np.ndarray, encoding2: np.ndarray) -> float:
-        """Compare two face encodings using cosine similarity (more accurate for VGG-Face)"""
+    def _apply_pool_result(self, encoding: Optional[np.ndarray], info: dict) -> Optional[np.ndarray]:
+        """Record the face box, timings and profile an encoder process reported for its frame"""
+        face_box = info.get('face_box')
+        self.last_face_box = tuple(face_box) if face_box is not None else None
+        self.last_timings = info.get('timings') or {}
+        self.last_preprocess_profile = info.get('preprocess_profile')
+        self.last_queue_wait_ms = info.get('queue_wait_ms') or 0.0
+        return encoding
+
+    def encode_face_from_bytes(self, image_bytes: bytes,
+                               roi_hint: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+        """Convert an uploaded image buffer to face encoding using DeepFace"""
+        return self.encode_face_image(FaceImage(image_bytes), roi_hint=roi_hint)
+
+    def encode_face_from_base64(self, base64_image: str,
+                                roi_hint: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+        """Convert base64 image to face encoding using DeepFace"""
         try:
-            # Normalize encodings
-            enc1_norm = encoding1 / np.linalg.norm(encoding1)
-            enc2_norm = encoding2 / np.linalg.norm(encoding2)
+            # Hand the whole pipeline to the encoder processes when configured
+            pool = self.registry.encoder_pool if self.registry is not None else None
+            if pool is not None:
+                return self._apply_pool_result(*pool.encode_base64(base64_image, roi_hint=roi_hint))
 
-            # Compute cosine similarity
-            cosine_similarity = np.dot(enc1_norm, enc2_norm)
+            return self.encode_face_image(FaceImage.from_base64(base64_image), roi_hint=roi_hint)
 
-            # Convert to distance (0 = identical, 1 = completely different)
-            # Cosine similarity ranges from -1 to 1, we convert to 0-1 distance
-            distance = (1 - cosine_similarity)/2.0
-
-            # Also compute Euclidean distance for additional verification
-            euclidean_distance = np.linalg.norm(encoding1 - encoding2)
+        except ENCODER_BUSY_ERRORS:
+            raise
+        except Exception as e:
+            print(f"Error encoding face: {e}")
+            return None
 
-            # For VGG-Face, typical Euclidean distance for same person is 0.3-0.6
-            # Different persons typically have distance > 0.7
-            # We'll use cosine distance as primary metric
+    normalize_encoding = staticmethod(template_matching.normalize_encoding)
+    build_template_matrix = staticmethod(template_matching.build_template_matrix)
+    match_templates = staticmethod(template_matching.match_templates)
 
-            print(f"Cosine distance: {distance:.4f}, Euclidean distance: {euclidean_distance:.4f}")
+    def compare_encodings(self, encoding1: np.ndarray, encoding2: np.ndarray) -> float:
+        """Compare two face encodings using cosine similarity (more accurate for VGG-Face)"""
+        try:
+            enc1_norm = self.normalize_encoding(encoding1)
+            enc2_norm = self.normalize_encoding(encoding2)
 
-            return float(distance)
+            # Convert to distance (0 = identical, 1 = completely different)
+            return float((1.0 - np.dot(enc1_norm, enc2_norm)) / 2.0)
 
         except Exception as e:
             print(f"Error comparing encodings: {e}")
             return 1.0  # Return maximum distance on error
 
-    def verify_face(self, known_encodings: List[np.ndarray], test_encoding: np.ndarray) -> Tuple[bool, float]:
-        """Verify if test encoding matches any known encodings"""
-        if not known_encodings or test_encoding is None:
-            print("Verification failed: No known encodings or test encoding is None")
-            return False, 1.0
-
-        # Validate encoding dimensions
-        test_dims = test_encoding.shape[0] if len(test_encoding.shape) > 0 else 0
-        print(f"Test encoding dimensions: {test_dims}")
-
-        min_distance = float('inf')
-        best_match_idx = -1
-
-        for idx, known_encoding in enumerate(known_encodings):
-            known_dims = known_encoding.shape[0] if len(known_encoding.shape) > 0 else 0
-
-            # Ensure encodings have compatible dimensions
-            if known_dims != test_dims:
-                print(f"WARNING: Encoding dimension mismatch! Known: {known_dims}, Test: {test_dims}")
-                continue
-
-            distance = self.compare_encodings(known_encoding, test_encoding)
-            if distance < min_distance:
-                min_distance = distance
-                best_match_idx = idx
-
-        # Use threshold for matching (distance < threshold means MATCH)
-        is_match = min_distance < self.threshold
-
-        print(f"Verification result: {'MATCH' if is_match else 'NO MATCH'}")
-        print(f"  - Best distance: {min_distance:.4f} (threshold: {self.threshold:.4f})")
-        print(f"  - Distance check: {min_distance:.4f} < {self.threshold:.4f} = {is_match}")
-        print(f"  - Best match index: {best_match_idx}")
-        print(f"  - Compared against {len(known_encodings)} enrolled face(s)")
-
-        return is_match, float(min_distance)
+    def verify_face(self, known_encodings, test_encoding: np.ndarray, fusion: str = 'min',
+                    top_k: int = 3, test_normalized: bool = False) -> Tuple[bool, float]:
+        """Verify if test encoding matches any known encodings (see verify_templates)"""
+        return template_matching.verify_templates(known_encodings, test_encoding, self.threshold, fusion=fusion,
+                                                  top_k=top_k, test_normalized=test_normalized)
+
+    def start_liveness_detection(self, image, image_hash: Optional[str] = None,
+                                 roi_hint: Optional[Tuple[int, int, int, int]] = None,
+                                 session_key: Optional[str] = None) -> LivenessTask:
+        """Start AI liveness detection in the background so it overlaps with face encoding
+
+        ``image`` is the request's FaceImage, a base64 string or a raw image buffer.
+        For a FaceImage the frame analysis is created here with the encoder's
+        ``roi_hint``, so a local liveness check and the encoder share one
+        detection pass whichever of them gets to it first. With an encoder
+        pool both run in worker processes instead, and nothing is decoded
+        here. ``session_key`` identifies the booth session for providers that
+        compare consecutive frames.
+        """
+        pool = self.registry.encoder_pool if self.registry is not None else None
+        if isinstance(image, FaceImage) and pool is None:
+            image.analysis(self, roi_hint)
+        return self.liveness.submit(image, image_hash=image_hash, session_key=session_key)
 
     def ai_liveness_detection(self, base64_image: str) -> Dict[str, any]:
         """Use AI (OpenAI or Gemini) to detect if image is a real person (liveness detection)"""
         try:
-            # Try OpenAI first
-            if self.openai_key and OPENAI_AVAILABLE:
-                return self._openai_liveness_check(base64_image)
-            # Fallback to Gemini
-            elif self.gemini_key and GENAI_AVAILABLE:
-                return self._gemini_liveness_check(base64_image)
-            else:
-                # No AI available - indicate liveness check is skipped, will rely on face matching only
-                return {"is_live": None, "confidence": 0.0, "reason": "AI liveness detection not configured - skipping liveness check, using face matching only", "ai_available": False}
+            return self.start_liveness_detection(base64_image).result()
         except Exception as e:
             print(f"AI liveness detection error: {e}")
             # On error, skip liveness check and rely on face matching
             return {"is_live": None, "confidence": 0.0, "reason": f"AI liveness error: {str(e)} - skipping liveness check", "ai_available": False}
 
-    def _openai_liveness_check(self, base64_image: str) -> Dict[str, any]:
-        """Use OpenAI Vision to check for liveness"""
-        if not OPENAI_AVAILABLE:
-            return {"is_live": None, "confidence": 0.0, "reason": "OpenAI not available", "ai_available": False}
+    def local_liveness_detection(self, image: np.ndarray, previous_image: Optional[np.ndarray] = None,
+                                 threshold: float = 0.5, analysis: Optional[FaceAnalysis] = None,
+                                 previous_eyes: Optional[int] = None) -> Dict[str, any]:
+        """On-box anti-spoofing from texture, frequency and moire cues of the face ROI
 
+        Args:
+            image: Current BGR frame
+            previous_image: Earlier frame of the same session; enables the blink signal
+            threshold: Minimum combined score treated as live
+            analysis: The frame's FaceAnalysis, reusing detection done for encoding
+            previous_eyes: Eye count of the session's previous frame; enables the
+                           blink signal without keeping that frame around
+        """
         try:
-            # Remove data URL prefix if present
-            if ',' in base64_image:
-                base64_image = base64_image.split(',')[1]
-
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Analyze this image carefully. Is this a real human face (live person) or a fake/spoofed image (photo, screen, printed image, mask)? Answer with ONLY 'REAL' or 'FAKE' followed by a brief reason."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=100
-            )
+            analysis = analysis or FaceAnalysis(image, self)
+            face = analysis.largest_face
+            if face is None:
+                return {"is_live": None, "confidence": 0.0, "reason": "No face found for local liveness check", "ai_available": False}
+
+            x, y, w, h = face
+            if previous_image is not None:
+                blink = self.detect_blink(previous_image, image)
+            elif previous_eyes is not None:
+                # Same heuristic as detect_blink: the eye count changes by two between frames
+                blink = abs(previous_eyes - len(analysis.eyes)) >= 2
+            else:
+                blink = None
 
-            result = response.choices[0].message.content.strip()
-            is_live = "REAL" in result.upper()
+            detector = getattr(self, '_local_liveness', None)
+            if detector is None or detector.threshold != threshold:
+                detector = self._local_liveness = LocalLivenessDetector(threshold=threshold)
+            return detector.analyze(image[y:y+h, x:x+w], blink=blink)
 
-            return {
-                "is_live": is_live,
-                "confidence": 0.9 if is_live else 0.1,
-                "reason": result,
-                "ai_available": True
-            }
         except Exception as e:
-            print(f"OpenAI liveness check error: {e}")
-            return {"is_live": None, "confidence": 0.0, "reason": f"OpenAI error: {str(e)} - skipping liveness check", "ai_available": False}
-
-    def _gemini_liveness_check(self, base64_image: str) -> Dict[str, any]:
-        """Use Gemini Vision to check for liveness"""
-        if not GENAI_AVAILABLE:
-            return {"is_live": None, "confidence": 0.0, "reason": "Gemini not available", "ai_available": False}
+            print(f"Local liveness detection error: {e}")
+            return {"is_live": None, "confidence": 0.0, "reason": f"Local liveness error: {str(e)} - skipping liveness check", "ai_available": False}
 
+    def save_image_bytes(self, image_bytes: bytes, filepath: str) -> bool:
+        """Save an uploaded image buffer to file as-is"""
         try:
-            # Remove data URL prefix if present
-            if ',' in base64_image:
-                base64_image = base64_image.split(',')[1]
-
-            # Decode base64 to bytes
-            image_data = base64.b64decode(base64_image)
-
-            model = genai.GenerativeModel('gemini-1.5-flash')
-
-            response = model.generate_content([
-                "Analyze this image carefully. Is this a real human face (live person) or a fake/spoofed image (photo, screen, printed image, mask)? Answer with ONLY 'REAL' or 'FAKE' followed by a brief reason.",
-                {"mime_type": "image/jpeg", "data": base64_image}
-            ])
-
-            result = response.text.strip()
-            is_live = "REAL" in result.upper()
-
-            return {
-                "is_live": is_live,
-                "confidence": 0.9 if is_live else 0.1,
-                "reason": result,
-                "ai_available": True
-            }
+            with open(filepath, 'wb') as f:
+                f.write(image_bytes)
+            return True
         except Exception as e:
-            print(f"Gemini liveness check error: {e}")
-            return {"is_live": None, "confidence": 0.0, "reason": f"Gemini error: {str(e)} - skipping liveness check", "ai_available": False}
+            print(f"Error saving image: {e}")
+            return False
 
     def save_image_from_base64(self, base64_image: str, filepath: str) -> bool:
         """Save base64 image to file"""
@@ -490,12 +770,15 @@ class FaceService:
 
     def detect_blink(self, image1: np.ndarray, image2: np.ndarray) -> bool:
         """Simple blink detection by comparing eye regions"""
+        import cv2
+
         try:
             gray1 = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY)
             gray2 = cv2.cvtColor(image2, cv2.COLOR_BGR2GRAY)
 
-            eyes1 = self.eye_cascade.detectMultiScale(gray1)
-            eyes2 = self.eye_cascade.detectMultiScale(gray2)
+            with self.cascades() as (_, eye_cascade):
+                eyes1 = eye_cascade.detectMultiScale(gray1)
+                eyes2 = eye_cascade.detectMultiScale(gray2)
 
             # Simple heuristic: significant change in number of detected eyes
             return len(eyes1) != len(eyes2) and abs(len(eyes1) - len(eyes2)) >= 2
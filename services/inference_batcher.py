@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class BatcherBusy(Exception):
+    """Raised when the inference queue is full"""
+
+
+class _Job:
+    __slots__ = ('image', 'enqueued_at', 'started_at', 'result', 'error', 'done')
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingBatcher:
+    """Micro-batching queue in front of the embedding model.
+
+    Concurrent encode requests from Flask threads are collected for up to
+    ``max_wait_ms`` (or until ``max_batch_size`` is reached) and run through a
+    single batched forward pass. Each caller gets its own embedding back along
+    with the time it spent waiting in the queue.
+    """
+
+    def __init__(self, represent_batch: Callable[[List[np.ndarray]], List[Optional[np.ndarray]]],
+                 max_batch_size: int = 8, max_wait_ms: float = 10.0, max_queue: int = 64):
+        self.represent_batch = represent_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, image: np.ndarray, timeout: Optional[float] = 30.0) -> Tuple[Optional[np.ndarray], float]:
+        """Queue one image and block until its embedding is ready
+
+        Returns:
+            (embedding or None, queue wait in milliseconds)
+        """
+        self.start()
+        job = _Job(image)
+        try:
+            self._queue.put(job, timeout=self.max_wait)
+        except queue.Full:
+            raise BatcherBusy("Embedding queue is full")
+
+        if not job.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for embedding")
+        if job.error is not None:
+            raise job.error
+
+        wait_ms = ((job.started_at or job.enqueued_at) - job.enqueued_at) * 1000.0
+        return job.result, wait_ms
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self) -> List[_Job]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started_at = time.perf_counter()
+            for job in batch:
+                job.started_at = started_at
+            try:
+                results = self.represent_batch([job.image for job in batch])
+                for job, result in zip(batch, results):
+                    job.result = result
+            except Exception as e:
+                print(f"Batched embedding error: {e}")
+                for job in batch:
+                    job.error = e
+            finally:
+                for job in batch:
+                    job.done.set()
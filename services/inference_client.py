@@ -0,0 +1,222 @@
+import base64
+import http.client
+import json
+import socket
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+from flask import current_app
+
+from services.face_image import FaceImage
+from services.liveness import skipped_result
+from services.template_matching import verify_templates
+
+
+class InferenceUnavailable(Exception):
+    """The face inference service could not be reached or did not answer"""
+
+
+class InferenceBusy(InferenceUnavailable):
+    """The face inference service answered 503: its encoders are saturated, retry shortly"""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix domain socket"""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class InferenceClient:
+    """Keep-alive client for the face inference service of a split deployment.
+
+    ``url`` is ``unix:///path/to/inference.sock`` or ``http://127.0.0.1:8100``.
+    Each request thread keeps its own connection, so a web worker pays the
+    connect cost once rather than per frame.
+    """
+
+    def __init__(self, url: str, timeout: float = 25.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ('unix', 'http'):
+            raise ValueError(f"Unsupported FACE_INFERENCE_URL scheme: {url}")
+        self.url = url
+        self.timeout = timeout
+        self._scheme = parts.scheme
+        self._socket_path = parts.path if parts.scheme == 'unix' else None
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._prefix = '' if parts.scheme == 'unix' else parts.path.rstrip('/')
+        self._local = threading.local()
+        self.requests = 0
+        self.failures = 0
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self._scheme == 'unix':
+                connection = _UnixHTTPConnection(self._socket_path, self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+        self._local.connection = None
+
+    def post(self, path: str, body: bytes, params: Optional[Dict[str, str]] = None,
+             content_type: str = 'application/octet-stream') -> dict:
+        """POST ``body`` and return the decoded JSON response"""
+        target = f"{self._prefix}{path}"
+        if params:
+            target = f"{target}?{urlencode(params)}"
+
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request('POST', target, body=body, headers={'Content-Type': content_type})
+                response = connection.getresponse()
+                payload = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._drop_connection()
+                # A kept-alive connection closed by the server fails on first
+                # use; retry once on a fresh one, but never after a timeout
+                if attempt == 0 and not isinstance(e, socket.timeout):
+                    continue
+                self.failures += 1
+                raise InferenceUnavailable(f"Face inference service unavailable: {e}") from e
+
+            self.requests += 1
+            if response.status == 503:
+                raise InferenceBusy("Face inference service is busy")
+            if response.status != 200:
+                self.failures += 1
+                raise InferenceUnavailable(f"Face inference service returned HTTP {response.status}")
+            return json.loads(payload)
+
+    def encode(self, face_image: FaceImage, roi_hint: Optional[Tuple[int, int, int, int]] = None,
+               liveness: bool = False,
+               liveness_key: Optional[str] = None) -> dict:
+        """Encode one frame; with ``liveness`` the verdict comes back in the same response
+
+        ``liveness_key`` names the booth session whose previous frame the
+        liveness provider may compare against.
+        """
+        params = {}
+        if roi_hint:
+            params['roi'] = ','.join(str(int(v)) for v in roi_hint)
+        if liveness:
+            params['liveness'] = '1'
+            if liveness_key:
+                params['liveness_key'] = liveness_key
+        return self.post('/inference/encode', face_image.raw, params, content_type='image/jpeg')
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+        }
+
+
+class _PendingLiveness:
+    """Liveness verdict that arrives with the encode response"""
+
+    def __init__(self, session_key: Optional[str] = None):
+        self.session_key = session_key
+        self._result = None
+
+    def result(self, deadline: Optional[float] = None) -> Dict[str, any]:
+        if self._result is None:
+            return skipped_result("Liveness was not checked by the face inference service - skipping liveness check")
+        return self._result
+
+
+class RemoteFaceService:
+    """FaceService stand-in for web workers that forward encoding to the inference service.
+
+    Offers the subset of FaceService used by the auth and enrollment
+    routes. Liveness runs on the inference service alongside the encode,
+    so starting it only flags the next encode call. Matching against the
+    cached templates stays local and needs only NumPy.
+    """
+
+    registry = None
+
+    def __init__(self, client: InferenceClient, threshold: float):
+        self.client = client
+        self.threshold = threshold
+        self.last_face_box = None
+        self.last_preprocess_profile = None
+        self.last_queue_wait_ms = 0.0
+        self.last_timings: Dict[str, float] = {}
+        self._liveness = None
+
+    def start_liveness_detection(self, image, image_hash: Optional[str] = None,
+                                 roi_hint: Optional[Tuple[int, int, int, int]] = None,
+                                 session_key: Optional[str] = None) -> _PendingLiveness:
+        self._liveness = _PendingLiveness(session_key)
+        return self._liveness
+
+    def encode_face_image(self, face_image: FaceImage,
+                          roi_hint: Optional[Tuple[int, int, int, int]] = None) -> Optional[np.ndarray]:
+        """Face encoding computed by the inference service
+
+        Raises:
+            InferenceUnavailable: when the service cannot be reached, so an
+                outage is not reported to the voter as "no face detected"
+            InferenceBusy: when the service's encoders are saturated
+        """
+        liveness, self._liveness = self._liveness, None
+        response = self.client.encode(face_image, roi_hint=roi_hint,
+                                      liveness=liveness is not None,
+                                      liveness_key=liveness.session_key if liveness is not None else None)
+        if liveness is not None:
+            liveness._result = response.get('liveness')
+
+        face_box = response.get('face_box')
+        self.last_face_box = tuple(face_box) if face_box else None
+        self.last_timings = response.get('timings') or {}
+        self.last_preprocess_profile = response.get('preprocess_profile')
+        self.last_queue_wait_ms = response.get('queue_wait_ms') or 0.0
+
+        encoding = response.get('encoding')
+        return np.frombuffer(base64.b64decode(encoding), dtype='<f4').copy() if encoding else None
+
+    def verify_face(self, known_encodings, test_encoding: np.ndarray, fusion: str = 'min',
+                    top_k: int = 3, test_normalized: bool = False) -> Tuple[bool, float]:
+        return verify_templates(known_encodings, test_encoding, self.threshold, fusion=fusion,
+                                top_k=top_k, test_normalized=test_normalized)
+
+
+def init_inference_client(app) -> InferenceClient:
+    client = InferenceClient(app.config['FACE_INFERENCE_URL'], timeout=app.config.get('FACE_INFERENCE_TIMEOUT', 25.0))
+    app.extensions['inference_client'] = client
+    return client
+
+
+def get_face_service(threshold: Optional[float] = None):
+    """FaceService for the current app: the in-process models, or the
+    inference service client when FACE_INFERENCE_URL is configured"""
+    if threshold is None:
+        threshold = current_app.config.get('FACE_THRESHOLD', 0.30)
+    client = current_app.extensions.get('inference_client')
+    if client is not None:
+        return RemoteFaceService(client, threshold)
+
+    from services.model_registry import get_face_service as get_local_face_service
+    return get_local_face_service(threshold)
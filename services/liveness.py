@@ -0,0 +1,346 @@
+import base64
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Union
+
+import requests
+
+from services.face_image import FaceImage
+
+# Vendor SDKs are only imported when their provider is built, so processes
+# without a key configured never load them
+OPENAI_AVAILABLE = importlib.util.find_spec('openai') is not None
+try:
+    GENAI_AVAILABLE = importlib.util.find_spec('google.generativeai') is not None
+except ModuleNotFoundError:
+    GENAI_AVAILABLE = False
+
+LIVENESS_PROMPT = ("Analyze this image carefully. Is this a real human face (live person) or a fake/spoofed image "
+                   "(photo, screen, printed image, mask)? Answer with ONLY 'REAL' or 'FAKE' followed by a brief reason.")
+
+
+def skipped_result(reason: str) -> Dict[str, any]:
+    """Result used whenever liveness could not be decided - face matching still runs"""
+    return {"is_live": None, "confidence": 0.0, "reason": reason, "ai_available": False}
+
+
+def _strip_data_url(base64_image: str) -> str:
+    # Remove data URL prefix if present
+    if ',' in base64_image:
+        return base64_image.split(',')[1]
+    return base64_image
+
+
+def _as_base64(image: Union[str, bytes, FaceImage]) -> str:
+    """Base64 payload for vendor APIs from a FaceImage, an uploaded buffer or a base64 string"""
+    if isinstance(image, FaceImage):
+        return image.base64
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return base64.b64encode(image).decode('ascii')
+    return _strip_data_url(image)
+
+
+def _parse_verdict(result: str) -> Dict[str, any]:
+    is_live = "REAL" in result.upper()
+    return {
+        "is_live": is_live,
+        "confidence": 0.9 if is_live else 0.1,
+        "reason": result,
+        "ai_available": True
+    }
+
+
+class LivenessProvider:
+    """A backend that decides whether a frame shows a live person"""
+
+    name = "none"
+
+    def check(self, image: Union[str, bytes, FaceImage], session_key: Optional[str] = None) -> Dict[str, any]:
+        """Verdict for a FaceImage, a base64 string or a raw JPEG/PNG buffer
+
+        ``session_key`` identifies the booth session for providers that compare
+        consecutive frames; single-frame providers ignore it.
+        """
+        raise NotImplementedError
+
+
+class OpenAILivenessProvider(LivenessProvider):
+    """OpenAI vision model; ``base_url`` lets a local stub server stand in for the API"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: Optional[str] = None,
+                 timeout: float = 5.0):
+        import openai
+
+        self.model = model
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+
+    def check(self, image: Union[str, bytes, FaceImage], session_key: Optional[str] = None) -> Dict[str, any]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": LIVENESS_PROMPT},
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": f"data:image/jpeg;base64,{_as_base64(image)}"}
+                        }
+                    ]
+                }
+            ],
+            max_tokens=100
+        )
+        return _parse_verdict(response.choices[0].message.content.strip())
+
+
+class GeminiLivenessProvider(LivenessProvider):
+    """Gemini vision model, created once instead of per call"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model: str = "gemini-1.5-flash", endpoint: Optional[str] = None,
+                 timeout: float = 5.0):
+        import google.generativeai as genai
+
+        if endpoint:
+            genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+        else:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model)
+        self.timeout = timeout
+
+    def check(self, image: Union[str, bytes, FaceImage], session_key: Optional[str] = None) -> Dict[str, any]:
+        response = self.model.generate_content(
+            [LIVENESS_PROMPT, {"mime_type": "image/jpeg", "data": _as_base64(image)}],
+            request_options={"timeout": self.timeout}
+        )
+        return _parse_verdict(response.text.strip())
+
+
+class HttpLivenessProvider(LivenessProvider):
+    """Plain JSON endpoint, e.g. a local stub server in tests
+
+    POSTs ``{"image": <base64>}`` and expects ``{"is_live": bool, "confidence": float, "reason": str}``.
+    """
+
+    name = "http"
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def check(self, image: Union[str, bytes, FaceImage], session_key: Optional[str] = None) -> Dict[str, any]:
+        response = self.session.post(self.url, json={"image": _as_base64(image)}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return {
+            "is_live": data.get("is_live"),
+            "confidence": float(data.get("confidence", 0.0)),
+            "reason": data.get("reason", ""),
+            "ai_available": True
+        }
+
+
+class CircuitBreaker:
+    """Stops calling a failing provider for ``reset_timeout`` seconds after repeated failures"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # Half-open: let one probe through once the reset timeout passes
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+class LivenessTask:
+    """Handle on a liveness check running in the background"""
+
+    def __init__(self, checker: 'LivenessChecker', future: Optional[Future] = None,
+                 result: Optional[Dict[str, any]] = None):
+        self.checker = checker
+        self.future = future
+        self._result = result
+
+    def result(self, deadline: Optional[float] = None) -> Dict[str, any]:
+        """Wait up to ``deadline`` seconds for the verdict
+
+        The wait starts here, after the caller's own work such as encoding,
+        so a slow encode never eats into the liveness budget. Giving up is
+        the caller's decision and is not counted against the provider: its
+        own failures and timeouts reach the circuit breaker from the worker.
+        """
+        if self._result is not None:
+            return self._result
+        deadline = self.checker.deadline if deadline is None else deadline
+        try:
+            self._result = self.future.result(timeout=deadline)
+        except FutureTimeoutError:
+            self._result = skipped_result(
+                f"AI liveness timed out after {deadline:.1f}s - skipping liveness check")
+        return self._result
+
+
+class LivenessChecker:
+    """Runs liveness checks concurrently with encoding, under a deadline and circuit breaker.
+
+    Verdicts are cached by provider, session key and image hash, so a
+    retried frame is never sent twice and a verdict that depended on one
+    session's previous frame is never reused for another session.
+    """
+
+    def __init__(self, provider: Optional[LivenessProvider], deadline: float = 3.0, workers: int = 4,
+                 cache_size: int = 1024, cache_ttl: float = 300.0, breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.deadline = deadline
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.breaker = breaker or CircuitBreaker()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.provider is not None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='liveness')
+            return self._executor
+
+    @staticmethod
+    def image_hash(image: Union[str, bytes, FaceImage]) -> str:
+        if isinstance(image, FaceImage):
+            return image.sha256
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(image).hexdigest()
+        return hashlib.sha256(_strip_data_url(image).encode('ascii')).hexdigest()
+
+    def _cached(self, key: str) -> Optional[Dict[str, any]]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            result, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return result
+
+    def _store(self, key: str, result: Dict[str, any]) -> None:
+        with self._cache_lock:
+            self._cache[key] = (result, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run(self, key: str, image: Union[str, bytes, FaceImage],
+             session_key: Optional[str] = None) -> Dict[str, any]:
+        try:
+            result = self.provider.check(image, session_key=session_key)
+        except Exception as e:
+            print(f"{self.provider.name} liveness check error: {e}")
+            self.breaker.record_failure()
+            return skipped_result(f"{self.provider.name} error: {str(e)} - skipping liveness check")
+        self.breaker.record_success()
+        self._store(key, result)
+        return result
+
+    def submit(self, image: Union[str, bytes, FaceImage], image_hash: Optional[str] = None,
+               session_key: Optional[str] = None) -> LivenessTask:
+        """Start a liveness check without blocking the caller
+
+        ``image`` is a FaceImage, a base64 string or the raw uploaded JPEG/PNG buffer.
+        ``session_key`` is passed through to the provider and is part of the cache key.
+        """
+        if self.provider is None:
+            return LivenessTask(self, result=skipped_result(
+                "AI liveness detection not configured - skipping liveness check, using face matching only"))
+
+        key = f"{self.provider.name}:{session_key or ''}:{image_hash or self.image_hash(image)}"
+        cached = self._cached(key)
+        if cached is not None:
+            return LivenessTask(self, result=cached)
+
+        if not self.breaker.allow():
+            return LivenessTask(self, result=skipped_result(
+                "AI liveness circuit open after repeated failures - skipping liveness check"))
+
+        return LivenessTask(self, future=self._get_executor().submit(self._run, key, image, session_key))
+
+    def check(self, image: Union[str, bytes, FaceImage]) -> Dict[str, any]:
+        return self.submit(image).result()
+
+
+def build_liveness_provider(config: Dict[str, any]) -> Optional[LivenessProvider]:
+    """Pick a provider from app config (or the environment when config is empty)"""
+    def get(key, default=None):
+        return config.get(key, os.environ.get(key, default))
+
+    provider = (get('LIVENESS_PROVIDER') or 'auto').lower()
+    timeout = float(get('LIVENESS_DEADLINE', 3.0))
+    openai_key = get('OPENAI_API_KEY')
+    gemini_key = get('GEMINI_API_KEY')
+
+    try:
+        if provider == 'http' or (provider == 'auto' and get('LIVENESS_STUB_URL')):
+            return HttpLivenessProvider(get('LIVENESS_STUB_URL'), timeout=timeout)
+        if provider in ('openai', 'auto') and openai_key and OPENAI_AVAILABLE:
+            return OpenAILivenessProvider(openai_key, base_url=get('OPENAI_BASE_URL'), timeout=timeout)
+        if provider in ('gemini', 'auto') and gemini_key and GENAI_AVAILABLE:
+            return GeminiLivenessProvider(gemini_key, endpoint=get('GEMINI_API_ENDPOINT'), timeout=timeout)
+    except Exception as e:
+        print(f"Error configuring liveness provider: {e}")
+    return None
+
+
+def build_liveness_checker(config: Dict[str, any]) -> LivenessChecker:
+    return LivenessChecker(
+        build_liveness_provider(config),
+        deadline=float(config.get('LIVENESS_DEADLINE', 3.0)),
+        workers=int(config.get('LIVENESS_WORKERS', 4)),
+        cache_size=int(config.get('LIVENESS_CACHE_SIZE', 1024)),
+        cache_ttl=float(config.get('LIVENESS_CACHE_TTL', 300.0)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(config.get('LIVENESS_BREAKER_FAILURES', 5)),
+            reset_timeout=float(config.get('LIVENESS_BREAKER_RESET', 30.0))
+        )
+    )
@@ -0,0 +1,290 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import click
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import func, insert, select, update
+
+from models import db
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+# Notification emails waiting for (or past) delivery. Rows are written before
+# the request returns, so queued mail survives a crash or restart.
+email_outbox = db.Table(
+    'email_outbox',
+    db.Column('id', db.BigInteger, primary_key=True, autoincrement=True),
+    db.Column('subject', db.Text, nullable=False),
+    db.Column('recipients', db.Text, nullable=False),
+    db.Column('body', db.Text, nullable=False),
+    db.Column('attachment_path', db.String(512)),
+    db.Column('attachment_name', db.String(255)),
+    db.Column('status', db.String(16), nullable=False, server_default=PENDING),
+    db.Column('attempts', db.Integer, nullable=False, server_default='0'),
+    db.Column('next_attempt_at', db.DateTime, nullable=False),
+    db.Column('created_at', db.DateTime, nullable=False),
+    db.Column('sent_at', db.DateTime),
+    db.Column('last_error', db.Text),
+)
+
+
+class MailOutbox:
+    """Bounded pool of SMTP senders fed from the email_outbox table.
+
+    ``enqueue`` commits a row and wakes a worker. Each worker claims up to
+    ``batch_size`` due rows (``FOR UPDATE SKIP LOCKED``, so several worker
+    processes never send the same row) and delivers them over one SMTP
+    session from ``mail.connect()``. The session is kept open across
+    batches and closed after ``idle_timeout`` seconds without mail, so a
+    busy booth pays one TLS handshake per worker instead of one per email.
+
+    Failed sends are retried with exponential backoff up to
+    ``max_attempts``. A claimed row carries a lease: if its process dies
+    mid-send the row becomes due again once the lease expires. A row whose
+    snapshot attachment is not on disk yet is retried the same way; on the
+    last attempt it goes out without the snapshot and ``last_error`` says so.
+    """
+
+    def __init__(self, app, workers: int = 2, batch_size: int = 20, max_attempts: int = 6,
+                 retry_base: float = 10.0, retry_max: float = 900.0, poll_interval: float = 5.0,
+                 idle_timeout: float = 30.0, lease: float = 300.0):
+        self.app = app
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.lease = timedelta(seconds=lease)
+        # Wake-ups only; the table is the queue, so a dropped wake-up just waits for the next poll
+        self._wakeups = queue.Queue(maxsize=1024)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f'mail-outbox-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, subject: str, recipients: List[str], body: str,
+                attachment_path: Optional[str] = None, attachment_name: Optional[str] = None) -> int:
+        """Persist an email and wake a sender; returns the outbox id
+
+        Written on its own connection so it is durable whether or not the
+        caller's transaction commits.
+        """
+        now = datetime.utcnow()
+        with db.engine.begin() as connection:
+            outbox_id = connection.execute(insert(email_outbox).values(
+                subject=subject,
+                recipients=json.dumps([r for r in recipients if r]),
+                body=body,
+                attachment_path=attachment_path,
+                attachment_name=attachment_name,
+                status=PENDING,
+                attempts=0,
+                next_attempt_at=now,
+                created_at=now
+            ).returning(email_outbox.c.id)).scalar_one()
+
+        self.start()
+        try:
+            self._wakeups.put_nowait(outbox_id)
+        except queue.Full:
+            pass
+        return outbox_id
+
+    def _wait(self) -> None:
+        """Block until an enqueue wakes this worker or the poll interval passes"""
+        try:
+            self._wakeups.get(timeout=self.poll_interval)
+        except queue.Empty:
+            return
+        # One claim picks up every row enqueued so far, so the rest are redundant
+        for _ in range(self.batch_size - 1):
+            try:
+                self._wakeups.get_nowait()
+            except queue.Empty:
+                break
+
+    def _claim(self) -> list:
+        """Lease up to ``batch_size`` due rows, oldest first, to this worker"""
+        now = datetime.utcnow()
+        due = (
+            select(email_outbox.c.id)
+            .where(email_outbox.c.status.in_((PENDING, SENDING)), email_outbox.c.next_attempt_at <= now)
+            .order_by(email_outbox.c.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        with db.engine.begin() as connection:
+            return connection.execute(
+                update(email_outbox)
+                .where(email_outbox.c.id.in_(due))
+                .values(status=SENDING, attempts=email_outbox.c.attempts + 1, next_attempt_at=now + self.lease)
+                .returning(*email_outbox.c)
+            ).all()
+
+    @staticmethod
+    def _missing_attachment(row) -> bool:
+        # Snapshots are written in the background and may land after the enqueue
+        return bool(row.attachment_path) and not os.path.exists(row.attachment_path)
+
+    def _message(self, row) -> Message:
+        msg = Message(subject=row.subject, recipients=json.loads(row.recipients), body=row.body)
+        # Read at send time; a still-missing snapshot is only skipped on the last attempt
+        if row.attachment_path and os.path.exists(row.attachment_path):
+            with self.app.open_resource(row.attachment_path, 'rb') as fp:
+                msg.attach(filename=row.attachment_name or os.path.basename(row.attachment_path),
+                           content_type="image/jpeg", data=fp.read())
+        return msg
+
+    def _run(self) -> None:
+        connection, last_used = None, 0.0
+        while True:
+            self._wait()
+            try:
+                with self.app.app_context():
+                    # Keep claiming while full batches come back so a backlog drains without waiting
+                    rows = self._claim()
+                    while rows:
+                        connection = self._deliver(rows, connection)
+                        last_used = time.monotonic()
+                        rows = self._claim() if len(rows) == self.batch_size else []
+                    if connection is not None and time.monotonic() - last_used > self.idle_timeout:
+                        connection = self._close(connection)
+            except Exception as e:
+                print(f"Mail outbox error: {e}")
+                connection = self._close(connection)
+                time.sleep(self.poll_interval)
+
+    def _deliver(self, rows, connection):
+        mail = self.app.extensions['mail']
+        sent, unattached = [], []
+        for row in rows:
+            missing = self._missing_attachment(row)
+            if missing and row.attempts < self.max_attempts:
+                self._retry_later(row, FileNotFoundError(f"Attachment {row.attachment_path} not written yet"))
+                continue
+            try:
+                if connection is None:
+                    connection = mail.connect()
+                    connection.__enter__()
+                connection.send(self._message(row))
+                (unattached if missing else sent).append(row)
+            except Exception as e:
+                # Drop the session so one bad exchange cannot fail the rest of the batch
+                connection = self._close(connection)
+                self._retry_later(row, e)
+
+        for row in unattached:
+            current_app.logger.warning(f"Email {row.id} sent without its attachment {row.attachment_path}, "
+                                       f"which was still missing after {row.attempts} attempts")
+        if sent or unattached:
+            now = datetime.utcnow()
+            with db.engine.begin() as db_connection:
+                if sent:
+                    db_connection.execute(
+                        update(email_outbox)
+                        .where(email_outbox.c.id.in_([row.id for row in sent]))
+                        .values(status=SENT, sent_at=now, last_error=None)
+                    )
+                if unattached:
+                    db_connection.execute(
+                        update(email_outbox)
+                        .where(email_outbox.c.id.in_([row.id for row in unattached]))
+                        .values(status=SENT, sent_at=now, last_error='Sent without attachment: file not found')
+                    )
+            sent = sent + unattached
+            self.sent += len(sent)
+            self._latencies.extend((now - row.created_at).total_seconds() * 1000.0 for row in sent)
+            current_app.logger.info(f"Sent {len(sent)} queued email(s)")
+        return connection
+
+    def _retry_later(self, row, error: Exception) -> None:
+        if row.attempts >= self.max_attempts:
+            values = {'status': FAILED}
+            self.failed += 1
+            current_app.logger.error(f"Giving up on email {row.id} to {row.recipients} after {row.attempts} attempts: {error}")
+        else:
+            delay = min(self.retry_max, self.retry_base * 2 ** (row.attempts - 1))
+            values = {'status': PENDING, 'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay)}
+            self.retried += 1
+            current_app.logger.warning(f"Email {row.id} failed (attempt {row.attempts}), retrying in {delay:.0f}s: {error}")
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(email_outbox).where(email_outbox.c.id == row.id).values(last_error=str(error), **values)
+            )
+
+    @staticmethod
+    def _close(connection) -> None:
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth by status plus delivery counters and latency (enqueue to sent)"""
+        rows = db.session.execute(
+            select(email_outbox.c.status, func.count())
+            .where(email_outbox.c.status != SENT)
+            .group_by(email_outbox.c.status)
+        ).all()
+        counts = dict(rows)
+        latencies = sorted(self._latencies)
+        return {
+            'pending': counts.get(PENDING, 0),
+            'sending': counts.get(SENDING, 0),
+            'failed': counts.get(FAILED, 0),
+            'sent': self.sent,
+            'retried': self.retried,
+            'gave_up': self.failed,
+            'latency_ms_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+            'latency_ms_p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+        }
+
+
+def init_mail_outbox(app) -> MailOutbox:
+    outbox = MailOutbox(
+        app,
+        workers=app.config.get('MAIL_OUTBOX_WORKERS', 2),
+        batch_size=app.config.get('MAIL_OUTBOX_BATCH', 20),
+        max_attempts=app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 6),
+        retry_base=app.config.get('MAIL_OUTBOX_RETRY_BASE', 10.0),
+        poll_interval=app.config.get('MAIL_OUTBOX_POLL_INTERVAL', 5.0),
+        idle_timeout=app.config.get('MAIL_SMTP_IDLE_TIMEOUT', 30.0)
+    )
+    # Server processes start sending straight away, which also drains mail
+    # left over from before a restart; CLI commands only start on enqueue
+    if click.get_current_context(silent=True) is None:
+        outbox.start()
+    app.extensions['mail_outbox'] = outbox
+    return outbox
+
+
+def get_mail_outbox() -> MailOutbox:
+    """Mail outbox for the current app"""
+    outbox = current_app.extensions.get('mail_outbox')
+    if outbox is None:
+        outbox = init_mail_outbox(current_app._get_current_object())
+    return outbox
@@ -0,0 +1,243 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+import click
+import numpy as np
+from flask import current_app
+
+from services.face_service import FaceService, DEEPFACE_AVAILABLE, DEFAULT_DETECTION
+from services.inference_batcher import EmbeddingBatcher
+from services.encoder_pool import EncoderPool
+from services.liveness import build_liveness_checker
+from services.local_liveness import LocalLivenessProvider
+from services.prefilter import EmbeddingPrefilter
+
+
+class FaceModelRegistry:
+    """Process-wide holder for the Haar cascades and the face embedding model.
+
+    Created once in create_app() so request handlers never reload the cascade
+    XML files or pay for the lazy VGG-Face load on the first call of a worker.
+    """
+
+    FACE_CASCADE = 'haarcascade_frontalface_default.xml'
+    EYE_CASCADE = 'haarcascade_eye.xml'
+
+    def __init__(self, model_name: str = "VGG-Face", warmup: bool = True, single_pass: bool = False,
+                 detection: Optional[dict] = None, preprocess_profile: str = 'nlm'):
+        self.model_name = model_name
+        self.warmup = warmup
+        # 'auto' or one of PREPROCESS_PROFILES
+        self.preprocess_profile = preprocess_profile
+        # Haar detection pyramid / ROI tracking parameters shared by every FaceService
+        self.detection = dict(DEFAULT_DETECTION, **(detection or {}))
+        # Detect faces once in FaceAnalysis and skip DeepFace's own detector.
+        # Changes embeddings slightly, so re-enroll voters before enabling.
+        self.single_pass = single_pass
+        self.model = None
+        self.batcher = None
+        self.encoder_pool = None
+        self.prefilter = None
+        self.liveness = None
+        self.loaded = False
+        self._load_lock = threading.Lock()
+        # CascadeClassifier is not safe to share between threads, so each
+        # detection borrows a (face, eye) pair from this pool and hands it
+        # back. Pairs are only loaded when every pooled one is in use, so the
+        # XML files are parsed once per concurrent detection, not per thread.
+        self._cascade_pool: "queue.LifoQueue" = queue.LifoQueue()
+
+    def load(self) -> None:
+        """Load the cascades and embedding model, optionally running a warm-up inference"""
+        with self._load_lock:
+            if self.loaded:
+                return
+
+            # Touch the cascades on the loading thread so a broken OpenCV
+            # install fails at startup instead of on the first voter
+            with self.cascades():
+                pass
+
+            if DEEPFACE_AVAILABLE:
+                try:
+                    from deepface import DeepFace
+
+                    self.model = DeepFace.build_model(self.model_name)
+                    if self.warmup:
+                        self._warmup()
+                    print(f"Loaded face embedding model: {self.model_name}")
+                except Exception as e:
+                    print(f"Error preloading face embedding model: {e}")
+
+            self.loaded = True
+
+    def _warmup(self) -> None:
+        """Run one inference on a blank frame so the first real request is not slow"""
+        from deepface import DeepFace
+
+        blank = np.zeros((224, 224, 3), dtype=np.uint8)
+        DeepFace.represent(
+            img_path=blank,
+            model_name=self.model_name,
+            enforce_detection=False,
+            detector_backend="skip"
+        )
+
+    @contextmanager
+    def cascades(self):
+        """Borrow a (face, eye) cascade pair for the duration of one detection"""
+        try:
+            pair = self._cascade_pool.get_nowait()
+        except queue.Empty:
+            import cv2
+
+            pair = (
+                cv2.CascadeClassifier(cv2.data.haarcascades + self.FACE_CASCADE),
+                cv2.CascadeClassifier(cv2.data.haarcascades + self.EYE_CASCADE),
+            )
+        try:
+            yield pair
+        finally:
+            self._cascade_pool.put(pair)
+
+    def enable_batching(self, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                        max_queue: int = 64) -> EmbeddingBatcher:
+        """Route embedding requests through a shared micro-batching queue"""
+        self.batcher = EmbeddingBatcher(
+            self.represent_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue=max_queue
+        )
+        self.batcher.start()
+        return self.batcher
+
+    def enable_encoder_pool(self, workers: int = 2, max_pending: int = 16,
+                            job_timeout: float = 20.0, threshold: float = 0.30,
+                            warmup_timeout: float = 600.0) -> EncoderPool:
+        """Run full image encoding in a pool of separate processes, warmed before returning"""
+        self.encoder_pool = EncoderPool(
+            workers=workers,
+            max_pending=max_pending,
+            job_timeout=job_timeout,
+            warmup_timeout=warmup_timeout,
+            model_name=self.model_name,
+            threshold=threshold,
+            single_pass=self.single_pass,
+            detection=self.detection,
+            preprocess_profile=self.preprocess_profile
+        )
+        self.encoder_pool.start()
+        return self.encoder_pool
+
+    def represent_batch(self, images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """Embed several preprocessed images with one forward pass"""
+        if not DEEPFACE_AVAILABLE:
+            return [None] * len(images)
+        from deepface import DeepFace
+
+        try:
+            # Recent DeepFace releases accept a list of images and return one
+            # list of face results per input image
+            batch_objs = DeepFace.represent(
+                img_path=images,
+                model_name=self.model_name,
+                enforce_detection=False,
+                detector_backend="skip" if self.single_pass else "opencv",
+                align=not self.single_pass
+            )
+            if len(batch_objs) == len(images) and all(isinstance(objs, list) for objs in batch_objs):
+                return [self._first_embedding(objs) for objs in batch_objs]
+        except Exception as e:
+            print(f"Batched represent unavailable, falling back to per-image calls: {e}")
+
+        results = []
+        for image in images:
+            try:
+                results.append(self._first_embedding(DeepFace.represent(
+                    img_path=image,
+                    model_name=self.model_name,
+                    enforce_detection=False,
+                    detector_backend="skip" if self.single_pass else "opencv",
+                    align=not self.single_pass
+                )))
+            except Exception as e:
+                print(f"DeepFace encoding error: {e}")
+                results.append(None)
+        return results
+
+    @staticmethod
+    def _first_embedding(embedding_objs) -> Optional[np.ndarray]:
+        if embedding_objs and len(embedding_objs) > 0:
+            return np.array(embedding_objs[0]["embedding"])
+        return None
+
+    def face_service(self, threshold: float) -> FaceService:
+        """Return a FaceService bound to the shared models with the given threshold"""
+        if not self.loaded:
+            self.load()
+        return FaceService(threshold=threshold, registry=self)
+
+
+def init_face_models(app) -> FaceModelRegistry:
+    """Create the shared registry for an app and preload it if configured"""
+    registry = FaceModelRegistry(
+        model_name=app.config.get('FACE_MODEL_NAME', 'VGG-Face'),
+        warmup=app.config.get('FACE_MODEL_WARMUP', True),
+        single_pass=app.config.get('FACE_SINGLE_PASS', False),
+        detection={
+            'max_width': app.config.get('FACE_DETECT_MAX_WIDTH', 0),
+            'scale_factor': app.config.get('FACE_DETECT_SCALE_FACTOR', 1.1),
+            'min_neighbors': app.config.get('FACE_DETECT_MIN_NEIGHBORS', 5),
+            'min_size': app.config.get('FACE_DETECT_MIN_SIZE', 30),
+            'roi_expand': app.config.get('FACE_DETECT_ROI_EXPAND', 0.5),
+        },
+        preprocess_profile=app.config.get('FACE_PREPROCESS_PROFILE', 'nlm')
+    )
+    registry.liveness = build_liveness_checker(app.config)
+    # On-box detector when selected explicitly, or as the fallback when no remote vendor is configured
+    provider = app.config.get('LIVENESS_PROVIDER', 'auto')
+    if provider == 'local' or (registry.liveness.provider is None and app.config.get('LIVENESS_LOCAL_FALLBACK', False)):
+        registry.liveness.provider = LocalLivenessProvider(
+            lambda: registry.face_service(app.config.get('FACE_THRESHOLD', 0.30)),
+            threshold=app.config.get('LIVENESS_LOCAL_THRESHOLD', 0.5)
+        )
+    preload = app.config.get('FACE_MODEL_PRELOAD', 'auto')
+    if preload == 'auto':
+        # Server processes preload; flask CLI commands (db upgrade, reconcile-tally,
+        # the dev server) load the model on first use instead
+        preload = click.get_current_context(silent=True) is None
+    if preload:
+        registry.load()
+    if app.config.get('FACE_PREFILTER_ENABLED', False):
+        registry.prefilter = EmbeddingPrefilter(
+            ttl=app.config.get('FACE_PREFILTER_TTL', 60.0)
+        )
+    if app.config.get('FACE_BATCH_ENABLED', False):
+        registry.enable_batching(
+            max_batch_size=app.config.get('FACE_BATCH_MAX_SIZE', 8),
+            max_wait_ms=app.config.get('FACE_BATCH_WAIT_MS', 10.0),
+            max_queue=app.config.get('FACE_BATCH_QUEUE_DEPTH', 64)
+        )
+    if app.config.get('FACE_ENCODER_WORKERS', 0) > 0:
+        registry.enable_encoder_pool(
+            workers=app.config['FACE_ENCODER_WORKERS'],
+            max_pending=app.config.get('FACE_ENCODER_MAX_PENDING', 16),
+            job_timeout=app.config.get('FACE_ENCODER_TIMEOUT', 20.0),
+            warmup_timeout=app.config.get('FACE_ENCODER_WARMUP_TIMEOUT', 600.0),
+            threshold=app.config.get('FACE_THRESHOLD', 0.30)
+        )
+    app.extensions['face_models'] = registry
+    return registry
+
+
+def get_face_service(threshold: Optional[float] = None) -> FaceService:
+    """Per-request handle on the shared face models for the current app"""
+    if threshold is None:
+        threshold = current_app.config.get('FACE_THRESHOLD', 0.30)
+    registry = current_app.extensions.get('face_models')
+    if registry is None:
+        registry = init_face_models(current_app._get_current_object())
+    return registry.face_service(threshold)
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class EmbeddingPrefilter:
+    """Reuses a CNN embedding when the exact same frame is submitted again.
+
+    Entries are keyed on the SHA-256 of the uploaded bytes, so a client retry
+    of an identical upload skips the CNN pass. Nothing looser than the exact
+    image is ever matched: a similar-looking frame may show a different
+    person, and its embedding must be computed. Entries are bounded and
+    expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, image_hash: str) -> Optional[np.ndarray]:
+        """Stored embedding of the frame with this content hash"""
+        with self._lock:
+            entry = self._entries.get(image_hash)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[image_hash]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(image_hash)
+            self.hits += 1
+            return entry[0]
+
+    def store(self, image_hash: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._entries[image_hash] = (embedding, time.monotonic() + self.ttl)
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, image_hash: str) -> None:
+        with self._lock:
+            self._entries.pop(image_hash, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from flask import current_app
+
+
+class ResultsPublisher:
+    """One tally poller per process, fanned out to every /results/stream client.
+
+    While at least one client is connected, a background thread reads the
+    tally counters at most once per ``interval`` seconds. When they change
+    it serialises a single JSON snapshot and wakes every client, which only
+    copies that string onto its connection. Database load is one counter
+    read per interval however many viewers are watching; with no viewers
+    the poller sleeps.
+
+    Each client still holds a server worker for as long as it is connected,
+    so large audiences need a gevent/eventlet or threaded server.
+    """
+
+    def __init__(self, app, interval: float = 2.0, keepalive: float = 15.0):
+        self.app = app
+        self.interval = max(0.1, interval)
+        self.keepalive = keepalive
+        self._cond = threading.Condition()
+        self._active = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = None
+        self._version = 0
+        self._event_id = None
+        self._payload = None
+        self.subscribers = 0
+        self.polls = 0
+        self.published = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='results-publisher', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._active.wait()
+            started = time.monotonic()
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Error polling vote tally: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _poll(self) -> None:
+        from models import db
+        from services.tally import read_tally
+
+        with self.app.app_context():
+            try:
+                tally = read_tally()
+            finally:
+                db.session.remove()
+        self.polls += 1
+        if tally.counters == self._counters:
+            return
+
+        payload = json.dumps({
+            'total_votes': tally.total_votes,
+            'total_voters': tally.total_voters,
+            'nota_votes': tally.nota_votes,
+            'turnout_percentage': round(tally.turnout_percentage, 2),
+            'results': [row._asdict() for row in tally.results],
+            'updated': datetime.now().strftime('%B %d, %Y at %I:%M:%S %p'),
+        })
+        # Derived from the counters rather than a local sequence number so a
+        # reconnect served by another worker process still skips an unchanged snapshot
+        event_id = format(zlib.crc32(json.dumps(sorted(tally.counters.items())).encode()), '08x')
+        with self._cond:
+            self._counters = tally.counters
+            self._payload = payload
+            self._event_id = event_id
+            self._version += 1
+            self.published += 1
+            self._cond.notify_all()
+
+    def _subscribe(self) -> None:
+        with self._cond:
+            self.subscribers += 1
+            self._active.set()
+        self.start()
+
+    def _unsubscribe(self) -> None:
+        with self._cond:
+            self.subscribers -= 1
+            if self.subscribers <= 0:
+                self.subscribers = 0
+                self._active.clear()
+
+    def events(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """SSE frames for one client: a ``tally`` event per change, comments as keepalives
+
+        Args:
+            last_event_id: Last-Event-ID sent by a reconnecting browser; the
+                current snapshot is skipped if the client already has it
+        """
+        self._subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            seen = 0
+            while True:
+                deadline = time.monotonic() + self.keepalive
+                with self._cond:
+                    while self._version == seen:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    version, event_id, payload = self._version, self._event_id, self._payload
+
+                if version == seen:
+                    yield ": keepalive\n\n"
+                    continue
+                seen = version
+                if event_id == last_event_id:
+                    continue
+                last_event_id = event_id
+                yield f"id: {event_id}\nevent: tally\ndata: {payload}\n\n"
+        finally:
+            # Runs when the server closes the generator after the client disconnects
+            self._unsubscribe()
+
+    def stats(self) -> dict:
+        return {
+            'subscribers': self.subscribers,
+            'polls': self.polls,
+            'published': self.published,
+        }
+
+
+def init_results_publisher(app) -> ResultsPublisher:
+    publisher = ResultsPublisher(
+        app,
+        interval=app.config.get('RESULTS_STREAM_INTERVAL', 2.0),
+        keepalive=app.config.get('RESULTS_STREAM_KEEPALIVE', 15.0)
+    )
+    app.extensions['results_publisher'] = publisher
+    return publisher
+
+
+def get_results_publisher() -> ResultsPublisher:
+    """Results publisher for the current app"""
+    publisher = current_app.extensions.get('results_publisher')
+    if publisher is None:
+        publisher = init_results_publisher(current_app._get_current_object())
+    return publisher
@@ -0,0 +1,214 @@
+import atexit
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+
+class SnapshotHandle:
+    """Final path of a queued snapshot plus a future that resolves once it is durable"""
+
+    __slots__ = ('path', 'future')
+
+    def __init__(self, path: str, future: Future):
+        self.path = path
+        self.future = future
+
+    def result(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Wait for the write; returns the path, or None if it failed or timed out"""
+        try:
+            return self.future.result(timeout=timeout)
+        except Exception:
+            return None
+
+
+class _Write:
+    __slots__ = ('path', 'data', 'future')
+
+    def __init__(self, path: str, data: bytes, future: Future):
+        self.path = path
+        self.data = data
+        self.future = future
+
+
+class SnapshotWriter:
+    """Background writer for auth, fraud and enrollment snapshots.
+
+    Files are content-addressed: ``<root>/<category>/<h[:2]>/<h[2:4]>/<h>.jpg``
+    where ``h`` is the SHA-256 of the JPEG bytes. The path is known as soon as
+    the frame is hashed, so it is recorded on the AuthEvent straight away
+    while the bytes are written off the request thread. Identical frames
+    (retries, double submits) map to one file and are written once.
+
+    The writer thread drains up to ``batch_size`` jobs (or waits
+    ``flush_ms``), writes each to a temporary file, fsyncs the batch,
+    renames the files into place and then fsyncs the touched directories.
+    When the queue is full the snapshot is written inline rather than lost.
+    """
+
+    def __init__(self, root: str, batch_size: int = 32, flush_ms: float = 50.0, max_queue: int = 1024):
+        self.root = root
+        self.batch_size = max(1, batch_size)
+        self.flush_wait = flush_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending: Dict[str, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.deduplicated = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+                self._thread.start()
+
+    def path_for(self, category: str, sha256: str) -> str:
+        """Sharded, content-addressed path of a snapshot"""
+        return os.path.join(self.root, category, sha256[:2], sha256[2:4], f"{sha256}.jpg")
+
+    def submit(self, data: bytes, category: str, sha256: Optional[str] = None) -> SnapshotHandle:
+        """Queue a snapshot for writing and return its final path immediately
+
+        Args:
+            data: Encoded JPEG bytes
+            category: Subdirectory of the upload folder, e.g. 'faces' or 'fraud_attempts'
+            sha256: Content hash when the caller already has it (FaceImage.sha256)
+        """
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        path = self.path_for(category, sha256)
+
+        with self._pending_lock:
+            future = self._pending.get(path)
+            if future is not None:
+                self.deduplicated += 1
+                return SnapshotHandle(path, future)
+            future = Future()
+            if os.path.exists(path):
+                self.deduplicated += 1
+                future.set_result(path)
+                return SnapshotHandle(path, future)
+            self._pending[path] = future
+
+        self.start()
+        try:
+            self._queue.put_nowait(_Write(path, data, future))
+        except queue.Full:
+            print("Snapshot queue full, writing inline")
+            self._flush([_Write(path, data, future)])
+        return SnapshotHandle(path, future)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queued': self.queue_depth(),
+            'written': self.written,
+            'deduplicated': self.deduplicated,
+        }
+
+    def drain(self, timeout: float = 5.0) -> None:
+        """Wait until every queued snapshot has been written"""
+        with self._pending_lock:
+            futures = list(self._pending.values())
+        deadline = time.monotonic() + timeout
+        for future in futures:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass
+
+    def _collect(self) -> List[_Write]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.flush_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            self._flush(self._collect())
+
+    def _flush(self, batch: List[_Write]) -> None:
+        written, directories = [], set()
+        for job in batch:
+            tmp_path = f"{job.path}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(job.path), exist_ok=True)
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    os.write(fd, job.data)
+                except Exception:
+                    os.close(fd)
+                    raise
+                written.append((job, tmp_path, fd))
+            except Exception as e:
+                print(f"Error saving snapshot {job.path}: {e}")
+                self._finish(job, error=e)
+
+        # One fsync pass for the whole batch, then atomic renames
+        for job, tmp_path, fd in written:
+            try:
+                os.fsync(fd)
+                os.close(fd)
+                os.replace(tmp_path, job.path)
+                directories.add(os.path.dirname(job.path))
+                self.written += 1
+                self._finish(job)
+            except Exception as e:
+                print(f"Error saving snapshot {job.path}: {e}")
+                self._finish(job, error=e)
+
+        for directory in directories:
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError:
+                # Directory fsync is not supported on every platform
+                pass
+
+    def _finish(self, job: _Write, error: Optional[Exception] = None) -> None:
+        with self._pending_lock:
+            self._pending.pop(job.path, None)
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(job.path)
+
+
+def init_snapshot_writer(app) -> SnapshotWriter:
+    writer = SnapshotWriter(
+        app.config['UPLOAD_FOLDER'],
+        batch_size=app.config.get('SNAPSHOT_FSYNC_BATCH', 32),
+        flush_ms=app.config.get('SNAPSHOT_FLUSH_MS', 50.0),
+        max_queue=app.config.get('SNAPSHOT_QUEUE_DEPTH', 1024)
+    )
+    writer.start()
+    # Flush queued evidence on a clean shutdown
+    atexit.register(writer.drain)
+    app.extensions['snapshot_writer'] = writer
+    return writer
+
+
+def get_snapshot_writer() -> SnapshotWriter:
+    """Snapshot writer for the current app"""
+    writer = current_app.extensions.get('snapshot_writer')
+    if writer is None:
+        writer = init_snapshot_writer(current_app._get_current_object())
+    return writer
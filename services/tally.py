@@ -0,0 +1,170 @@
+import random
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+import click
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db
+
+# Counter names: one per candidate, plus NOTA, votes cast and registered voters
+TOTAL = 'total'
+NOTA = 'nota'
+VOTERS = 'voters'
+# Bumped by every vote, rollback and reconcile fix; never reset, so cached
+# exports keyed on it cannot be confused with an earlier election state
+VERSION = 'version'
+DEFAULT_SHARDS = 16
+
+# Sharded counters: each vote bumps one random shard row of its counters, so
+# concurrent votes for the same candidate rarely wait on the same row lock.
+# Readers sum the shards.
+vote_tally = db.Table(
+    'vote_tally',
+    db.Column('counter', db.String(32), primary_key=True),
+    db.Column('shard', db.SmallInteger, primary_key=True),
+    db.Column('count', db.BigInteger, nullable=False, server_default='0'),
+)
+
+TallyRow = namedtuple('TallyRow', ['candidate_id', 'candidate_name', 'party_name', 'vote_count'])
+
+
+class Tally:
+    """Snapshot of the vote counters, shaped for the results views"""
+
+    def __init__(self, counters: Dict[str, int], candidate_names: Dict[int, tuple]):
+        self.counters = counters
+        self.nota_votes = counters.get(NOTA, 0)
+        self.total_votes = counters.get(TOTAL, 0)
+        self.total_voters = counters.get(VOTERS, 0)
+        self.version = counters.get(VERSION, 0)
+        self.turnout_percentage = (self.total_votes / self.total_voters * 100) if self.total_voters > 0 else 0
+
+        results = []
+        for candidate_id, (candidate_name, party_name) in candidate_names.items():
+            count = counters.get(candidate_counter(candidate_id), 0)
+            if count > 0:
+                results.append(TallyRow(candidate_id, candidate_name, party_name, count))
+        results.sort(key=lambda row: row.vote_count, reverse=True)
+        self.results: List[TallyRow] = results
+
+
+def candidate_counter(candidate_id: int) -> str:
+    return f"c:{candidate_id}"
+
+
+def increment(counters: Dict[str, int], shards: int = DEFAULT_SHARDS) -> None:
+    """Add to counters inside the caller's transaction with one upsert
+
+    Rows are written in sorted counter order so concurrent transactions
+    always take the row locks in the same order and cannot deadlock.
+    """
+    shard = random.randrange(max(1, shards))
+    rows = [{'counter': name, 'shard': shard, 'count': delta} for name, delta in sorted(counters.items())]
+    stmt = pg_insert(vote_tally).values(rows)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[vote_tally.c.counter, vote_tally.c.shard],
+        set_={'count': vote_tally.c.count + stmt.excluded['count']}
+    ))
+
+
+def record_vote_counters(candidate_id: Optional[int], nota: bool, shards: int = DEFAULT_SHARDS) -> None:
+    """Counters bumped by one vote"""
+    choice = NOTA if nota or candidate_id is None else candidate_counter(candidate_id)
+    increment({choice: 1, TOTAL: 1, VERSION: 1}, shards)
+
+
+def delete_voter_counters(votes: List[tuple], shards: int = DEFAULT_SHARDS) -> None:
+    """Counters dropped with a deleted voter and their (candidate_id, nota) votes
+
+    Must run in the transaction that deletes the voter, after the voter row
+    is locked, so a vote cast concurrently is either counted here or refused.
+    """
+    counters = {VOTERS: -1}
+    for candidate_id, nota in votes:
+        choice = NOTA if nota or candidate_id is None else candidate_counter(candidate_id)
+        counters[choice] = counters.get(choice, 0) - 1
+        counters[TOTAL] = counters.get(TOTAL, 0) - 1
+    if votes:
+        counters[VERSION] = 1
+    increment(counters, shards)
+
+
+def reset_vote_counters() -> None:
+    """Zero every vote counter (keeps the voter count), inside the caller's transaction"""
+    db.session.execute(vote_tally.delete().where(vote_tally.c.counter.notin_([VOTERS, VERSION])))
+    increment({VERSION: 1})
+
+
+def read_counters() -> Dict[str, int]:
+    rows = db.session.execute(
+        select(vote_tally.c.counter, func.sum(vote_tally.c.count)).group_by(vote_tally.c.counter)
+    ).all()
+    return {counter: int(total) for counter, total in rows}
+
+
+def read_tally() -> Tally:
+    """Current results from the counter table, with names from the ballot cache"""
+    from services.ballot_cache import get_ballot_cache
+
+    return Tally(read_counters(), get_ballot_cache().candidates())
+
+
+def raw_counters() -> Dict[str, int]:
+    """Counters recomputed from the Vote and Voter tables"""
+    from models import Vote, Voter
+
+    counters = {}
+    for candidate_id, count in db.session.query(Vote.candidate_id, func.count(Vote.id)).group_by(Vote.candidate_id):
+        counters[NOTA if candidate_id is None else candidate_counter(candidate_id)] = count
+    counters[TOTAL] = sum(counters.values())
+    counters[VOTERS] = db.session.query(func.count(Voter.id)).scalar()
+    return {name: count for name, count in counters.items() if count}
+
+
+def reconcile(fix: bool = False) -> Dict[str, tuple]:
+    """Compare the counters with raw votes; returns {counter: (tally, raw)} for every mismatch
+
+    With ``fix`` the table is locked against concurrent votes, recomputed
+    and rewritten as one row per counter.
+    """
+    try:
+        if fix:
+            # Waits for in-flight votes to commit and holds new ones until we are done
+            db.session.execute(text("LOCK TABLE vote_tally IN EXCLUSIVE MODE"))
+        else:
+            # One snapshot for both reads so votes committed in between do not show as drift
+            db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        tally, raw = read_counters(), raw_counters()
+        mismatches = {
+            name: (tally.get(name, 0), raw.get(name, 0))
+            for name in (set(tally) | set(raw)) - {VERSION}
+            if tally.get(name, 0) != raw.get(name, 0)
+        }
+        if fix and mismatches:
+            db.session.execute(vote_tally.delete().where(vote_tally.c.counter != VERSION))
+            increment({VERSION: 1})
+            if raw:
+                db.session.execute(vote_tally.insert(), [
+                    {'counter': name, 'shard': 0, 'count': count} for name, count in raw.items()
+                ])
+        db.session.commit()
+        return mismatches
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def register_tally(app) -> None:
+    @app.cli.command('reconcile-tally')
+    @click.option('--fix', is_flag=True, help='Rewrite the counters from raw votes when they disagree')
+    def reconcile_tally_command(fix):
+        """Verify the vote tally counters against the raw votes"""
+        mismatches = reconcile(fix=fix)
+        if not mismatches:
+            print("Vote tally matches raw votes")
+            return
+        for name, (tally_count, raw_count) in sorted(mismatches.items()):
+            print(f"{name}: tally {tally_count}, raw {raw_count}")
+        print("Counters rewritten from raw votes" if fix else "Run with --fix to rewrite the counters")
@@ -0,0 +1,109 @@
+"""
+Template matching on face embeddings.
+
+Only needs NumPy, so the web tier of a split deployment can match a
+returned embedding against cached templates without loading OpenCV or
+DeepFace. FaceService exposes the same functions as methods.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_encoding(encoding: np.ndarray) -> np.ndarray:
+    """L2-normalize a single encoding as float32"""
+    vector = np.asarray(encoding, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def build_template_matrix(known_encodings: List[np.ndarray], dims: Optional[int] = None) -> np.ndarray:
+    """Stack a voter's encodings into one row-normalized float32 matrix
+
+    Encodings whose dimension differs from ``dims`` (or from the first
+    encoding when ``dims`` is None) are skipped.
+    """
+    vectors = [np.asarray(e, dtype=np.float32).ravel() for e in known_encodings if e is not None]
+    if dims is None and vectors:
+        dims = vectors[0].shape[0]
+    kept = [v for v in vectors if v.shape[0] == dims]
+    if len(kept) != len(vectors):
+        print(f"WARNING: Skipped {len(vectors) - len(kept)} encoding(s) with dimension mismatch (expected {dims})")
+    if not kept:
+        return np.empty((0, dims or 0), dtype=np.float32)
+
+    matrix = np.vstack(kept)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def match_templates(templates: np.ndarray, test_normalized: np.ndarray,
+                    fusion: str = 'min', top_k: int = 3) -> Tuple[int, float, float]:
+    """Score a pre-normalized test vector against a pre-normalized template matrix
+
+    All cosine distances are taken with a single matrix-vector product.
+
+    Args:
+        templates: (n, d) row-normalized template matrix
+        test_normalized: (d,) normalized test encoding
+        fusion: How to combine per-template distances - 'min', 'mean' or 'topk'
+        top_k: Number of closest templates averaged when fusion is 'topk'
+
+    Returns:
+        (best template index, best distance, fused distance)
+    """
+    if templates.shape[0] == 0 or templates.shape[1] != test_normalized.shape[0]:
+        return -1, 1.0, 1.0
+
+    # Cosine similarity ranges from -1 to 1, converted to a 0-1 distance
+    distances = (1.0 - templates @ test_normalized) / 2.0
+    best_idx = int(np.argmin(distances))
+    best_distance = float(distances[best_idx])
+
+    if fusion == 'mean':
+        fused = float(np.mean(distances))
+    elif fusion == 'topk':
+        k = min(max(1, top_k), distances.shape[0])
+        fused = float(np.mean(np.partition(distances, k - 1)[:k]))
+    else:
+        fused = best_distance
+
+    return best_idx, best_distance, fused
+
+
+def verify_templates(known_encodings, test_encoding: np.ndarray, threshold: float, fusion: str = 'min',
+                     top_k: int = 3, test_normalized: bool = False) -> Tuple[bool, float]:
+    """Verify if test encoding matches any known encodings
+
+    Args:
+        known_encodings: List of encodings, or a template matrix already built
+                         with build_template_matrix
+        test_encoding: Encoding of the captured face
+        threshold: Fused distance below which the face is a match
+        fusion: Score fusion across templates - 'min', 'mean' or 'topk'
+        top_k: Templates averaged for 'topk' fusion
+        test_normalized: Set when test_encoding is already L2-normalized
+    """
+    if known_encodings is None or len(known_encodings) == 0 or test_encoding is None:
+        print("Verification failed: No known encodings or test encoding is None")
+        return False, 1.0
+
+    test_vector = (np.asarray(test_encoding, dtype=np.float32).ravel() if test_normalized
+                   else normalize_encoding(test_encoding))
+
+    if isinstance(known_encodings, np.ndarray) and known_encodings.ndim == 2:
+        templates = known_encodings
+    else:
+        templates = build_template_matrix(known_encodings, dims=test_vector.shape[0])
+
+    best_match_idx, best_distance, distance = match_templates(templates, test_vector, fusion, top_k)
+
+    # Use threshold for matching (distance < threshold means MATCH)
+    is_match = distance < threshold
+
+    print(f"Verification result: {'MATCH' if is_match else 'NO MATCH'} "
+          f"(distance {distance:.4f} [{fusion}], best {best_distance:.4f} at index {best_match_idx}, "
+          f"threshold {threshold:.4f}, {templates.shape[0]} template(s))")
+
+    return is_match, float(distance)
@@ -0,0 +1,240 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Tuple
+
+import click
+import numpy as np
+from flask import current_app
+
+from services.encoding_codec import unpack_encoding
+
+
+class TemplateStore:
+    """Memory-mapped matrix of pre-normalized face templates for a voter roll.
+
+    Built before polls open by streaming VoterFace rows through a server-side
+    cursor. All rows of one voter are contiguous, and a sorted voter primary
+    key array maps each voter to its (start, count) slice. The matrix is
+    opened read-only with mmap so every worker process on the box shares the
+    same page cache instead of loading templates from Postgres.
+
+    Each voter's slice is stamped with the face count and highest VoterFace
+    id at build time. Callers pass the voter's current stamp, and a voter
+    enrolled or re-enrolled since the build falls back to the database.
+    """
+
+    MATRIX_FILE = 'templates.npy'
+    INDEX_FILE = 'index.npz'
+    MANIFEST_FILE = 'manifest.json'
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.matrix = None
+        self.voter_pks = np.empty(0, dtype=np.int64)
+        self.starts = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.max_face_ids = np.empty(0, dtype=np.int64)
+        # Voters whose enrollment changed in this process since the store was loaded
+        self._stale = set()
+        self.manifest = {}
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.voter_pks.shape[0]
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, self.MANIFEST_FILE)
+
+    def _maybe_reload(self) -> None:
+        """Pick up a store rebuilt by another process, checking at most every reload_interval"""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self._manifest_path())
+        except OSError:
+            return
+        # The manifest is replaced, not rewritten, so its inode changes with every build
+        if (stat.st_ino, stat.st_mtime_ns) != self._loaded_mtime:
+            self.load()
+
+    def load(self) -> bool:
+        """Open the store from disk; returns False when no store has been built"""
+        manifest_path = self._manifest_path()
+        if not os.path.exists(manifest_path):
+            return False
+        with self._lock:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            # An empty store cannot be memory-mapped
+            matrix = (np.load(os.path.join(self.path, manifest['matrix']), mmap_mode='r')
+                      if manifest.get('rows') else None)
+            with np.load(os.path.join(self.path, manifest['index'])) as index:
+                voter_pks, starts, counts = index['voter_pks'], index['starts'], index['counts']
+                # Stores built before stamps were recorded cannot be validated, so they match nothing
+                max_face_ids = index['max_face_ids'] if 'max_face_ids' in index.files else np.full_like(counts, -1)
+            self.matrix, self.voter_pks, self.starts, self.counts = matrix, voter_pks, starts, counts
+            self.max_face_ids = max_face_ids
+            self.manifest = manifest
+            self._stale = set()
+            stat = os.stat(manifest_path)
+            self._loaded_mtime = (stat.st_ino, stat.st_mtime_ns)
+        return True
+
+    def get(self, voter_pk: int, stamp: Optional[Callable[[], Tuple[int, int]]] = None) -> Optional[np.ndarray]:
+        """Template matrix view for a voter, or None when the voter is not prewarmed
+
+        Args:
+            voter_pk: Voter.id
+            stamp: Returns the voter's current (face count, highest VoterFace id);
+                   only called for prewarmed voters, whose slice is returned
+                   when it was built from the same faces
+        """
+        self._maybe_reload()
+        voter_pks, starts, counts, max_face_ids, matrix = (self.voter_pks, self.starts, self.counts,
+                                                           self.max_face_ids, self.matrix)
+        if matrix is None or voter_pk in self._stale:
+            return None
+        pos = int(np.searchsorted(voter_pks, voter_pk))
+        if pos >= voter_pks.shape[0] or voter_pks[pos] != voter_pk:
+            return None
+        if stamp is not None and (int(counts[pos]), int(max_face_ids[pos])) != tuple(stamp()):
+            return None
+        start = int(starts[pos])
+        return matrix[start:start + int(counts[pos])]
+
+    def invalidate(self, voter_pk: int) -> None:
+        """Stop serving a voter's prewarmed templates in this process, e.g. after enrollment"""
+        self._stale.add(voter_pk)
+
+    def build(self, start_id: Optional[int] = None, end_id: Optional[int] = None,
+              constituency: Optional[str] = None, chunk_size: int = 2000) -> int:
+        """Stream enrolled encodings into a new store and swap it in
+
+        Args:
+            start_id, end_id: Inclusive Voter.id range to preload
+            constituency: Only preload voters of this constituency (requires a
+                          ``constituency`` column on Voter)
+            chunk_size: Rows fetched per round-trip from the server-side cursor
+
+        Returns:
+            Number of face templates written
+        """
+        from models import Voter, VoterFace
+
+        query = VoterFace.query
+        if start_id is not None:
+            query = query.filter(VoterFace.voter_id >= start_id)
+        if end_id is not None:
+            query = query.filter(VoterFace.voter_id <= end_id)
+        if constituency is not None:
+            if not hasattr(Voter, 'constituency'):
+                raise ValueError("Voter model has no constituency column")
+            query = query.join(Voter, VoterFace.voter_id == Voter.id).filter(Voter.constituency == constituency)
+
+        total = query.count()
+        os.makedirs(self.path, exist_ok=True)
+        built_at = time.strftime('%Y%m%d%H%M%S')
+        # Unique per build: two builds in the same second must never overwrite a mapped file
+        generation = f"{built_at}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        matrix_name = f"{generation}_{self.MATRIX_FILE}"
+        index_name = f"{generation}_{self.INDEX_FILE}"
+
+        matrix = None
+        voter_pks, starts, counts, max_face_ids = [], [], [], []
+        row = 0
+        # yield_per streams rows through a server-side cursor in chunks
+        ordered = query.order_by(VoterFace.voter_id, VoterFace.id).yield_per(chunk_size)
+        for face in ordered:
+            encoding = np.asarray(unpack_encoding(face.encoding), dtype=np.float32).ravel()
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    os.path.join(self.path, matrix_name), mode='w+',
+                    dtype=np.float32, shape=(max(total, 1), encoding.shape[0])
+                )
+            if encoding.shape[0] != matrix.shape[1] or row >= matrix.shape[0]:
+                print(f"WARNING: Skipping face {face.id} while prewarming templates")
+                continue
+
+            norm = np.linalg.norm(encoding)
+            matrix[row] = encoding / norm if norm > 0 else encoding
+            if voter_pks and voter_pks[-1] == face.voter_id:
+                counts[-1] += 1
+                max_face_ids[-1] = face.id
+            else:
+                voter_pks.append(face.voter_id)
+                starts.append(row)
+                counts.append(1)
+                max_face_ids.append(face.id)
+            row += 1
+
+        if matrix is None:
+            np.save(os.path.join(self.path, matrix_name), np.empty((0, 0), dtype=np.float32))
+        else:
+            matrix.flush()
+            del matrix
+
+        np.savez(
+            os.path.join(self.path, index_name),
+            voter_pks=np.asarray(voter_pks, dtype=np.int64),
+            starts=np.asarray(starts, dtype=np.int64),
+            counts=np.asarray(counts, dtype=np.int64),
+            max_face_ids=np.asarray(max_face_ids, dtype=np.int64)
+        )
+
+        previous = dict(self.manifest)
+        manifest = {
+            'matrix': matrix_name,
+            'index': index_name,
+            'rows': row,
+            'voters': len(voter_pks),
+            'start_id': start_id,
+            'end_id': end_id,
+            'constituency': constituency,
+            'built_at': built_at,
+        }
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+        self.load()
+
+        # Older generations stay mapped in other workers until they reload;
+        # unlinking is safe on POSIX since open mappings keep the data alive
+        for key in ('matrix', 'index'):
+            old = previous.get(key)
+            if old and old != manifest[key]:
+                try:
+                    os.remove(os.path.join(self.path, old))
+                except OSError:
+                    pass
+
+        return row
+
+
+def init_template_store(app) -> TemplateStore:
+    store = TemplateStore(app.config.get('TEMPLATE_STORE_PATH', os.path.join('instance', 'template_store')))
+    store.load()
+    app.extensions['template_store'] = store
+
+    @app.cli.command('prewarm-templates')
+    @click.option('--start-id', type=int, default=None, help='First Voter.id to preload')
+    @click.option('--end-id', type=int, default=None, help='Last Voter.id to preload')
+    @click.option('--constituency', default=None, help='Only preload voters of this constituency')
+    def prewarm_templates_command(start_id, end_id, constituency):
+        """Preload enrolled face templates into the shared memory-mapped store"""
+        rows = store.build(start_id=start_id, end_id=end_id, constituency=constituency)
+        print(f"Prewarmed {rows} face template(s) for {len(store)} voter(s)")
+
+    return store
+
+
+def get_template_store() -> Optional[TemplateStore]:
+    return current_app.extensions.get('template_store')
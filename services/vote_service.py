@@ -0,0 +1,45 @@
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import insert, update
+
+from services.tally import DEFAULT_SHARDS, record_vote_counters
+
+
+def record_vote(voter_pk: int, candidate_id: Optional[int], nota: bool, audit_ref: str):
+    """Flip has_voted, insert the vote and bump the tally counters in one transaction
+
+    The conditional ``UPDATE ... WHERE has_voted IS NOT true RETURNING`` is the
+    only check, so concurrent double-submits cannot both pass it: the second
+    one matches no row once the first has committed.
+
+    Returns:
+        Row of (voter_id, name, email) for the voter, or None when the voter
+        does not exist or has already voted
+    """
+    from models import db, Voter, Vote
+
+    try:
+        voter = db.session.execute(
+            update(Voter)
+            .where(Voter.id == voter_pk, Voter.has_voted.isnot(True))
+            .values(has_voted=True)
+            .returning(Voter.voter_id, Voter.name, Voter.email)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if voter is None:
+            db.session.rollback()
+            return None
+
+        db.session.execute(insert(Vote).values(
+            voter_id=voter_pk,
+            candidate_id=candidate_id,
+            nota=nota,
+            audit_ref=audit_ref
+        ))
+        record_vote_counters(candidate_id, nota, current_app.config.get('TALLY_SHARDS', DEFAULT_SHARDS))
+        db.session.commit()
+        return voter
+    except Exception:
+        db.session.rollback()
+        raise
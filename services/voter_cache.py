@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+
+from services.encoding_codec import unpack_encoding
+from services.template_matching import build_template_matrix
+
+
+class CachedVoter:
+    """Snapshot of the voter fields the verify path needs, plus a template matrix"""
+
+    __slots__ = ('id', 'voter_id', 'name', 'email', 'has_voted', 'templates', 'expires_at', 'stamp')
+
+    def __init__(self, id: int, voter_id: str, name: str, email: str, has_voted: bool,
+                 templates: np.ndarray, expires_at: float, stamp: Optional[tuple] = None):
+        self.id = id
+        self.voter_id = voter_id
+        self.name = name
+        self.email = email
+        self.has_voted = has_voted
+        self.templates = templates
+        self.expires_at = expires_at
+        # voter_stamp() at load time; the entry is stale once the database disagrees
+        self.stamp = stamp
+
+
+def face_stamp(voter_pk: int) -> Tuple[int, int]:
+    """(face count, highest VoterFace id) of a voter, as recorded by the template store"""
+    from models import db, VoterFace
+
+    count, max_id = db.session.query(func.count(VoterFace.id), func.max(VoterFace.id)).filter(
+        VoterFace.voter_id == voter_pk).one()
+    return int(count), int(max_id) if max_id is not None else -1
+
+
+def voter_stamp(voter_id: str) -> Optional[tuple]:
+    """(primary key, has_voted, face count, highest VoterFace id) of a voter, or None if it is gone
+
+    A single aggregate query that loads no encodings, cheap enough to run on
+    every cache hit.
+    """
+    from models import db, Voter, VoterFace
+
+    row = db.session.query(Voter.id, Voter.has_voted, func.count(VoterFace.id), func.max(VoterFace.id)).outerjoin(
+        VoterFace, VoterFace.voter_id == Voter.id).filter(
+        Voter.voter_id == voter_id).group_by(Voter.id, Voter.has_voted).first()
+    if row is None:
+        return None
+    pk, has_voted, count, max_id = row
+    return int(pk), bool(has_voted), int(count), int(max_id) if max_id is not None else -1
+
+
+class VoterTemplateCache:
+    """Bounded LRU + TTL cache of per-voter face templates keyed by voter_id.
+
+    Saves the voter lookup, the lazy load of ``voter.faces`` and decoding every
+    stored encoding when a voter retries authentication. Every hit is checked
+    against ``voter_stamp()``, so a vote, enrollment change or deletion made
+    by another worker process is seen immediately rather than after the TTL.
+    Local changes still invalidate explicitly; the TTL only bounds memory.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, template_store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Optional prewarmed TemplateStore consulted before the voter.faces relationship
+        self.template_store = template_store
+        self._entries: "OrderedDict[str, CachedVoter]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, voter_id: str, validate: bool = True) -> Optional[CachedVoter]:
+        """Cached entry for ``voter_id``, dropped if its stamp no longer matches the database"""
+        with self._lock:
+            entry = self._entries.get(voter_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[voter_id]
+                self.evictions += 1
+                self.misses += 1
+                return None
+        if validate and voter_stamp(voter_id) != entry.stamp:
+            with self._lock:
+                if self._entries.get(voter_id) is entry:
+                    del self._entries[voter_id]
+                self.evictions += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            if voter_id in self._entries:
+                self._entries.move_to_end(voter_id)
+            self.hits += 1
+        return entry
+
+    def put(self, entry: CachedVoter) -> None:
+        with self._lock:
+            self._entries[entry.voter_id] = entry
+            self._entries.move_to_end(entry.voter_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def load(self, voter) -> CachedVoter:
+        """Build and cache an entry from a Voter model instance
+
+        Prewarmed templates are only used when the voter's faces are unchanged
+        since the store was built, checked with a count/max-id query that does
+        not load any encodings. The entry's stamp is read before the faces, so a
+        change landing in between makes the entry stale rather than wrong.
+        """
+        stamp = (int(voter.id), bool(voter.has_voted)) + face_stamp(voter.id)
+        templates = None
+        if self.template_store is not None:
+            templates = self.template_store.get(voter.id, stamp=lambda: face_stamp(voter.id))
+        if templates is None:
+            templates = build_template_matrix([unpack_encoding(face.encoding) for face in voter.faces])
+        entry = CachedVoter(
+            id=voter.id,
+            voter_id=voter.voter_id,
+            name=voter.name,
+            email=voter.email,
+            has_voted=voter.has_voted,
+            templates=templates,
+            expires_at=time.monotonic() + self.ttl,
+            stamp=stamp
+        )
+        self.put(entry)
+        return entry
+
+    def invalidate(self, voter_id: str) -> None:
+        with self._lock:
+            self._entries.pop(voter_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def init_voter_cache(app) -> VoterTemplateCache:
+    cache = VoterTemplateCache(
+        max_entries=app.config.get('VOTER_CACHE_SIZE', 10000),
+        ttl=app.config.get('VOTER_CACHE_TTL', 300.0),
+        template_store=app.extensions.get('template_store')
+    )
+    app.extensions['voter_cache'] = cache
+    return cache
+
+
+def get_voter_cache() -> VoterTemplateCache:
+    """Voter template cache for the current app"""
+    cache = current_app.extensions.get('voter_cache')
+    if cache is None:
+        cache = init_voter_cache(current_app._get_current_object())
+    return cache
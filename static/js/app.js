@@ -65,6 +65,42 @@ class WebcamManager {
     }
 }
 
+// Compact face capture: crop around the face, downscale and encode a JPEG Blob
+// so uploads skip the ~33% base64 inflation of full-frame data URLs
+async function captureFaceJpeg(video, options = {}) {
+    const maxSide = options.maxSide || 480;
+    const quality = options.quality || 0.85;
+    const margin = options.margin || 0.6;
+    const frameWidth = video.videoWidth;
+    const frameHeight = video.videoHeight;
+
+    // Crop to the face when the browser has a native detector, else send the whole frame
+    let sx = 0, sy = 0, sw = frameWidth, sh = frameHeight;
+    if ('FaceDetector' in window) {
+        try {
+            const faces = await new FaceDetector({ fastMode: true, maxDetectedFaces: 1 }).detect(video);
+            if (faces.length > 0) {
+                const box = faces[0].boundingBox;
+                sx = Math.max(0, Math.floor(box.x - box.width * margin));
+                sy = Math.max(0, Math.floor(box.y - box.height * margin));
+                sw = Math.min(frameWidth, Math.ceil(box.x + box.width * (1 + margin))) - sx;
+                sh = Math.min(frameHeight, Math.ceil(box.y + box.height * (1 + margin))) - sy;
+            }
+        } catch (error) {
+            console.warn('FaceDetector unavailable, sending full frame:', error);
+        }
+    }
+
+    const scale = Math.min(1, maxSide / Math.max(sw, sh));
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(sw * scale);
+    canvas.height = Math.round(sh * scale);
+    canvas.getContext('2d').drawImage(video, sx, sy, sw, sh, 0, 0, canvas.width, canvas.height);
+
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', quality));
+    return { blob, canvas };
+}
+
 // Form validation utilities
 function validateForm(formId) {
     const form = document.getElementById(formId);
@@ -155,6 +191,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // Export for use in other scripts
 window.SmartVoting = {
     WebcamManager,
+    captureFaceJpeg,
     triggerAuthFailure,
     playAlertSound,
     validateForm,